@@ -0,0 +1,80 @@
+from typing import Optional
+
+from django.contrib.auth.models import User
+from django.db.models import Prefetch
+
+from .models import Holiday, Contract, ContractChange
+from .batch import contract_hours_timeline
+
+import datetime as dt
+
+def team_absences(supervisor: Optional[User], from_date: dt.date, to_date: dt.date) -> dict:
+    """Who of a team is on holiday on each day between two dates and how many required hours are missing because of it. The team are the SHKs with a contract of the supervisor between the dates. Contracts with their changes and all overlapping holidays are loaded with three queries, the holidays are then expanded into a users x days array with a sweep line (+1 on the first day, -1 after the last day, cumulative sum), so the cost does not depend on the number of days queried.
+
+    Args:
+        supervisor (Optional[User]): the supervisor, all SHKs if None
+        from_date (dt.date): first day
+        to_date (dt.date): last day
+
+    Returns:
+        dict: 'from' and 'to', the SHKs ordered by name ('users', each with 'id' and 'name') and one entry per day ('days') with the ids of the absent SHKs ('absent'), the hours the team has to work ('required_hours') and the hours of the absent SHKs ('missing_hours')
+    """
+    import numpy as np
+
+    contracts = Contract.objects.filter(contract_start_date__lte=to_date, contract_end_date__gte=from_date).select_related('user')
+    if supervisor is not None:
+        contracts = contracts.filter(supervisor=supervisor)
+    contracts = contracts.prefetch_related(Prefetch('contractchange_set', queryset=ContractChange.objects.order_by('id'), to_attr='contract_changes')).order_by('id')
+    team = {}
+    for contract in contracts:
+        team.setdefault(contract.user_id, (contract.user, []))[1].append(contract)
+    users = sorted([user for user, user_contracts in team.values()], key=lambda user: (user.last_name, user.first_name, user.username))
+    row = {user.id: i for i, user in enumerate(users)}
+
+    days = (to_date - from_date).days + 1
+    hours = np.zeros((len(users), days))
+    for user in users:
+        hours[row[user.id]] = contract_hours_timeline(team[user.id][1], from_date, to_date)
+
+    # sweep line over the holiday intervals, clipped to the range
+    holidays = list(Holiday.objects.filter(by_id__in=row, from_date__lte=to_date, to_date__gte=from_date).values_list('by_id', 'from_date', 'to_date'))
+    changes = np.zeros((len(users), days + 1), dtype=np.int32)
+    if holidays:
+        rows = np.array([row[user_id] for user_id, start, end in holidays])
+        starts = np.array([max((start - from_date).days, 0) for user_id, start, end in holidays])
+        ends = np.array([min((end - from_date).days + 1, days) for user_id, start, end in holidays])
+        np.add.at(changes, (rows, starts), 1)
+        np.add.at(changes, (rows, ends), -1)
+    absent = np.cumsum(changes, axis=1)[:, :days] > 0
+
+    required = hours.sum(axis=0)
+    missing = (hours * absent).sum(axis=0)
+    ids = np.array([user.id for user in users], dtype=np.int64)
+    return {
+        'from': from_date,
+        'to': to_date,
+        'users': [{'id': user.id, 'name': ' '.join(filter(None, [user.first_name, user.last_name])) or user.username} for user in users],
+        'days': [{
+            'date': from_date + dt.timedelta(days=day),
+            'absent': ids[absent[:, day]].tolist(),
+            'required_hours': round(float(required[day]), 2),
+            'missing_hours': round(float(missing[day]), 2),
+        } for day in range(days)],
+    }
+
+def calendar_range(view: str, date: dt.date) -> tuple:
+    """First and last day of the month or the week (Monday to Sunday) of a date.
+
+    Args:
+        view (str): 'month' or 'week'
+        date (dt.date): a day in the month or week
+
+    Returns:
+        tuple: first day, last day, first day of the previous and of the next month or week
+    """
+    if view == 'week':
+        start = date - dt.timedelta(days=date.weekday())
+        return start, start + dt.timedelta(days=6), start - dt.timedelta(days=7), start + dt.timedelta(days=7)
+    start = date.replace(day=1)
+    following = (start + dt.timedelta(days=31)).replace(day=1)
+    return start, following - dt.timedelta(days=1), (start - dt.timedelta(days=1)).replace(day=1), following
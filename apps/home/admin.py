@@ -1,8 +1,244 @@
-from django.contrib import admin
-from .models import Task, Holiday, Contract, ContractChange
-
-# Register your models here.
-admin.site.register(Task)
-admin.site.register(Holiday)
-admin.site.register(Contract)
-admin.site.register(ContractChange)
\ No newline at end of file
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.shortcuts import redirect, render
+from django.urls import path
+import datetime as dt
+from typing import Dict, List, Optional
+
+from .models import Task, Holiday, Contract, ContractChange, Job, ArchivedPeriod, FeedToken, TimeEntry
+from .timesheet import set_worked_hours, delete_entries
+
+def contract_balances(contracts: List[Contract], today: Optional[dt.date] = None) -> Dict[int, dict]:
+    """The balances of the employment periods of contracts (see batch.balance_history), computed for all their users together with the constant number of queries of prefetch_user_data.
+
+    Args:
+        contracts (List[Contract]): the contracts, e.g. a page of the changelist
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Dict[int, dict]: contract id -> the period of the balance history that contains the contract
+    """
+    from .batch import prefetch_user_data, balance_history
+
+    today = today or dt.date.today()
+    users = prefetch_user_data(User.objects.filter(id__in={contract.user_id for contract in contracts}))
+    histories = {user.id: balance_history(user, today) for user in users}
+    balances = {}
+    for contract in contracts:
+        for period in histories.get(contract.user_id, []):
+            if period['start'] <= contract.contract_start_date and contract.contract_end_date <= period['end']:
+                balances[contract.id] = period
+    return balances
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
+
+class ContractChangeList(ChangeList):
+    """ChangeList that computes the balances of the contracts on the page at once."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.balances = contract_balances(list(self.result_list))
+        for contract in self.result_list:
+            contract.balance = self.balances.get(contract.id, {})
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('task_text', 'assigned_to', 'assigner', 'total_hours', 'worked_hours', 'deadline')
+    list_select_related = ('assigned_to', 'assigner')
+    list_filter = ('deadline', 'assigner')
+    date_hierarchy = 'deadline'
+    search_fields = ('task_text', 'assigned_to__username')
+    autocomplete_fields = ('assigned_to', 'assigner')
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        field = super().formfield_for_dbfield(db_field, request, **kwargs)
+        if db_field.name == 'worked_hours':
+            field.show_hidden_initial = True # changed compared to the shown value, not to hours logged meanwhile
+        return field
+
+    def save_model(self, request, obj, form, change):
+        # the worked hours are only changed by a time entry, so the rollups stay in sync; the other fields are saved
+        # without them, which would overwrite the hours logged since the form was shown
+        worked_hours = obj.worked_hours
+        if change:
+            obj.save(update_fields=[field.name for field in obj._meta.concrete_fields if not field.primary_key and field.name != 'worked_hours'])
+        else:
+            obj.worked_hours = 0
+            obj.save()
+        if 'worked_hours' in form.changed_data:
+            set_worked_hours(obj, worked_hours)
+
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'by_id', 'from_date', 'to_date')
+    list_select_related = ('by_id',)
+    list_filter = ('from_date',)
+    date_hierarchy = 'from_date'
+    search_fields = ('by_id__username',)
+    autocomplete_fields = ('by_id',)
+
+class ContractImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or JSON')
+    dry_run = forms.BooleanField(required=False, help_text='Only validate the rows.')
+    skip_invalid = forms.BooleanField(required=False, help_text='Import the valid rows even if other rows have errors.')
+
+class ContractChangeInline(admin.TabularInline):
+    model = ContractChange
+    extra = 0
+    fields = ('from_date', 'to_date', 'hours_per_week')
+
+@admin.register(Contract)
+class ContractAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'supervisor', 'contract_start_date', 'contract_end_date', 'hours_per_week', 'hours_to_work', 'worked_hours', 'excess_hours', 'remaining_holidays', 'carry_over_hours_from_last_semester', 'carry_over_holiday_hours_from_last_semester')
+    list_select_related = ('user', 'supervisor')
+    list_filter = ('supervisor', 'region', 'contract_end_date')
+    date_hierarchy = 'contract_start_date'
+    search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    autocomplete_fields = ('user', 'supervisor')
+    inlines = [ContractChangeInline]
+    actions = ['compute_carryover']
+    change_list_template = 'admin/home/contract/change_list.html'
+
+    def get_urls(self):
+        return [path('import/', self.admin_site.admin_view(self.import_view), name='home_contract_import')] + super().get_urls()
+
+    def import_view(self, request):
+        from .importer import read_rows, import_rows
+
+        if not self.has_add_permission(request):
+            return redirect('admin:home_contract_changelist')
+        form, errors = ContractImportForm(request.POST or None, request.FILES or None), []
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                rows = read_rows(upload, name=upload.name)
+            except ValueError as e:
+                rows, errors = None, [(0, str(e))]
+            if rows is not None:
+                result = import_rows(rows, form.cleaned_data['dry_run'], form.cleaned_data['skip_invalid'])
+                errors = result['errors']
+                if not errors or form.cleaned_data['skip_invalid']:
+                    self.message_user(request, ('Would import ' if form.cleaned_data['dry_run'] else 'Imported ') + str(result['contracts']) + ' contracts and ' + str(result['changes']) + ' contract changes.', messages.SUCCESS)
+                    if not form.cleaned_data['dry_run']:
+                        if errors:
+                            self.message_user(request, str(len(errors)) + ' rows skipped: ' + '; '.join(['line ' + str(line) + ': ' + error for line, error in errors]), messages.WARNING)
+                        return redirect('admin:home_contract_changelist')
+        context = dict(self.admin_site.each_context(request), opts=self.model._meta, form=form, errors=errors, title='Import contracts')
+        return render(request, 'admin/home/contract/import.html', context)
+
+    def get_changelist(self, request, **kwargs):
+        return ContractChangeList
+
+    # balances of the employment period of the contract, computed for the whole page by ContractChangeList
+    @admin.display(description='Hours to work')
+    def hours_to_work(self, contract: Contract) -> Optional[float]:
+        return _rounded(contract.balance.get('hours_to_work'))
+
+    @admin.display(description='Worked hours')
+    def worked_hours(self, contract: Contract) -> Optional[float]:
+        return _rounded(contract.balance.get('worked_hours'))
+
+    @admin.display(description='Excess hours')
+    def excess_hours(self, contract: Contract) -> Optional[float]:
+        return _rounded(contract.balance.get('excess_hours'))
+
+    @admin.display(description='Remaining holidays (days)')
+    def remaining_holidays(self, contract: Contract) -> Optional[float]:
+        return _rounded(contract.balance.get('remaining_holidays'))
+
+    @admin.action(description='Compute carryover for selected')
+    def compute_carryover(self, request, queryset):
+        from .batch import prefetch_user_data, apply_carryover
+
+        # the distinct users are loaded with a constant number of queries, a user with several selected contracts is only processed once
+        users = prefetch_user_data(User.objects.filter(id__in=queryset.values('user_id')))
+        with transaction.atomic():
+            result = apply_carryover(users, dt.date.today())
+        done = [user.username for user in users if result[user.id] != (0, 0)]
+        skipped = [user.username for user in users if result[user.id] == (0, 0)]
+        if done:
+            self.message_user(request, 'Carryover done for ' + ', '.join(done) + '.', messages.SUCCESS)
+        if skipped:
+            self.message_user(request, 'Carryover not possible or already done for ' + ', '.join(skipped) + '.', messages.WARNING)
+
+@admin.register(ContractChange)
+class ContractChangeAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'contract_id', 'from_date', 'to_date', 'hours_per_week')
+    list_select_related = ('contract_id__user',)
+    list_filter = ('from_date',)
+    date_hierarchy = 'from_date'
+    search_fields = ('contract_id__user__username',)
+    raw_id_fields = ('contract_id',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'kwargs', 'status', 'attempts', 'run_after', 'created_by', 'updated')
+    list_select_related = ('created_by',)
+    list_filter = ('status', 'name')
+    readonly_fields = ('result', 'error', 'added', 'updated')
+
+@admin.register(ArchivedPeriod)
+class ArchivedPeriodAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'start', 'end', 'payload_size', 'added')
+    list_select_related = ('user',)
+    list_filter = ('end',)
+    search_fields = ('user__username',)
+    exclude = ('payload',)
+    readonly_fields = ('user', 'start', 'end', 'summary', 'added')
+    actions = ['restore']
+
+    @admin.display(description='Payload (bytes)')
+    def payload_size(self, archived_period: ArchivedPeriod) -> int:
+        return len(archived_period.payload)
+
+    @admin.action(description='Restore selected periods')
+    def restore(self, request, queryset):
+        from .archive import restore_period
+
+        records = sum([restore_period(archived_period) for archived_period in queryset])
+        self.message_user(request, 'Restored ' + str(records) + ' records.', messages.SUCCESS)
+
+@admin.register(FeedToken)
+class FeedTokenAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'scope', 'public_holidays', 'added', 'revoked')
+    list_select_related = ('user',)
+    list_filter = ('scope', 'revoked')
+    search_fields = ('user__username',)
+    exclude = ('token',)
+    readonly_fields = ('added',)
+    actions = ['revoke']
+
+    def has_add_permission(self, request):
+        return False # tokens are created on the holiday page
+
+    @admin.action(description='Revoke selected feeds')
+    def revoke(self, request, queryset):
+        from django.utils import timezone
+
+        count = queryset.filter(revoked=None).update(revoked=timezone.now())
+        self.message_user(request, 'Revoked ' + str(count) + ' feeds.', messages.SUCCESS)
+
+@admin.register(TimeEntry)
+class TimeEntryAdmin(admin.ModelAdmin):
+    list_display = ('date', 'user', 'task', 'hours', 'added')
+    list_select_related = ('user', 'task')
+    list_filter = ('date',)
+    date_hierarchy = 'date'
+    search_fields = ('user__username', 'task__task_text')
+
+    # entries are written through timesheet.py, which keeps the tasks and the rollups in sync
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_model(self, request, obj):
+        delete_entries(TimeEntry.objects.filter(id=obj.id))
+
+    def delete_queryset(self, request, queryset):
+        delete_entries(queryset)
@@ -0,0 +1,106 @@
+"""Archival of old employment periods. A closed period is moved out of the contract, contract change, holiday, task and time entry tables into one ArchivedPeriod row per user and period: the balances of the period as shown in the history (summary) and all its records as compressed JSON (payload), so it can be restored. The latest closed period of a user is never archived, the carryover into the current semester is calculated from it."""
+import zlib
+from typing import List, Optional
+
+from django.contrib.auth.models import User
+from django.core import serializers
+from django.db import transaction
+
+from .models import Task, Holiday, Contract, ArchivedPeriod, TimeEntry
+from .batch import prefetch_user_data, balance_history
+from .timesheet import apply_to_rollups
+
+import datetime as dt
+
+def _summary(period: dict) -> dict:
+    return {key: value.isoformat() if isinstance(value, dt.date) else value for key, value in period.items()}
+
+def archived_history(user: User) -> List[dict]:
+    """The archived periods of a user in the format of batch.balance_history, marked with 'archived': True.
+
+    Args:
+        user (User): the user
+
+    Returns:
+        List[dict]: one dict per period, oldest first
+    """
+    periods = []
+    for archived in ArchivedPeriod.objects.filter(user=user).only('start', 'end', 'summary').order_by('start'):
+        periods.append(dict(archived.summary, start=archived.start, end=archived.end, status='closed', archived=True))
+    return periods
+
+def archivable_periods(user: User, today: dt.date, retention_days: int) -> List[dict]:
+    """The closed periods of a prefetched user that ended more than retention_days ago, without the latest closed period.
+
+    Args:
+        user (User): prefetched user
+        today (dt.date): reference date
+        retention_days (int): days a closed period is kept
+
+    Returns:
+        List[dict]: the periods (see batch.balance_history)
+    """
+    closed = [period for period in balance_history(user, today) if period['status'] == 'closed']
+    return [period for period in closed[:-1] if period['end'] < today - dt.timedelta(days=retention_days)]
+
+def archive_user(user: User, today: Optional[dt.date] = None, retention_days: int = 730, dry_run: bool = False) -> List[ArchivedPeriod]:
+    """Archives the old periods of a user in one transaction: the records of each period (contracts with their changes, holidays and tasks within the period with their time entries) are stored in an ArchivedPeriod and deleted. Deleting the tasks subtracts their entries from the rollups.
+
+    Args:
+        user (User): the user
+        today (Optional[dt.date]): reference date, defaults to today
+        retention_days (int): days a closed period is kept
+        dry_run (bool): only return the periods that would be archived, without saving them
+
+    Returns:
+        List[ArchivedPeriod]: the archived periods
+    """
+    today = today or dt.date.today()
+    archived = []
+    with transaction.atomic():
+        user = prefetch_user_data([User.objects.select_for_update().get(id=user.id)])[0]
+        for period in archivable_periods(user, today, retention_days):
+            start, end = period['start'], period['end']
+            contracts = [contract for contract in user.contracts if start <= contract.contract_start_date and contract.contract_end_date <= end]
+            changes = [change for contract in contracts for change in contract.contract_changes]
+            holidays = [holiday for holiday in user.holiday_list if start <= holiday.from_date and holiday.to_date <= end]
+            tasks = [task for task in user.task_list if start <= task.deadline <= end]
+            entries = list(TimeEntry.objects.filter(task_id__in=[task.id for task in tasks]).order_by('id'))
+            payload = zlib.compress(serializers.serialize('json', contracts + changes + holidays + tasks + entries).encode(), 9)
+            archived_period = ArchivedPeriod(user=user, start=start, end=end, summary=_summary(period), payload=payload)
+            archived.append(archived_period)
+            if dry_run:
+                continue
+            archived_period.save()
+            Task.objects.filter(id__in=[task.id for task in tasks]).delete()
+            Holiday.objects.filter(id__in=[holiday.id for holiday in holidays]).delete()
+            Contract.objects.filter(id__in=[contract.id for contract in contracts]).delete() # with their contract changes
+    return archived
+
+def archive_records(archived_period: ArchivedPeriod) -> list:
+    """The archived records of a period.
+
+    Args:
+        archived_period (ArchivedPeriod): the period
+
+    Returns:
+        list: unsaved Contract, ContractChange, Holiday, Task and TimeEntry objects
+    """
+    return [obj.object for obj in serializers.deserialize('json', zlib.decompress(bytes(archived_period.payload)).decode())]
+
+def restore_period(archived_period: ArchivedPeriod) -> int:
+    """Moves the records of an archived period back into the tables (with their old ids), adds the time entries to the rollups again and deletes the ArchivedPeriod.
+
+    Args:
+        archived_period (ArchivedPeriod): the period
+
+    Returns:
+        int: number of restored records
+    """
+    with transaction.atomic():
+        records = archive_records(archived_period)
+        for record in records: # contracts come before their changes, tasks before their entries
+            record.save()
+        apply_to_rollups([(record.user_id, record.date, record.hours, 1) for record in records if isinstance(record, TimeEntry)])
+        archived_period.delete()
+    return len(records)
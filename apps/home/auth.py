@@ -0,0 +1,61 @@
+from typing import FrozenSet, Optional
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .cache import cache_is_shared
+
+# The roles of a user (shk, supervisor, shkofficer) are Django groups. A page asks for them many times
+# (views, sidebar, templates), group_names loads them once and keeps them on the user object, which
+# lives as long as the request.
+
+def group_names(user: User) -> FrozenSet[str]:
+    """Returns the names of the groups of a user. They are loaded with one query and then kept on the user object.
+
+    Args:
+        user (User): the user
+
+    Returns:
+        FrozenSet[str]: the group names, empty for anonymous users
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_group_names'):
+        user._group_names = frozenset(user.groups.values_list('name', flat=True))
+    return user._group_names
+
+def _user_key(user_id: int) -> str:
+    return 'auth-user:' + str(user_id)
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that keeps the logged in user (with the group names) in the cache for settings.AUTH_USER_CACHE_TTL seconds, so an authenticated request does not need to fetch the user from the database. The cached user is dropped when the user or the user's groups change. This needs a cache shared by all processes: with a per-process cache the drop would only reach the current process, and a deactivated user or a changed password would stay valid in the other workers, so the user is then always fetched from the database."""
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        if not cache_is_shared():
+            return super().get_user(user_id)
+        user = cache.get(_user_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                group_names(user)
+                cache.set(_user_key(user_id), user, getattr(settings, 'AUTH_USER_CACHE_TTL', 0) or 300) # 5 minutes if the backend is configured without a TTL
+        return user
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance: User, **kwargs):
+    cache.delete(_user_key(instance.id))
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse: # group.user_set.add(...)
+        user_ids = pk_set if pk_set is not None else []
+    else:
+        instance.__dict__.pop('_group_names', None)
+        user_ids = [instance.id]
+    cache.delete_many([_user_key(user_id) for user_id in user_ids])
@@ -0,0 +1,474 @@
+"""In-memory implementation of the calculators in calculations.py. All contracts, contract changes, holidays and tasks of a set of users are loaded with a constant number of queries (prefetch_user_data), the calculations then run without touching the database and with an explicit reference date instead of dt.date.today(), so no freeze_time is needed.
+
+The functions calc_working_time, calc_holiday and do_carryover at the end have the same signature as the ones in calculations.py and can be used as alternates in shadow mode.
+"""
+import bisect
+from django.contrib.auth.models import User
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Task, Holiday, Contract, ContractChange
+from .cache import bump_user_version
+from .regions import DEFAULT_REGION, free_days_of_year, free_days, count_free_days, is_free_day, workdays, region_on # free_days_of_year and free_days are used from here as well
+
+import datetime as dt
+
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np # imported inside the functions, it is slow to import
+
+def business_days(from_date: dt.date, to_date: dt.date) -> int:
+    """Same as calculations.business_days, the to_date is included.
+
+    Args:
+        from_date (dt.date): from date
+        to_date (dt.date): to date
+
+    Returns:
+        int: The number of business days between the two dates.
+    """
+    import numpy as np
+
+    if to_date.weekday() >= 5:
+        return np.busday_count(from_date, to_date)
+    else:
+        return np.busday_count(from_date, to_date) + 1
+
+def days_to_work(from_date: dt.date, to_date: dt.date, today: dt.date, region: str = DEFAULT_REGION) -> int:
+    """Same as calculations.calc_days_to_work but with an explicit reference date.
+
+    Args:
+        from_date (dt.date): Beginning of the contract.
+        to_date (dt.date): End of the contract.
+        today (dt.date): reference date
+        region (str): region of the contract
+
+    Returns:
+        int: number of days to work
+    """
+    until = min(today, to_date)
+    return business_days(from_date, until) - count_free_days(from_date, until, region)
+
+def prefetch_user_data(users: Iterable[User]) -> List[User]:
+    """Loads contracts (with supervisor and contract changes), holidays and tasks of all given users with a constant number of queries. The data is attached to the user objects: user.contracts (each contract with contract.contract_changes), user.holiday_list and user.task_list, all sorted by id.
+
+    Args:
+        users (Iterable[User]): users or a queryset of users
+
+    Returns:
+        List[User]: the users with the attached data
+    """
+    users = list(users)
+    by_id = {user.id: user for user in users}
+    for user in users:
+        user.contracts, user.holiday_list, user.task_list = [], [], []
+    changes = Prefetch('contractchange_set', queryset=ContractChange.objects.order_by('id'), to_attr='contract_changes')
+    for contract in Contract.objects.filter(user_id__in=by_id).select_related('supervisor').prefetch_related(changes).order_by('id'):
+        by_id[contract.user_id].contracts.append(contract)
+    for holiday in Holiday.objects.filter(by_id__in=by_id).order_by('id'):
+        by_id[holiday.by_id_id].holiday_list.append(holiday)
+    for task in Task.objects.filter(assigned_to__in=by_id).order_by('id'):
+        by_id[task.assigned_to_id].task_list.append(task)
+    return users
+
+def employment_time(user: User, today: Optional[dt.date] = None) -> Tuple[dt.date, dt.date]:
+    """Same as calculations.get_employment_time on prefetched data.
+
+    Args:
+        user (User): prefetched user
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Tuple[dt.date, dt.date]: The start and end date of the current employment.
+    """
+    today = today or dt.date.today()
+    active = [contract for contract in user.contracts if contract.contract_start_date <= today <= contract.contract_end_date]
+    if len(active) == 0:
+        last_contract = max(user.contracts, key=lambda contract: contract.contract_end_date)
+        return last_contract.contract_start_date, last_contract.contract_end_date
+    return min(contract.contract_start_date for contract in active), max(contract.contract_end_date for contract in active)
+
+def hours_on_day(user: User, date: dt.date) -> float:
+    """Same as calculations.working_hours_on_day on prefetched data.
+
+    Args:
+        user (User): prefetched user
+        date (dt.date): the day
+
+    Returns:
+        float: The amount of hours to work on the given day.
+    """
+    if date.weekday() >= 5:
+        return 0.0
+    hours = 0.0
+    for contract in user.contracts:
+        if contract.contract_start_date <= date <= contract.contract_end_date and not is_free_day(date, contract.region):
+            hours += contract.hours_per_week/5
+            for contract_change in contract.contract_changes:
+                if contract_change.to_date is not None and contract_change.from_date <= date <= contract_change.to_date:
+                    hours += contract_change.hours_per_week/5 - contract.hours_per_week/5
+    return hours
+
+def _in_period(date: dt.date, period: Tuple[dt.date, dt.date]) -> bool:
+    return period[0] <= date <= period[1]
+
+def _days(from_date: dt.date, to_date: dt.date) -> Iterable[dt.date]:
+    for i in range((to_date - from_date).days + 1):
+        yield from_date + dt.timedelta(days=i)
+
+def working_time(user: User, today: Optional[dt.date] = None, period: Optional[Tuple[dt.date, dt.date]] = None) -> Tuple[float, float, float, float]:
+    """Same as calculations.calc_working_time on prefetched data.
+
+    Args:
+        user (User): prefetched user
+        today (Optional[dt.date]): reference date, defaults to today
+        period (Optional[Tuple[dt.date, dt.date]]): employment period, defaults to the one of employment_time
+
+    Returns:
+        Tuple[float, float, float, float]: hours to work, worked hours, planned hours, excess hours
+    """
+    today = today or dt.date.today()
+    period = period or employment_time(user, today)
+    hours_to_work = 0
+    for contract in user.contracts:
+        if not (_in_period(contract.contract_start_date, period) and _in_period(contract.contract_end_date, period)):
+            continue
+        hours_to_work += days_to_work(contract.contract_start_date, contract.contract_end_date, today, contract.region) * contract.hours_per_week/5
+        for contract_change in contract.contract_changes:
+            if not _in_period(contract_change.from_date, period):
+                continue
+            end_date = contract.contract_end_date if contract_change.to_date is None else contract_change.to_date
+            hours_to_work += days_to_work(contract_change.from_date, end_date, today, contract.region) * (contract_change.hours_per_week/5 - contract.hours_per_week/5)
+
+    for holiday in user.holiday_list:
+        if _in_period(holiday.from_date, period) and _in_period(holiday.to_date, period):
+            for day in _days(holiday.from_date, holiday.to_date):
+                hours_to_work -= hours_on_day(user, day)
+
+    tasks = [task for task in user.task_list if _in_period(task.deadline, period)]
+    worked_hours = sum([task.worked_hours for task in tasks])
+    planned_hours = sum([task.total_hours for task in tasks])
+    return hours_to_work, worked_hours, planned_hours, hours_to_work - worked_hours
+
+def holiday_balance(user: User, today: Optional[dt.date] = None, period: Optional[Tuple[dt.date, dt.date]] = None) -> Tuple[float, float, int, float]:
+    """Same as calculations.calc_holiday on prefetched data.
+
+    Args:
+        user (User): prefetched user
+        today (Optional[dt.date]): reference date, defaults to today
+        period (Optional[Tuple[dt.date, dt.date]]): employment period, defaults to the one of employment_time
+
+    Returns:
+        Tuple[float, float, int, float]: holiday entitlement, not taken holidays in last semester, taken holidays days, remaining holidays in days
+    """
+    period = period or employment_time(user, today)
+    holiday_entitlement_sum, not_taken_holidays_sum = 0, 0
+    for contract in user.contracts:
+        if not (_in_period(contract.contract_start_date, period) and _in_period(contract.contract_end_date, period)):
+            continue
+        full_months = (contract.contract_end_date - contract.contract_start_date).days // 30
+        holiday_entitlement_sum += round(full_months * 20 / 12,0)
+        not_taken_holidays_sum += contract.carry_over_holiday_hours_from_last_semester / contract.hours_per_week * 5
+
+    taken_holidays_days = sum([business_days(holiday.from_date, holiday.to_date) - count_free_days(holiday.from_date, holiday.to_date, region_on(user.contracts, holiday.from_date)) for holiday in user.holiday_list if _in_period(holiday.from_date, period) and _in_period(holiday.to_date, period)])
+    return holiday_entitlement_sum, not_taken_holidays_sum, taken_holidays_days, holiday_entitlement_sum + not_taken_holidays_sum - taken_holidays_days
+
+def active_contracts(user: User, today: Optional[dt.date] = None) -> List[Contract]:
+    """All contracts of a prefetched user that are active on the reference date (defaults to today)."""
+    today = today or dt.date.today()
+    return [contract for contract in user.contracts if contract.contract_start_date <= today <= contract.contract_end_date]
+
+def longest_active_contract(user: User, today: Optional[dt.date] = None) -> Optional[Contract]:
+    """The active contract with the longest duration, the one that receives the carryover.
+
+    Args:
+        user (User): prefetched user
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Optional[Contract]: the contract or None if no contract is active
+    """
+    contracts = active_contracts(user, today)
+    if len(contracts) == 0:
+        return None
+    return max(contracts, key=lambda contract: contract.contract_end_date - contract.contract_start_date)
+
+def carryover_problems(user: User, today: Optional[dt.date] = None) -> Tuple[List[str], List[str]]:
+    """Checks if a carryover is possible for a user, see the contracts page.
+
+    Args:
+        user (User): prefetched user
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Tuple[List[str], List[str]]: problems with the old contracts, problems with the new contract. Carryover is possible if both are empty.
+    """
+    today = today or dt.date.today()
+    old_problems, new_problems = [], []
+    if not any(contract.contract_end_date < today for contract in user.contracts):
+        old_problems.append("No contract ended yet.")
+    longest_contract = longest_active_contract(user, today)
+    if longest_contract is None:
+        new_problems.append("No new contract started yet.")
+    elif longest_contract.carry_over_hours_from_last_semester != 0:
+        new_problems.append("New contract has already carryover for working time.")
+    elif longest_contract.carry_over_holiday_hours_from_last_semester != 0:
+        new_problems.append("New contract has already carryover for holiday.")
+    return old_problems, new_problems
+
+def carryover_preview(user: User, today: Optional[dt.date] = None) -> Tuple[float, float, Optional[Contract], float, float]:
+    """Same as calculations.do_carryover(only_calculate=True) on prefetched data.
+
+    Args:
+        user (User): prefetched user
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Tuple[float, float, Contract, float, float]: carryover hours, carryover holiday hours, new contract, last semester carryover hours sum, last semester carryover holiday sum
+    """
+    import numpy as np
+
+    today = today or dt.date.today()
+    last_contracts_end_date = max(contract.contract_end_date for contract in user.contracts if contract.contract_end_date < today)
+    last_contracts = [contract for contract in user.contracts if contract.contract_end_date == last_contracts_end_date]
+    hours_to_work, worked_hours, planned_hours, excess_hours = working_time(user, last_contracts_end_date)
+    holiday_entitlement_sum, not_taken_holidays_sum, taken_holidays_days, remaining_holidays = holiday_balance(user, last_contracts_end_date)
+    employment_start, employment_end = employment_time(user, last_contracts_end_date)
+    average_hours_per_day = np.mean([hours_on_day(user, day) for day in _days(employment_start, employment_end)])
+
+    last_semester_carry_over_hours = sum([contract.carry_over_hours_from_last_semester for contract in last_contracts])
+    last_semester_carry_over_holiday_hours = sum([contract.carry_over_holiday_hours_from_last_semester for contract in last_contracts])
+    carryover_hours = last_semester_carry_over_hours + excess_hours
+    carryover_holiday_hours = last_semester_carry_over_holiday_hours + (holiday_entitlement_sum - taken_holidays_days) * average_hours_per_day
+    return carryover_hours, carryover_holiday_hours, longest_active_contract(user, today), last_semester_carry_over_hours, last_semester_carry_over_holiday_hours
+
+def apply_carryover(users: Iterable[User], today: Optional[dt.date] = None) -> Dict[int, Tuple[float, float]]:
+    """Same as calculations.do_carryover on prefetched users, with an explicit reference date instead of freeze_time (which patches the clock of the whole process). The carryover is set on the longest active contract with a conditional UPDATE, so a contract that already has a carryover (e.g. from a concurrent run) is not changed.
+
+    Args:
+        users (Iterable[User]): prefetched users
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Dict[int, Tuple[float, float]]: user id -> carryover hours and carryover holiday hours, (0, 0) if the carryover is not possible or already done
+    """
+    today = today or dt.date.today()
+    result = {}
+    for user in users:
+        old_problems, new_problems = carryover_problems(user, today)
+        if old_problems or new_problems:
+            result[user.id] = (0, 0)
+            continue
+        carryover_hours, carryover_holiday_hours, longest_contract, last_semester_carry_over_hours, last_semester_carry_over_holiday_hours = carryover_preview(user, today)
+        updated = Contract.objects.filter(id=longest_contract.id, carry_over_hours_from_last_semester=0, carry_over_holiday_hours_from_last_semester=0).update(
+            carry_over_hours_from_last_semester=carryover_hours,
+            carry_over_holiday_hours_from_last_semester=carryover_holiday_hours,
+            updated=timezone.now(),
+        )
+        result[user.id] = (float(carryover_hours), float(carryover_holiday_hours)) if updated else (0, 0)
+    # update() sends no signals
+    bump_user_version(*[user_id for user_id, carryover in result.items() if carryover != (0, 0)])
+    return result
+
+def contract_groups(user: User) -> List[Tuple[dt.date, dt.date]]:
+    """Splits the contracts of a prefetched user into employment periods: overlapping contracts are merged into one period, like get_employment_time does for the contracts that are active at the same time. A contract starting the day after another one ends starts a new period, back-to-back contracts are consecutive semesters with a carryover between them.
+
+    Args:
+        user (User): prefetched user
+
+    Returns:
+        List[Tuple[dt.date, dt.date]]: start and end date of each period, sorted
+    """
+    groups = []
+    for contract in sorted(user.contracts, key=lambda contract: contract.contract_start_date):
+        if groups and contract.contract_start_date <= groups[-1][1]:
+            groups[-1][1] = max(groups[-1][1], contract.contract_end_date)
+        else:
+            groups.append([contract.contract_start_date, contract.contract_end_date])
+    return [(start, end) for start, end in groups]
+
+def balance_history(user: User, today: Optional[dt.date] = None) -> List[dict]:
+    """Computes required hours, worked and planned hours, holiday entitlement, taken holidays and carryover for every employment period of a prefetched user. Contracts, holidays and tasks are distributed to the periods in one pass over the sorted data, each period is then calculated on its own data as of its end (or today for the current period), so no freeze_time per period is needed.
+
+    Args:
+        user (User): prefetched user
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        List[dict]: one dict per period, oldest first
+    """
+    import numpy as np
+
+    today = today or dt.date.today()
+    groups = contract_groups(user)
+    starts = [start for start, end in groups]
+    buckets = [SimpleNamespace(contracts=[], holiday_list=[], task_list=[]) for group in groups]
+
+    def bucket(from_date: dt.date, to_date: dt.date) -> Optional[SimpleNamespace]:
+        i = bisect.bisect_right(starts, from_date) - 1
+        if i >= 0 and to_date <= groups[i][1]:
+            return buckets[i]
+        return None
+
+    for contract in user.contracts:
+        bucket(contract.contract_start_date, contract.contract_end_date).contracts.append(contract)
+    for holiday in user.holiday_list:
+        b = bucket(holiday.from_date, holiday.to_date)
+        if b is not None:
+            b.holiday_list.append(holiday)
+    for task in user.task_list:
+        b = bucket(task.deadline, task.deadline)
+        if b is not None:
+            b.task_list.append(task)
+
+    history = []
+    for (start, end), data in zip(groups, buckets):
+        status = 'closed' if end < today else ('upcoming' if start > today else 'current')
+        reference = end if status == 'upcoming' else min(today, end) # upcoming periods show the full required hours
+        hours_to_work, worked_hours, planned_hours, excess_hours = working_time(data, reference, (start, end))
+        holiday_entitlement, not_taken_holidays, taken_holidays_days, remaining_holidays = holiday_balance(data, reference, (start, end))
+        last_contracts = [contract for contract in data.contracts if contract.contract_end_date == end]
+        average_hours_per_day = np.mean([hours_on_day(data, day) for day in _days(start, end)])
+        history.append({
+            'start': start,
+            'end': end,
+            'status': status,
+            'contracts': len(data.contracts),
+            'hours_to_work': float(hours_to_work),
+            'worked_hours': float(worked_hours),
+            'planned_hours': float(planned_hours),
+            'excess_hours': float(excess_hours),
+            'holiday_entitlement': float(holiday_entitlement),
+            'not_taken_holidays': float(not_taken_holidays),
+            'taken_holidays_days': int(taken_holidays_days),
+            'remaining_holidays': float(remaining_holidays),
+            'carryover_in_hours': float(sum([contract.carry_over_hours_from_last_semester for contract in data.contracts])),
+            'carryover_in_holiday_hours': float(sum([contract.carry_over_holiday_hours_from_last_semester for contract in data.contracts])),
+            'carryover_out_hours': float(sum([contract.carry_over_hours_from_last_semester for contract in last_contracts]) + excess_hours),
+            'carryover_out_holiday_hours': float(sum([contract.carry_over_holiday_hours_from_last_semester for contract in last_contracts]) + (holiday_entitlement - taken_holidays_days) * average_hours_per_day),
+        })
+    return history
+
+def day_range(from_date: dt.date, to_date: dt.date) -> 'np.ndarray':
+    """All days between two dates (both included) as a datetime64[D] array."""
+    import numpy as np
+
+    return np.arange(np.datetime64(from_date, 'D'), np.datetime64(to_date, 'D') + 1)
+
+def _index(days: 'np.ndarray', date: dt.date) -> int:
+    """Position of a date in a day_range, clipped to 0..len(days)."""
+    import numpy as np
+
+    return int(min(max((np.datetime64(date, 'D') - days[0]).astype(int), 0), len(days)))
+
+def day_slice(days: 'np.ndarray', from_date: dt.date, to_date: dt.date) -> slice:
+    """Slice of a day_range covering the days between two dates (both included)."""
+    return slice(_index(days, from_date), _index(days, to_date + dt.timedelta(days=1)))
+
+def contract_hours_timeline(contracts: Iterable[Contract], from_date: dt.date, to_date: dt.date) -> 'np.ndarray':
+    """Hours to work on each day between two dates according to contracts (each with contract.contract_changes), without looking at the holidays of the user. The hours of all contracts and contract changes are added slice-wise (contract changes without end date last until the end of the contract, like in calc_working_time), weekends and the public holidays of each contract's region are masked out.
+
+    Args:
+        contracts (Iterable[Contract]): contracts with their contract changes
+        from_date (dt.date): first day
+        to_date (dt.date): last day
+
+    Returns:
+        np.ndarray: hours per day, float64, one entry per day of day_range(from_date, to_date)
+    """
+    import numpy as np
+
+    days = day_range(from_date, to_date)
+    by_region = {}
+    for contract in contracts:
+        hours = by_region.setdefault(contract.region, np.zeros(len(days)))
+        hours[day_slice(days, contract.contract_start_date, contract.contract_end_date)] += contract.hours_per_week/5
+        for contract_change in contract.contract_changes:
+            end_date = contract.contract_end_date if contract_change.to_date is None else min(contract_change.to_date, contract.contract_end_date)
+            hours[day_slice(days, contract_change.from_date, end_date)] += contract_change.hours_per_week/5 - contract.hours_per_week/5
+    total = np.zeros(len(days))
+    for region, hours in by_region.items():
+        total += hours * workdays(days, region)
+    return total
+
+def required_hours_timeline(user: User, from_date: dt.date, to_date: dt.date) -> 'np.ndarray':
+    """Hours a prefetched user has to work on each day between two dates, as one array: contract_hours_timeline of the user's contracts with the user's holidays masked out.
+
+    Args:
+        user (User): prefetched user
+        from_date (dt.date): first day
+        to_date (dt.date): last day
+
+    Returns:
+        np.ndarray: required hours per day, float64, one entry per day of day_range(from_date, to_date)
+    """
+    days = day_range(from_date, to_date)
+    hours = contract_hours_timeline(user.contracts, from_date, to_date)
+    for holiday in user.holiday_list:
+        hours[day_slice(days, holiday.from_date, holiday.to_date)] = 0
+    return hours
+
+def task_hours_timeline(user: User, from_date: dt.date, to_date: dt.date, field: str) -> 'np.ndarray':
+    """Hours of the tasks of a prefetched user per deadline day between two dates. Tasks with a deadline outside the range are ignored, like working_time ignores the tasks of other periods.
+
+    Args:
+        user (User): prefetched user
+        from_date (dt.date): first day
+        to_date (dt.date): last day
+        field (str): 'worked_hours' or 'total_hours'
+
+    Returns:
+        np.ndarray: hours per day, one entry per day of day_range(from_date, to_date)
+    """
+    import numpy as np
+
+    days = day_range(from_date, to_date)
+    tasks = [task for task in user.task_list if _in_period(task.deadline, (from_date, to_date))]
+    index = np.array([_index(days, task.deadline) for task in tasks], dtype=int)
+    return np.bincount(index, weights=[getattr(task, field) for task in tasks], minlength=len(days))[:len(days)]
+
+def week_end_indices(days: 'np.ndarray') -> 'np.ndarray':
+    """Positions of the sundays and of the last day in a day_range."""
+    import numpy as np
+
+    return np.flatnonzero(((days.astype('int64') + 3) % 7 == 6) | (np.arange(len(days)) == len(days) - 1))
+
+def weekly_series(users: List[User], from_date: dt.date, to_date: dt.date) -> dict:
+    """Cumulative required, worked and planned hours (by task deadline) of prefetched users at the end of every week between two dates, summed over all users.
+
+    Args:
+        users (List[User]): prefetched users
+        from_date (dt.date): first day
+        to_date (dt.date): last day
+
+    Returns:
+        dict: weeks (ISO dates of the last day of each week), required, worked and planned hours
+    """
+    import numpy as np
+
+    days = day_range(from_date, to_date)
+    required, worked, planned = np.zeros(len(days)), np.zeros(len(days)), np.zeros(len(days))
+    for user in users:
+        required += required_hours_timeline(user, from_date, to_date)
+        worked += task_hours_timeline(user, from_date, to_date, 'worked_hours')
+        planned += task_hours_timeline(user, from_date, to_date, 'total_hours')
+    week_ends = week_end_indices(days)
+    return {
+        'weeks': [str(day) for day in days[week_ends]],
+        'required': np.round(np.cumsum(required)[week_ends], 2).tolist(),
+        'worked': np.round(np.cumsum(worked)[week_ends], 2).tolist(),
+        'planned': np.round(np.cumsum(planned)[week_ends], 2).tolist(),
+    }
+
+# alternates for shadow mode, same signatures as in calculations.py
+
+def calc_working_time(user: User) -> Tuple[float, float, float, float]:
+    return working_time(prefetch_user_data([user])[0])
+
+def calc_holiday(user: User) -> Tuple[float, float, int, float]:
+    return holiday_balance(prefetch_user_data([user])[0])
+
+def do_carryover(user: User, only_calculate: bool = False) -> Tuple[float, float, Optional[Contract], float, float]:
+    return carryover_preview(prefetch_user_data([user])[0])
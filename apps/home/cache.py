@@ -0,0 +1,107 @@
+import hashlib
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .events import publish
+
+# Every user has a version number in the cache, it is bumped whenever a task, holiday, contract or
+# contract change of the user is saved or deleted (see the signal handlers in models.py). Cached values
+# contain the version in their key, so they are never invalidated explicitly but simply not found anymore.
+# Every bump is also published to the live dashboard streams (see events.py).
+
+PER_PROCESS_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+def cache_is_shared(alias: str = 'default') -> bool:
+    """Checks if a cache is shared by all processes (file, database, memcached or redis cache). Values in a LocMemCache live only in the process that wrote them: another process cannot fill it, and a bumped version does not reach the other workers.
+
+    Args:
+        alias (str): cache alias in settings.CACHES
+
+    Returns:
+        bool: False for per-process backends
+    """
+    return settings.CACHES[alias]['BACKEND'] not in PER_PROCESS_BACKENDS
+
+def _version_key(user_id: int) -> str:
+    return 'user-version:' + str(user_id)
+
+def user_version(user_id: int) -> int:
+    """Returns the current data version of a user. If the version was evicted from the cache, a new one based on the current time is used, so old cached values are never used again.
+
+    Args:
+        user_id (int): id of the user
+
+    Returns:
+        int: the version
+    """
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        cache.add(_version_key(user_id), version, None)
+        version = cache.get(_version_key(user_id), version)
+    return version
+
+def bump_user_version(*user_ids: int) -> None:
+    """Marks all cached values of the given users as outdated.
+
+    Args:
+        user_ids (int): ids of the users
+    """
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), time.time_ns(), None)
+    publish(*user_ids)
+
+def cached_for_users(name: str, user_ids: Iterable[int], compute: Callable[[], Any], *parts: Any, timeout: int = None) -> Any:
+    """Returns a cached value that depends on the data of the given users, computing it if one of them changed.
+
+    Args:
+        name (str): name of the value, e.g. 'series'
+        user_ids (Iterable[int]): ids of the users the value depends on
+        compute (Callable[[], Any]): computes the value if it is not cached
+        parts (Any): further parts of the key, e.g. the date range
+        timeout (int): seconds until the value expires, None (default) for never
+
+    Returns:
+        Any: the value
+    """
+    user_ids = sorted(user_ids)
+    versions = cache.get_many([_version_key(user_id) for user_id in user_ids])
+    key = ':'.join([name] + [str(user_id) + '.' + str(versions.get(_version_key(user_id)) or user_version(user_id)) for user_id in user_ids] + [str(part) for part in parts])
+    if len(key) > 200:
+        key = name + ':' + hashlib.sha1(key.encode()).hexdigest()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+def cached_per_user(name: str, user_ids: Iterable[int], compute: Callable[[list], Dict[int, Any]], *parts: Any, timeout: int = None) -> Dict[int, Any]:
+    """Returns one cached value per user, each depending only on the data of its user. The values that are not cached (or whose user changed) are computed together in one call.
+
+    Args:
+        name (str): name of the values, e.g. 'forecast'
+        user_ids (Iterable[int]): ids of the users
+        compute (Callable[[list], Dict[int, Any]]): computes the values of a list of user ids
+        parts (Any): further parts of the keys, e.g. the reference date
+        timeout (int): seconds until the values expire, None (default) for never
+
+    Returns:
+        Dict[int, Any]: user id -> value
+    """
+    user_ids = sorted(set(user_ids))
+    versions = cache.get_many([_version_key(user_id) for user_id in user_ids])
+    keys = {user_id: ':'.join([name, str(user_id) + '.' + str(versions.get(_version_key(user_id)) or user_version(user_id))] + [str(part) for part in parts]) for user_id in user_ids}
+    cached = cache.get_many(list(keys.values()))
+    values = {user_id: cached[key] for user_id, key in keys.items() if key in cached}
+    missing = [user_id for user_id in user_ids if user_id not in values]
+    if missing:
+        computed = compute(missing)
+        cache.set_many({keys[user_id]: value for user_id, value in computed.items()}, timeout)
+        values.update(computed)
+    return values
@@ -0,0 +1,211 @@
+"""The calculators for working time, holidays and carryover. numpy, dateutil and freezegun are only imported inside the functions that need them, so importing this module (and the views, template tags and management commands that depend on it) stays cheap."""
+from django.contrib.auth.models import User
+
+from .models import Task, Holiday, Contract, ContractChange
+from .shadow import shadow
+from .regions import DEFAULT_REGION, free_days, count_free_days, is_free_day, region_on
+from core.routers import replica_reads
+
+import datetime as dt
+
+from typing import Tuple, Union
+
+def get_free_days(from_date: dt.date, to_date: dt.date, region: str = DEFAULT_REGION) -> dict:
+    """A function that returns all free days between two dates. It uses the holidays package to get all holidays of the region (Saxony by default) between the two dates (the calendar of every region and year is only built once, see regions.free_days_of_year). It returns a dictionary with the date as key and the name of the holiday as value.
+
+    Args:
+        from_date (dt.date): from date
+        to_date (dt.date): to date
+        region (str): region code, e.g. DE-SN
+
+    Returns:
+        dict: A dictionary with the date as key and the name of the holiday as value.
+    """
+    return free_days(from_date, to_date, region) # built from the holiday calendars cached per region and year
+
+def get_employment_time(user: User) -> Tuple[dt.date, dt.date]:
+    """A function that returns the start and end date of the current employment of a given user. It iterates over all contracts of the user and returns the earliest start date and the latest end date. If the user has no active contract, the start date is the start date of the last contract and the end date is the end date of the last contract.
+
+    Args:
+        user (User): The user for which the employment time should be calculated.
+
+    Returns:
+        Tuple[dt.date, dt.date]: The start and end date of the current employment.
+    """
+    start_dates = [contract.contract_start_date for contract in Contract.objects.filter(user=user) if contract.contract_start_date <= dt.date.today() <= contract.contract_end_date]
+    end_dates = [contract.contract_end_date for contract in Contract.objects.filter(user=user) if contract.contract_start_date <= dt.date.today() <= contract.contract_end_date]
+    if len(start_dates) == 0 or len(end_dates) == 0:
+        start_date = Contract.objects.filter(user=user).order_by('-contract_end_date').first().contract_start_date
+        end_date = Contract.objects.filter(user=user).order_by('-contract_end_date').first().contract_end_date
+        return start_date, end_date
+    
+    return min(start_dates), max(end_dates)
+            
+
+def business_days(from_date: dt.date, to_date: dt.date) -> int:
+    """A proper way to calculate the number of business days between 2 dates. np.busday_count does exclude the to_date but we want to include it. Therefore we add 1 if the to_date is not a weekend.
+
+    Args:
+        from_date (dt.date): from date
+        to_date (dt.date): to date
+
+    Returns:
+        int: The number of business days between the two dates.
+    """
+    import numpy as np
+
+    if to_date.weekday() >= 5:
+        return np.busday_count(from_date, to_date)
+    else:
+        return np.busday_count(from_date, to_date) + 1
+
+@shadow('calc_holiday')
+@replica_reads()
+def calc_holiday(user: User) -> Tuple[float, float, int, float]:
+    """This function calculates the holiday entitlement, the not taken holidays, the taken holidays and the remaining holidays for a given user. Since the holiday entitlement is calculated based on the contract duration, the function iterates over all contracts of the user. Important are the number of full months worked, for 12 months you get 20 days off.
+
+    Args:
+        user (User): The user for which the holiday entitlement should be calculated.
+
+    Returns:
+        Tuple[float, float, float, float]: holiday entitlement, not taken holidays in last semester, taken holidays days, remaining holidays in days
+    """
+    contracts = Contract.objects.filter(user=user, contract_start_date__range=get_employment_time(user), contract_end_date__range=get_employment_time(user))
+    holiday_entitlement_sum, not_taken_holidays_sum = 0, 0
+    for contract in contracts:
+        contract_duration = dt.date(contract.contract_end_date.year, contract.contract_end_date.month, contract.contract_end_date.day) - dt.date(contract.contract_start_date.year, contract.contract_start_date.month, contract.contract_start_date.day)
+        full_months = contract_duration.days // 30
+        holiday_entitlement = round(full_months * 20 / 12,0)
+        not_taken_holidays = contract.carry_over_holiday_hours_from_last_semester / contract.hours_per_week * 5
+        holiday_entitlement_sum += holiday_entitlement
+        not_taken_holidays_sum += not_taken_holidays
+    
+    taken_holidays = Holiday.objects.filter(by_id=user, from_date__range=get_employment_time(user), to_date__range=get_employment_time(user))
+    all_contracts = list(Contract.objects.filter(user=user)) # for the region of each holiday
+    taken_holidays_days = sum([business_days(holiday.from_date, holiday.to_date) - count_free_days(holiday.from_date, holiday.to_date, region_on(all_contracts, holiday.from_date)) for holiday in taken_holidays])
+    remaining_holidays = holiday_entitlement_sum + not_taken_holidays_sum - taken_holidays_days
+    
+    return holiday_entitlement_sum, not_taken_holidays_sum, taken_holidays_days, remaining_holidays
+
+def calc_days_to_work(from_date: dt.date, to_date: dt.date, region: str = DEFAULT_REGION) -> int:
+    """This function calculates the number of days you should have worked until now. It uses the contract start date and the contract end date. If the contract end date is in the future, the current date is used instead.
+
+    Args:
+        from_date (dt.date): Beginning of the contract.
+        to_date (dt.Date): End of the contract.
+        region (str): region of the contract, its public holidays are not worked
+
+    Returns:
+        int: number of days to work
+    """
+    free_days = count_free_days(from_date, min(dt.date.today(), to_date), region)
+    days_to_work = business_days(from_date, min(dt.date.today(), to_date)) - free_days
+    return days_to_work
+
+def working_hours_on_day(user: User, date: dt.date) -> float:
+    """Return the number of hours a user has to work on a given day
+
+    Args:
+        user (User): The user for which the working hours should be calculated.
+        date (dt.date): The date for which the working hours should be calculated.
+
+    Returns:
+        float: The amount of hours to work on the given day.
+    """
+    # check if date is a weekend day
+    if date.weekday() >= 5:
+        return 0.0
+    
+    # find all contracts that are active on the given date, public holidays depend on the region of the contract
+    hours_on_day = 0.0
+    contracts = Contract.objects.filter(user=user, contract_start_date__lte=date, contract_end_date__gte=date)
+    for contract in contracts:
+        if is_free_day(date, contract.region):
+            continue
+        hours_on_day += contract.hours_per_week/5
+        # find all contract changes that are active on the given date
+        contract_changes = ContractChange.objects.filter(contract_id=contract, from_date__lte=date, to_date__gte=date)
+        for contract_change in contract_changes:
+            hours_on_day += contract_change.hours_per_week/5 - contract.hours_per_week/5
+            
+    return hours_on_day    
+
+@shadow('calc_working_time')
+@replica_reads()
+def calc_working_time(user: User) -> Tuple[float, float, float, float]:
+    """This function calculates the hours to work, the worked hours, the planned hours and the excess hours for a given user. It uses the contract start date and the contract end date. If the contract end date is in the future, the current date is used instead. We do this for all contracts of the user and sum up the hours.
+
+    Args:
+        user (User): The user for which the working time should be calculated.
+
+    Returns:
+        Tuple[float, float, float, float]: hours to work, worked hours, planned hours, excess hours
+    """
+    contracts = Contract.objects.filter(user=user, contract_start_date__range=get_employment_time(user), contract_end_date__range=get_employment_time(user))
+    hours_to_work = 0
+    for contract in contracts:
+        hours_to_work += calc_days_to_work(contract.contract_start_date, contract.contract_end_date, contract.region) * contract.hours_per_week/5
+        for contract_change in ContractChange.objects.filter(contract_id=contract, from_date__range=get_employment_time(user)):
+            start_date = contract_change.from_date
+            if contract_change.to_date is None:
+                end_date = contract.contract_end_date
+            else:
+                end_date = contract_change.to_date
+            hours_to_work += calc_days_to_work(start_date, end_date, contract.region) * (contract_change.hours_per_week/5 - contract.hours_per_week/5)
+        
+    from dateutil.rrule import rrule, DAILY
+
+    taken_holidays = Holiday.objects.filter(by_id=user, from_date__range=get_employment_time(user), to_date__range=get_employment_time(user))
+    for holiday in taken_holidays:
+        for day in rrule(DAILY, dtstart=holiday.from_date, until=holiday.to_date):
+            hours_to_work -= working_hours_on_day(user, day.date())
+    
+    tasks = Task.objects.filter(assigned_to=user, deadline__range=get_employment_time(user))
+    worked_hours = sum([task.worked_hours for task in tasks])
+    planned_hours = sum([task.total_hours for task in tasks])
+    excess_hours = hours_to_work - worked_hours
+    
+    return hours_to_work, worked_hours, planned_hours, excess_hours
+
+@shadow('do_carryover', compare_if=lambda user, only_calculate=False: only_calculate) # never run an alternate next to the saving variant
+def do_carryover(user: User, only_calculate: bool = False) -> Union[Tuple[float, float], Tuple[float, float, Contract, float, float]]:
+    """Calculates carryover from last contract. This carryover will then be set to the carryover of the longest contract that is currently active if it has a carryover of 0. This prevents that the carryover is calculated multiple times.
+
+    Args:
+        user (User): The user for which the carryover should be calculated.
+        only_calculate (bool): If True, the carryover will not be set to the longest contract.
+
+    Returns:
+        Tuple[float, float]: carryover hours, carryover holiday hours (if only_calculate is False)
+        Tuple[float, float, Contract, float, float]: carryover hours, carryover holiday hours, new contract, last semester carryover hours sum, last semester carryover holiday sum (if only_calculate is True)
+    """
+    import numpy as np
+    from dateutil.rrule import rrule, DAILY
+    from freezegun import freeze_time # only needed here, it is slow to import
+
+    last_contracts_end_date = Contract.objects.filter(user=user, contract_end_date__lt=dt.date.today()).order_by('-contract_end_date').first().contract_end_date
+    last_contracts = Contract.objects.filter(user=user, contract_end_date=last_contracts_end_date) # only nesseary because user can have multiple contracts ending at the same time
+    with freeze_time(last_contracts_end_date): # want to use my functions but they only work during a contract
+        hours_to_work, worked_hours, planned_hours, excess_hours = calc_working_time(user)
+        holiday_entitlement_sum, not_taken_holidays_sum, taken_holidays_days, remaining_holidays = calc_holiday(user) # in days
+        employment_start, employment_end = get_employment_time(user)
+        average_hours_per_day = np.mean([working_hours_on_day(user, day.date()) for day in rrule(DAILY, dtstart=employment_start, until=employment_end)])
+    
+    last_semester_carry_over_hours = sum([contract.carry_over_hours_from_last_semester for contract in last_contracts])
+    last_semester_carry_over_holiday_hours = sum([contract.carry_over_holiday_hours_from_last_semester for contract in last_contracts])
+    carryover_hours = last_semester_carry_over_hours + excess_hours
+    carryover_holiday_hours = last_semester_carry_over_holiday_hours + (holiday_entitlement_sum - taken_holidays_days) * average_hours_per_day
+        
+    # set carryover to carryover of longest contract
+    longest_contract = Contract.objects.filter(user=user, contract_start_date__lte=dt.date.today(), contract_end_date__gte=dt.date.today()).extra(select={'duration': 'contract_end_date - contract_start_date'}).order_by('-duration').first()
+    if only_calculate:
+        return carryover_hours, carryover_holiday_hours, longest_contract, last_semester_carry_over_hours, last_semester_carry_over_holiday_hours
+    else:
+        if longest_contract.carry_over_hours_from_last_semester == 0 and longest_contract.carry_over_holiday_hours_from_last_semester == 0:
+            longest_contract.carry_over_hours_from_last_semester = carryover_hours
+            longest_contract.carry_over_holiday_hours_from_last_semester = carryover_holiday_hours
+            longest_contract.save()
+                
+            return carryover_hours, carryover_holiday_hours
+        else:
+            return 0,0
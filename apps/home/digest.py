@@ -0,0 +1,118 @@
+"""Nightly digest of the SHKs that need attention: far behind or ahead on hours, holidays left shortly before the end of the contract, or tasks past their deadline with hours left. The balances are the ones of the dashboard (batch.working_time and batch.holiday_balance), calculated for chunks of prefetched users with a constant number of queries per chunk; chunks can be processed by several threads."""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+
+from .batch import prefetch_user_data, working_time, holiday_balance, longest_active_contract
+
+import datetime as dt
+
+def default_thresholds() -> dict:
+    """The thresholds from the settings.
+
+    Returns:
+        dict: 'excess_hours' (hours behind or ahead), 'holiday_days' (remaining holidays) and 'contract_end_days' (days before the end of the contract in which remaining holidays are reported)
+    """
+    return {
+        'excess_hours': getattr(settings, 'DIGEST_EXCESS_HOURS', 20),
+        'holiday_days': getattr(settings, 'DIGEST_HOLIDAY_DAYS', 5),
+        'contract_end_days': getattr(settings, 'DIGEST_CONTRACT_END_DAYS', 30),
+    }
+
+def user_flags(user: User, today: dt.date, thresholds: dict) -> List[str]:
+    """Checks the thresholds for a prefetched user.
+
+    Args:
+        user (User): prefetched user with an active contract
+        today (dt.date): reference date
+        thresholds (dict): see default_thresholds
+
+    Returns:
+        List[str]: one message per exceeded threshold, empty if everything is fine
+    """
+    flags = []
+    hours_to_work, worked_hours, planned_hours, excess_hours = working_time(user, today)
+    if excess_hours >= thresholds['excess_hours']:
+        flags.append('behind by ' + str(round(excess_hours, 1)) + ' hours (' + str(round(worked_hours, 1)) + ' of ' + str(round(hours_to_work, 1)) + ' worked)')
+    elif -excess_hours >= thresholds['excess_hours']:
+        flags.append('ahead by ' + str(round(-excess_hours, 1)) + ' hours (' + str(round(worked_hours, 1)) + ' of ' + str(round(hours_to_work, 1)) + ' worked)')
+
+    contract_end = max([contract.contract_end_date for contract in user.contracts if contract.contract_start_date <= today <= contract.contract_end_date])
+    remaining_holidays = holiday_balance(user, today)[3]
+    if remaining_holidays >= thresholds['holiday_days'] and (contract_end - today).days <= thresholds['contract_end_days']:
+        flags.append(str(round(remaining_holidays, 1)) + ' holiday days left, the contract ends ' + str(contract_end))
+
+    overdue = [task for task in user.task_list if task.deadline < today and task.worked_hours < task.total_hours]
+    if overdue:
+        flags.append(str(len(overdue)) + ' tasks past deadline with ' + str(round(sum([task.total_hours - task.worked_hours for task in overdue]), 1)) + ' hours left')
+    return flags
+
+def _chunk_flags(user_ids: List[int], today: dt.date, thresholds: dict) -> List[dict]:
+    entries = []
+    for user in prefetch_user_data(User.objects.filter(id__in=user_ids)):
+        flags = user_flags(user, today, thresholds)
+        if flags:
+            contract = longest_active_contract(user, today)
+            entries.append({'user': user, 'supervisor': contract.supervisor, 'flags': flags})
+    return entries
+
+def _threaded_chunk_flags(user_ids: List[int], today: dt.date, thresholds: dict) -> List[dict]:
+    try:
+        return _chunk_flags(user_ids, today, thresholds)
+    finally:
+        connection.close() # every thread has its own connection
+
+def _chunks(items: List[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def build_digest(today: Optional[dt.date] = None, thresholds: Optional[dict] = None, chunk_size: int = 500, workers: int = 1) -> Dict[Optional[User], List[dict]]:
+    """Checks all users with an active contract and groups the flagged ones by the supervisor of their longest active contract.
+
+    Args:
+        today (Optional[dt.date]): reference date, defaults to today
+        thresholds (Optional[dict]): see default_thresholds, missing keys are taken from the settings
+        chunk_size (int): users prefetched together
+        workers (int): threads processing the chunks, 1 for the current thread
+
+    Returns:
+        Dict[Optional[User], List[dict]]: supervisor (None for SHKs without supervisor) -> entries with 'user', 'supervisor' and 'flags', ordered by name
+    """
+    today = today or dt.date.today()
+    thresholds = dict(default_thresholds(), **(thresholds or {}))
+    user_ids = sorted(set(User.objects.filter(user__contract_start_date__lte=today, user__contract_end_date__gte=today).values_list('id', flat=True)))
+    chunks = list(_chunks(user_ids, chunk_size))
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda chunk: _threaded_chunk_flags(chunk, today, thresholds), chunks))
+    else:
+        results = [_chunk_flags(chunk, today, thresholds) for chunk in chunks]
+
+    digest = defaultdict(list)
+    for entry in [entry for result in results for entry in result]:
+        digest[entry['supervisor']].append(entry)
+    for entries in digest.values():
+        entries.sort(key=lambda entry: (entry['user'].last_name, entry['user'].first_name, entry['user'].username))
+    return dict(digest)
+
+def render_digest(supervisor: Optional[User], entries: List[dict], today: dt.date) -> str:
+    """The digest of one supervisor as plain text.
+
+    Args:
+        supervisor (Optional[User]): the supervisor, None for SHKs without supervisor
+        entries (List[dict]): see build_digest
+        today (dt.date): reference date
+
+    Returns:
+        str: the text
+    """
+    name = (supervisor.get_full_name() or supervisor.username) if supervisor else 'SHKs without supervisor'
+    lines = ['SHK digest for ' + name + ', ' + str(today), '']
+    for entry in entries:
+        lines.append((entry['user'].get_full_name() or entry['user'].username) + ':')
+        lines += ['  - ' + flag for flag in entry['flags']]
+    return '\n'.join(lines) + '\n'
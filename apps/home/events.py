@@ -0,0 +1,74 @@
+"""In-process publish/subscribe of changed users for the live dashboard. bump_user_version (called by the model signal handlers and the bulk writers) publishes the ids of the users whose data changed once the transaction is committed; every open server-sent events stream has a subscription and recomputes only the rows of these users. Subscriptions live in the event loop of the ASGI server, publishing works from any thread."""
+import asyncio
+import threading
+from typing import Iterable, Set
+
+from django.db import transaction
+
+class Subscription:
+    """Queue of changed user ids of one stream, bound to the event loop it was created in."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+_subscriptions: Set[Subscription] = set()
+_lock = threading.Lock()
+
+def subscribe() -> Subscription:
+    """Starts receiving changed user ids, must be called in the event loop of the stream.
+
+    Returns:
+        Subscription: the subscription, end it with unsubscribe
+    """
+    subscription = Subscription(asyncio.get_running_loop())
+    with _lock:
+        _subscriptions.add(subscription)
+    return subscription
+
+def unsubscribe(subscription: Subscription) -> None:
+    """Ends a subscription."""
+    with _lock:
+        _subscriptions.discard(subscription)
+
+def subscriber_count() -> int:
+    """Number of open subscriptions."""
+    return len(_subscriptions)
+
+def _deliver(user_ids: Iterable[int]) -> None:
+    with _lock:
+        subscriptions = list(_subscriptions)
+    for subscription in subscriptions:
+        for user_id in user_ids:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, user_id)
+            except RuntimeError: # the loop is closed, the stream is gone
+                unsubscribe(subscription)
+                break
+
+def publish(*user_ids: int) -> None:
+    """Tells all subscriptions that the data of users changed, after the current transaction is committed (immediately outside of transactions).
+
+    Args:
+        user_ids (int): ids of the users
+    """
+    if user_ids and _subscriptions:
+        transaction.on_commit(lambda: _deliver(user_ids))
+
+async def changed_users(subscription: Subscription, timeout: float) -> Set[int]:
+    """Waits up to timeout seconds for changes and returns all user ids published until then (empty after a timeout).
+
+    Args:
+        subscription (Subscription): the subscription
+        timeout (float): seconds to wait for the first change
+
+    Returns:
+        Set[int]: ids of the changed users
+    """
+    try:
+        changed = {await asyncio.wait_for(subscription.queue.get(), timeout)}
+    except asyncio.TimeoutError:
+        return set()
+    while not subscription.queue.empty():
+        changed.add(subscription.queue.get_nowait())
+    return changed
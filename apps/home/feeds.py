@@ -0,0 +1,163 @@
+"""iCalendar feeds of the holidays of a user or of a supervisor's team, read by calendar clients with a FeedToken in the URL. A poll first computes the state of the feed (latest Holiday.updated and number of holidays, one aggregate query on the (by_id, updated) index); the ETag and Last-Modified headers are derived from it, so unchanged feeds are answered with 304. Changed feeds are streamed from the database and the body is cached under the ETag."""
+import hashlib
+import secrets
+from typing import Iterator, List, Optional, Tuple
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Max, QuerySet
+from django.utils import timezone
+
+from .models import Holiday, Contract, FeedToken
+from .regions import free_days_of_year, region_on
+
+import datetime as dt
+
+TEAM_HISTORY_DAYS = 365 # SHKs whose last contract with the supervisor ended longer ago are not in the team feed
+
+def create_token(user: User, scope: str = FeedToken.USER, public_holidays: bool = False) -> FeedToken:
+    """Creates a new feed token.
+
+    Args:
+        user (User): owner of the token
+        scope (str): FeedToken.USER or FeedToken.TEAM
+        public_holidays (bool): include the public holidays of the region
+
+    Returns:
+        FeedToken: the token
+    """
+    return FeedToken.objects.create(user=user, token=secrets.token_urlsafe(32), scope=scope, public_holidays=public_holidays)
+
+def get_token(token: str) -> Optional[FeedToken]:
+    """The active (not revoked) feed token with this value, with the user selected.
+
+    Args:
+        token (str): the token from the URL
+
+    Returns:
+        Optional[FeedToken]: the token or None
+    """
+    return FeedToken.objects.select_related('user').filter(token=token, revoked=None).first()
+
+def feed_contracts(feed_token: FeedToken) -> List[Contract]:
+    """The contracts that decide whose holidays are in the feed and the regions of the public holidays: all contracts of the user, or the contracts of the supervisor's team that ended at most TEAM_HISTORY_DAYS ago.
+
+    Args:
+        feed_token (FeedToken): the token
+
+    Returns:
+        List[Contract]: the contracts
+    """
+    if feed_token.scope == FeedToken.TEAM:
+        since = dt.date.today() - dt.timedelta(days=TEAM_HISTORY_DAYS)
+        return list(Contract.objects.filter(supervisor=feed_token.user, contract_end_date__gte=since).only('user', 'contract_start_date', 'contract_end_date', 'region'))
+    return list(Contract.objects.filter(user=feed_token.user).only('user', 'contract_start_date', 'contract_end_date', 'region'))
+
+def feed_holidays(feed_token: FeedToken, contracts: List[Contract]) -> QuerySet:
+    """The holidays in the feed.
+
+    Args:
+        feed_token (FeedToken): the token
+        contracts (List[Contract]): see feed_contracts
+
+    Returns:
+        QuerySet: the holidays
+    """
+    if feed_token.scope == FeedToken.TEAM:
+        return Holiday.objects.filter(by_id__in={contract.user_id for contract in contracts})
+    return Holiday.objects.filter(by_id=feed_token.user)
+
+def _public_holiday_regions(feed_token: FeedToken, contracts: List[Contract], today: dt.date) -> List[str]:
+    if not feed_token.public_holidays:
+        return []
+    if feed_token.scope == FeedToken.TEAM:
+        return sorted({contract.region for contract in contracts})
+    return [region_on(contracts, today)]
+
+def feed_state(feed_token: FeedToken, contracts: List[Contract], today: Optional[dt.date] = None) -> Tuple[str, Optional[dt.datetime]]:
+    """ETag and Last-Modified of a feed. The ETag changes whenever a holiday of the feed is added, changed or deleted, the team changes or, with public holidays, the year changes.
+
+    Args:
+        feed_token (FeedToken): the token
+        contracts (List[Contract]): see feed_contracts
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Tuple[str, Optional[dt.datetime]]: the ETag (quoted) and the time of the latest change (None without holidays)
+    """
+    today = today or dt.date.today()
+    state = feed_holidays(feed_token, contracts).order_by().aggregate(latest=Max('updated'), count=Count('id'))
+    users = sorted({contract.user_id for contract in contracts}) if feed_token.scope == FeedToken.TEAM else [feed_token.user_id]
+    regions = _public_holiday_regions(feed_token, contracts, today)
+    key = '|'.join([str(feed_token.id), str(state['latest']), str(state['count']), ','.join(map(str, users)), ','.join(regions), str(today.year) if regions else ''])
+    return '"' + hashlib.sha1(key.encode()).hexdigest() + '"', state['latest']
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def _fold(line: str) -> str:
+    """Folds a content line longer than 75 characters (RFC 5545 3.1)."""
+    return '\r\n '.join([line[i:i + 74] for i in range(0, len(line), 74)]) if len(line) > 75 else line
+
+def _stamp(moment: dt.datetime) -> str:
+    return moment.astimezone(dt.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def _event(uid: str, start: dt.date, end: dt.date, summary: str, stamp: str, transparent: bool = False) -> str:
+    lines = [
+        'BEGIN:VEVENT',
+        'UID:' + uid,
+        'DTSTAMP:' + stamp,
+        'DTSTART;VALUE=DATE:' + start.strftime('%Y%m%d'),
+        'DTEND;VALUE=DATE:' + (end + dt.timedelta(days=1)).strftime('%Y%m%d'), # exclusive
+        _fold('SUMMARY:' + _escape(summary)),
+        'TRANSP:' + ('TRANSPARENT' if transparent else 'OPAQUE'),
+        'END:VEVENT',
+    ]
+    return '\r\n'.join(lines) + '\r\n'
+
+def ical_stream(feed_token: FeedToken, contracts: List[Contract], today: Optional[dt.date] = None, chunk_size: int = 500) -> Iterator[str]:
+    """Generates the iCalendar text of a feed. The holidays are read with a server side iterator in chunks, so large team feeds are not loaded at once.
+
+    Args:
+        feed_token (FeedToken): the token
+        contracts (List[Contract]): see feed_contracts
+        today (Optional[dt.date]): reference date, defaults to today
+        chunk_size (int): holidays per database fetch
+
+    Yields:
+        Iterator[str]: parts of the iCalendar text
+    """
+    today = today or dt.date.today()
+    name = 'Holidays' + (' of the team of ' if feed_token.scope == FeedToken.TEAM else ' of ') + (feed_token.user.get_full_name() or feed_token.user.username)
+    yield '\r\n'.join(['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//SHK Manager//Holidays//EN', 'CALSCALE:GREGORIAN', _fold('X-WR-CALNAME:' + _escape(name))]) + '\r\n'
+    now = _stamp(timezone.now())
+    holidays = feed_holidays(feed_token, contracts).order_by('from_date', 'id').values_list('id', 'from_date', 'to_date', 'updated', 'by_id__first_name', 'by_id__last_name', 'by_id__username')
+    for holiday_id, from_date, to_date, updated, first_name, last_name, username in holidays.iterator(chunk_size=chunk_size):
+        summary = 'Holiday' if feed_token.scope == FeedToken.USER else (' '.join(filter(None, [first_name, last_name])) or username) + ': holiday'
+        yield _event('holiday-' + str(holiday_id) + '@shk-manager', from_date, to_date, summary, _stamp(updated) if updated else now)
+    for region in _public_holiday_regions(feed_token, contracts, today):
+        for year in (today.year - 1, today.year, today.year + 1):
+            for date, holiday_name in free_days_of_year(year, region).items():
+                yield _event('public-' + region + '-' + date.isoformat() + '@shk-manager', date, date, holiday_name + (' (' + region + ')' if feed_token.scope == FeedToken.TEAM else ''), now, transparent=True)
+    yield 'END:VCALENDAR\r\n'
+
+def cached_ical_stream(etag: str, parts: Iterator[str], timeout: int = 3600) -> Iterator[str]:
+    """Passes the parts of a feed through and caches the complete text under the ETag once the last part has been sent.
+
+    Args:
+        etag (str): ETag of the feed
+        parts (Iterator[str]): see ical_stream
+        timeout (int): seconds to keep the text
+
+    Yields:
+        Iterator[str]: the parts
+    """
+    sent = []
+    for part in parts:
+        sent.append(part)
+        yield part
+    cache.set('ical:' + etag, ''.join(sent), timeout)
+
+def cached_ical(etag: str) -> Optional[str]:
+    """The cached text of a feed with this ETag, if any."""
+    return cache.get('ical:' + etag)
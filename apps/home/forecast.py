@@ -0,0 +1,107 @@
+"""Forecast of the balance of an SHK at the end of the current employment: the excess hours the dashboard (calc_working_time) will show on the last day once the open hours of the tasks are worked. The weekly course until then follows the required hours of every remaining day (batch.required_hours_timeline, booked holidays masked out) and the open hours of the tasks, each task spread evenly over the workdays until its deadline. Everything runs on prefetched data with NumPy, so a whole team is forecast with the constant number of queries of prefetch_user_data."""
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from django.contrib.auth.models import User
+
+from .batch import prefetch_user_data, employment_time, working_time, holiday_balance, required_hours_timeline, day_range, week_end_indices, active_contracts, _in_period
+from .cache import cached_per_user
+
+import datetime as dt
+
+if TYPE_CHECKING:
+    import numpy as np # imported inside the functions, it is slow to import
+
+def task_work_timeline(tasks: Iterable, from_date: dt.date, required: 'np.ndarray') -> 'np.ndarray':
+    """Hours worked on open tasks on each day, assuming that the open hours of a task (total minus worked hours) are spread evenly over the workdays from from_date to its deadline. Tasks past their deadline are done on the first workday, deadlines after the last day count as the last day.
+
+    Args:
+        tasks (Iterable): the tasks
+        from_date (dt.date): first day
+        required (np.ndarray): required hours per day from from_date on (see batch.required_hours_timeline), days with required hours are workdays
+
+    Returns:
+        np.ndarray: hours per day, same length as required; without any workday the open hours are put on the last day
+    """
+    import numpy as np
+
+    work = np.zeros(len(required))
+    tasks = [task for task in tasks if task.total_hours > task.worked_hours]
+    if len(required) == 0 or not tasks:
+        return work
+    workdays = required > 0
+    if not workdays.any():
+        work[-1] = sum([task.total_hours - task.worked_hours for task in tasks])
+        return work
+    open_hours = np.array([task.total_hours - task.worked_hours for task in tasks])
+    deadlines = np.clip(np.array([(task.deadline - from_date).days for task in tasks]), 0, len(required) - 1)
+    ends = np.maximum(deadlines, np.argmax(workdays)) # at least until the first workday
+    rates = open_hours / np.cumsum(workdays)[ends]
+    # every task works at its rate from the first day to its end: add at 0, remove after the end, running sum
+    change = np.zeros(len(required) + 1)
+    change[0] = rates.sum()
+    np.add.at(change, ends + 1, -rates)
+    return np.cumsum(change)[:-1] * workdays
+
+def user_forecast(user: User, today: Optional[dt.date] = None) -> Optional[dict]:
+    """Forecast of a prefetched user until the end of the current employment.
+
+    Args:
+        user (User): prefetched user
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Optional[dict]: None without an active contract, otherwise 'user', 'contract_end', 'excess_hours' (today), 'required_hours' and 'planned_hours' (from tomorrow until the end), 'excess_hours_at_end', 'remaining_holidays' (including the booked ones), 'weeks' (last day of every week) and 'excess' (excess hours at the end of every week)
+    """
+    import numpy as np
+
+    today = today or dt.date.today()
+    if not active_contracts(user, today):
+        return None
+    period = employment_time(user, today)
+    excess_hours = working_time(user, today, period)[3]
+    from_date = today + dt.timedelta(days=1)
+    required = required_hours_timeline(user, from_date, period[1])
+    planned = task_work_timeline([task for task in user.task_list if _in_period(task.deadline, period)], from_date, required)
+    # anchored at the end: the excess hours working_time will report on the last day once the open hours are worked,
+    # the weeks before are derived backwards from the daily required and planned hours
+    excess_at_end = working_time(user, period[1], period)[3] - planned.sum()
+    balance = np.cumsum(required - planned)
+    excess = excess_at_end - (balance[-1] - balance) if len(balance) else balance
+    days = day_range(from_date, period[1])
+    week_ends = week_end_indices(days)
+    return {
+        'user': user.id,
+        'contract_end': period[1].isoformat(),
+        'excess_hours': round(float(excess_hours), 2),
+        'required_hours': round(float(required.sum()), 2),
+        'planned_hours': round(float(planned.sum()), 2),
+        'excess_hours_at_end': round(float(excess_at_end), 2),
+        'remaining_holidays': round(float(holiday_balance(user, today, period)[3]), 2),
+        'weeks': [str(day) for day in days[week_ends]],
+        'excess': np.round(excess[week_ends], 2).tolist(),
+    }
+
+def team_forecast(users: List[User], today: Optional[dt.date] = None) -> Dict[int, Optional[dict]]:
+    """user_forecast of prefetched users.
+
+    Args:
+        users (List[User]): prefetched users
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Dict[int, Optional[dict]]: user id -> forecast
+    """
+    return {user.id: user_forecast(user, today) for user in users}
+
+def cached_forecasts(user_ids: Iterable[int], today: Optional[dt.date] = None) -> Dict[int, Optional[dict]]:
+    """Forecasts of users, each cached for the day until the user's data changes. The users whose forecast is not cached are prefetched and forecast together.
+
+    Args:
+        user_ids (Iterable[int]): ids of the users
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        Dict[int, Optional[dict]]: user id -> forecast (None without an active contract)
+    """
+    today = today or dt.date.today()
+    return cached_per_user('forecast', user_ids, lambda missing: team_forecast(prefetch_user_data(User.objects.filter(id__in=missing)), today), today)
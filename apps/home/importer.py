@@ -0,0 +1,200 @@
+"""Bulk import of contracts and contract changes from CSV or JSON. Every row has a type ('contract' or 'change') and the username of the SHK; a change belongs to the contract of the user with the given contract_start_date, which may already exist or be part of the same import.
+
+    type,username,supervisor,contract_start_date,contract_end_date,hours_per_week,from_date,to_date
+    contract,user1,supervisor1,2023-04-01,2023-09-30,10,,
+    change,user1,,2023-04-01,,20,2023-06-01,
+
+All rows are validated before anything is written, users and existing contracts and changes are loaded with one query each. The to_date chaining of ContractChange.save is done in memory and everything is written with bulk_create/bulk_update in one transaction.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from typing import Dict, IO, List, Optional, Tuple
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Contract, ContractChange
+from .cache import bump_user_version
+from .regions import REGIONS, DEFAULT_REGION
+
+import datetime as dt
+
+def read_rows(file: IO, format: Optional[str] = None, name: str = '') -> List[Tuple[int, dict]]:
+    """Reads the rows of a CSV or JSON file (a list of objects or {"rows": [...]}).
+
+    Args:
+        file (IO): the file, text or binary
+        format (Optional[str]): 'csv' or 'json', guessed from the name if None
+        name (str): file name
+
+    Raises:
+        ValueError: if the file cannot be read
+
+    Returns:
+        List[Tuple[int, dict]]: line number (CSV) or position (JSON, starting at 1) and row
+    """
+    content = file.read()
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    format = format or ('json' if name.lower().endswith('.json') else 'csv')
+    if format == 'json':
+        try:
+            rows = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError('Invalid JSON: ' + str(e))
+        rows = rows.get('rows', []) if isinstance(rows, dict) else rows
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('JSON must be a list of objects')
+        return list(enumerate(rows, start=1))
+    reader = csv.DictReader(io.StringIO(content))
+    return [(reader.line_num, {key.strip(): (value or '').strip() for key, value in row.items() if key}) for row in reader]
+
+def _date(row: dict, field: str, required: bool = True) -> Optional[dt.date]:
+    value = row.get(field)
+    if value in (None, ''):
+        if required:
+            raise ValueError(field + ' is missing')
+        return None
+    try:
+        return dt.date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(field + ' is not a date (YYYY-MM-DD): ' + str(value))
+
+def _float(row: dict, field: str, default: Optional[float] = None) -> float:
+    value = row.get(field)
+    if value in (None, ''):
+        if default is None:
+            raise ValueError(field + ' is missing')
+        return default
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(field + ' is not a number: ' + str(value))
+    if value < 0:
+        raise ValueError(field + ' must not be negative')
+    return value
+
+def chain_changes(existing: List[ContractChange], new: List[ContractChange]) -> List[ContractChange]:
+    """Does what ContractChange.save does for every new change, in memory: the latest change (by from_date) without to_date ends the day before the new change starts. New changes are added in the order of their from_date.
+
+    Args:
+        existing (List[ContractChange]): saved changes of the contract
+        new (List[ContractChange]): unsaved changes of the contract
+
+    Returns:
+        List[ContractChange]: the existing changes whose to_date was set
+    """
+    changes = list(existing)
+    updated = []
+    for change in sorted(new, key=lambda change: change.from_date):
+        previous = max(changes, key=lambda change: change.from_date, default=None)
+        if previous is not None and previous.to_date is None:
+            previous.to_date = change.from_date - dt.timedelta(days=1)
+            if previous.pk is not None and previous not in updated:
+                updated.append(previous)
+        changes.append(change)
+    return updated
+
+def import_rows(rows: List[Tuple[int, dict]], dry_run: bool = False, skip_invalid: bool = False) -> dict:
+    """Validates and imports contracts and contract changes. Without skip_invalid nothing is written if a row has an error.
+
+    Args:
+        rows (List[Tuple[int, dict]]): line number and row, see read_rows
+        dry_run (bool): only validate
+        skip_invalid (bool): import the valid rows even if other rows have errors
+
+    Returns:
+        dict: number of created contracts ('contracts') and changes ('changes'), number of existing changes whose to_date was set ('updated_changes') and the errors as (line, message) ('errors')
+    """
+    errors = []
+    usernames = {str(row.get(field)) for line, row in rows for field in ('username', 'supervisor') if row.get(field)}
+    users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+    existing_contracts = {(contract.user_id, contract.contract_start_date): contract for contract in Contract.objects.filter(user__username__in=usernames)}
+
+    contracts: Dict[Tuple[int, dt.date], Contract] = {}
+    changes: Dict[Tuple[int, dt.date], List[Tuple[int, ContractChange]]] = defaultdict(list)
+    for line, row in rows:
+        try:
+            kind = row.get('type', '')
+            user = users.get(row.get('username', ''))
+            if user is None:
+                raise ValueError('unknown user ' + str(row.get('username', '')))
+            start_date = _date(row, 'contract_start_date')
+            if kind == 'contract':
+                supervisor = None
+                if row.get('supervisor'):
+                    supervisor = users.get(row['supervisor'])
+                    if supervisor is None:
+                        raise ValueError('unknown supervisor ' + str(row['supervisor']))
+                end_date = _date(row, 'contract_end_date')
+                if end_date < start_date:
+                    raise ValueError('contract_end_date is before contract_start_date')
+                region = row.get('region') or DEFAULT_REGION
+                if region not in dict(REGIONS):
+                    raise ValueError('unknown region ' + str(region))
+                if (user.id, start_date) in existing_contracts or (user.id, start_date) in contracts:
+                    raise ValueError('contract of ' + user.username + ' starting ' + str(start_date) + ' already exists')
+                contracts[(user.id, start_date)] = Contract(
+                    user=user, supervisor=supervisor, contract_start_date=start_date, contract_end_date=end_date, region=region,
+                    hours_per_week=_float(row, 'hours_per_week'),
+                    carry_over_hours_from_last_semester=_float(row, 'carry_over_hours_from_last_semester', 0.0),
+                    carry_over_holiday_hours_from_last_semester=_float(row, 'carry_over_holiday_hours_from_last_semester', 0.0),
+                )
+            elif kind == 'change':
+                from_date, to_date = _date(row, 'from_date'), _date(row, 'to_date', required=False)
+                changes[(user.id, start_date)].append((line, ContractChange(from_date=from_date, to_date=to_date, hours_per_week=_float(row, 'hours_per_week'))))
+            else:
+                raise ValueError('type must be contract or change, not ' + str(kind))
+        except ValueError as e:
+            errors.append((line, str(e)))
+
+    # changes need their contract, from the database or from this import
+    for key, contract_changes in changes.items():
+        contract = contracts.get(key) or existing_contracts.get(key)
+        for line, change in list(contract_changes):
+            error = None
+            if contract is None:
+                error = 'no contract starting ' + str(key[1]) + ' for this user'
+            elif not contract.contract_start_date <= change.from_date <= contract.contract_end_date:
+                error = 'from_date is not within the contract'
+            elif change.to_date is not None and change.to_date < change.from_date:
+                error = 'to_date is before from_date'
+            if error:
+                errors.append((line, error))
+                contract_changes.remove((line, change))
+    errors.sort()
+
+    result = {'contracts': len(contracts), 'changes': sum([len(c) for c in changes.values()]), 'updated_changes': 0, 'errors': errors}
+    if dry_run or (errors and not skip_invalid):
+        if errors and not skip_invalid:
+            result['contracts'], result['changes'] = 0, 0
+        return result
+
+    with transaction.atomic():
+        created = Contract.objects.bulk_create(contracts.values())
+        if any(contract.pk is None for contract in created): # backends that do not return ids from bulk inserts
+            saved = {(contract.user_id, contract.contract_start_date): contract for contract in Contract.objects.filter(user_id__in={key[0] for key in contracts})}
+            contracts = {key: saved[key] for key in contracts}
+        existing_changes = defaultdict(list)
+        for change in ContractChange.objects.filter(contract_id__in=[existing_contracts[key] for key in changes if key in existing_contracts]):
+            existing_changes[change.contract_id_id].append(change)
+
+        new_changes, updated_changes = [], []
+        for key, contract_changes in changes.items():
+            contract = contracts.get(key) or existing_contracts[key]
+            for line, change in contract_changes:
+                change.contract_id = contract
+            updated_changes += chain_changes(existing_changes[contract.id], [change for line, change in contract_changes])
+            new_changes += [change for line, change in contract_changes]
+        ContractChange.objects.bulk_create(new_changes)
+        now = timezone.now()
+        for change in updated_changes:
+            change.updated = now # bulk_update does not set auto_now fields, the snapshot refresh relies on them
+        ContractChange.objects.bulk_update(updated_changes, ['to_date', 'updated'])
+        # bulk operations send no signals
+        bump_user_version(*{key[0] for key in contracts} | {key[0] for key in changes})
+    result['updated_changes'] = len(updated_changes)
+    return result
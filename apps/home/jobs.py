@@ -0,0 +1,124 @@
+import datetime as dt
+import logging
+import traceback
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.utils import timezone
+
+from core.routers import routing_scope
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry: Dict[str, Callable] = {}
+
+def job(name: str) -> Callable:
+    """Decorator registering a function as a job. The function is called with the keyword arguments given to enqueue, they and the return value must be JSON serializable.
+
+    Args:
+        name (str): name of the job
+
+    Returns:
+        Callable: the decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        _registry[name] = func
+        return func
+    return decorator
+
+def enqueue(name: str, created_by: Optional[User] = None, max_attempts: int = 3, **kwargs) -> Job:
+    """Adds a job to the queue, it is run by the next free worker (manage.py runjobs).
+
+    Args:
+        name (str): name of a registered job
+        created_by (Optional[User]): user who started the job
+        max_attempts (int): how often the job is tried before it is marked as failed
+
+    Raises:
+        KeyError: if there is no job with this name
+
+    Returns:
+        Job: the queued job, use its id to poll the status
+    """
+    if name not in _registry:
+        raise KeyError('No job registered with name ' + name)
+    return Job.objects.create(name=name, kwargs=kwargs, created_by=created_by, max_attempts=max_attempts)
+
+def claim_next() -> Optional[Job]:
+    """Claims the next due job. The status is switched with a conditional UPDATE, so two workers never run the same job.
+
+    Returns:
+        Optional[Job]: the claimed job or None if there is nothing to do
+    """
+    now = timezone.now()
+    for job_id in Job.objects.filter(status=Job.PENDING, run_after__lte=now).order_by('run_after', 'id').values_list('id', flat=True)[:10]:
+        if Job.objects.filter(id=job_id, status=Job.PENDING).update(status=Job.RUNNING, attempts=F('attempts') + 1, updated=now):
+            return Job.objects.get(id=job_id)
+    return None
+
+def run_job(job: Job) -> Job:
+    """Runs a claimed job and stores the result. A failed job is retried with exponential backoff (settings.JOBS_RETRY_DELAY seconds, doubled with every attempt) until max_attempts is reached.
+
+    Args:
+        job (Job): the claimed job
+
+    Returns:
+        Job: the job with the new status
+    """
+    try:
+        with routing_scope(): # a write of the job pins only its own reads to the primary
+            job.result = _registry[job.name](**job.kwargs)
+        job.status = Job.DONE
+        job.error = ''
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + dt.timedelta(seconds=getattr(settings, 'JOBS_RETRY_DELAY', 30) * 2 ** (job.attempts - 1))
+            logger.warning('job %s failed (attempt %s of %s), retrying', job, job.attempts, job.max_attempts)
+        else:
+            job.status = Job.FAILED
+            logger.error('job %s failed:\n%s', job, job.error)
+    job.save(update_fields=['result', 'status', 'error', 'run_after', 'updated'])
+    return job
+
+def run_pending(limit: Optional[int] = None) -> int:
+    """Runs due jobs one after another in the current thread until the queue is empty.
+
+    Args:
+        limit (Optional[int]): maximal number of jobs to run
+
+    Returns:
+        int: number of jobs run
+    """
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+def requeue_stale(timeout: int) -> int:
+    """Puts jobs back into the queue that are running for longer than timeout seconds, e.g. because their worker was killed.
+
+    Args:
+        timeout (int): seconds
+
+    Returns:
+        int: number of requeued jobs
+    """
+    return Job.objects.filter(status=Job.RUNNING, updated__lt=timezone.now() - dt.timedelta(seconds=timeout)).update(status=Job.PENDING, updated=timezone.now())
+
+@job('carryover')
+def carryover(user_id: int) -> dict:
+    """Does the carryover for a user, see batch.apply_carryover. It runs with an explicit reference date: freeze_time (used by calculations.do_carryover) patches the clock of the whole process and would be seen by the other worker threads."""
+    from .batch import prefetch_user_data, apply_carryover
+
+    carryover_hours, carryover_holiday_hours = apply_carryover(prefetch_user_data(User.objects.filter(id=user_id)), dt.date.today())[user_id]
+    return {'carryover_hours': float(carryover_hours), 'carryover_holiday_hours': float(carryover_holiday_hours)}
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+import datetime as dt
+
+from apps.home.archive import archive_user, restore_period
+from apps.home.models import ArchivedPeriod
+
+class Command(BaseCommand):
+    help = 'Moves employment periods that ended more than the retention ago (settings.ARCHIVE_RETENTION_DAYS) into ArchivedPeriod rows. The latest closed period of every user is kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=getattr(settings, 'ARCHIVE_RETENTION_DAYS', 730), help='days a closed period is kept')
+        parser.add_argument('--user', help='only archive the periods of this username')
+        parser.add_argument('--dry-run', action='store_true', help='only show what would be archived')
+        parser.add_argument('--restore', type=int, metavar='ID', help='move the records of an archived period back instead')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            try:
+                archived_period = ArchivedPeriod.objects.get(id=options['restore'])
+            except ArchivedPeriod.DoesNotExist:
+                raise CommandError('No archived period ' + str(options['restore']))
+            self.stdout.write('Restored ' + str(restore_period(archived_period)) + ' records of ' + str(archived_period) + '.')
+            return
+
+        today = dt.date.today()
+        cutoff = today - dt.timedelta(days=options['retention_days'])
+        users = User.objects.filter(user__contract_end_date__lt=cutoff).distinct().order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+        count = 0
+        for user in users:
+            for archived_period in archive_user(user, today, options['retention_days'], options['dry_run']):
+                self.stdout.write(('Would archive ' if options['dry_run'] else 'Archived ') + str(archived_period) + ' (' + str(len(archived_period.payload)) + ' bytes)')
+                count += 1
+        self.stdout.write(str(count) + ' periods ' + ('would be ' if options['dry_run'] else '') + 'archived.')
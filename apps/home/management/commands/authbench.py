@@ -0,0 +1,72 @@
+import contextlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+ENGINES = {
+    'db'            : 'django.contrib.sessions.backends.db',
+    'cached_db'     : 'django.contrib.sessions.backends.cached_db',
+    'cache'         : 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+BACKENDS = {
+    False: 'django.contrib.auth.backends.ModelBackend',
+    True : 'apps.home.auth.CachedModelBackend',
+}
+
+class Command(BaseCommand):
+    help = 'Counts the database queries of authenticated page views for every session mode, with and without the user cache. A session of the given user is created (and deleted afterwards) for every mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='user to log in as')
+        parser.add_argument('--paths', nargs='+', default=['/', '/tasks/', '/holidays/', '/history/'], help='pages to request')
+        parser.add_argument('--requests', type=int, default=10, help='requests per page and mode')
+        parser.add_argument('--modes', nargs='+', choices=list(ENGINES), default=list(ENGINES), help='session modes to compare')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('No user ' + options['username'])
+
+        self.stdout.write('%-15s %-11s %9s %9s %9s %9s' % ('session mode', 'user cache', 'queries', 'session', 'writes', 'ms'))
+        for mode in options['modes']:
+            for user_cache in (False, True):
+                with override_settings(SESSION_ENGINE=ENGINES[mode], AUTHENTICATION_BACKENDS=[BACKENDS[user_cache]]):
+                    row = self.measure(user, options['paths'], options['requests'], user_cache)
+                self.stdout.write('%-15s %-11s %9.2f %9.2f %9.2f %9.2f' % ((mode, 'yes' if user_cache else 'no') + row))
+        self.stdout.write('Per request: all queries, queries on django_session, writes to django_session, time.')
+
+    def measure(self, user: User, paths: list, requests: int, user_cache: bool) -> tuple:
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        client.force_login(user, backend=BACKENDS[user_cache])
+        caches['default'].delete('auth-user:' + str(user.id))
+        for path in paths: # first requests fill the caches
+            response = client.get(path)
+            if response.status_code != 200:
+                raise CommandError(path + ' returned ' + str(response.status_code))
+
+        with contextlib.ExitStack() as stack:
+            captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in settings.DATABASES]
+            start = time.perf_counter()
+            for i in range(requests):
+                for path in paths:
+                    client.get(path)
+            duration = time.perf_counter() - start
+        client.logout()
+
+        queries = [query['sql'] for capture in captures for query in capture.captured_queries]
+        session = [sql for sql in queries if 'django_session' in sql]
+        count = requests * len(paths)
+        return (
+            len(queries) / count,
+            len(session) / count,
+            len([sql for sql in session if not sql.lstrip().upper().startswith('SELECT')]) / count,
+            duration * 1000 / count,
+        )
@@ -0,0 +1,50 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand, CommandError
+
+import datetime as dt
+
+from apps.home.digest import build_digest, render_digest
+
+class Command(BaseCommand):
+    help = 'Writes a digest of the SHKs that need attention (hours behind or ahead, holidays left before the contract ends, overdue tasks) per supervisor into files or mails it. Meant to run nightly, e.g. from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=getattr(settings, 'DIGEST_OUTPUT_DIR', ''), help='directory for one file per supervisor (default settings.DIGEST_OUTPUT_DIR)')
+        parser.add_argument('--mail', action='store_true', help='send the digests to the supervisors with settings.EMAIL_BACKEND')
+        parser.add_argument('--excess-hours', type=float, help='hours behind or ahead to report (default settings.DIGEST_EXCESS_HOURS)')
+        parser.add_argument('--holiday-days', type=float, help='remaining holiday days to report (default settings.DIGEST_HOLIDAY_DAYS)')
+        parser.add_argument('--contract-end-days', type=int, help='days before the contract end in which remaining holidays are reported (default settings.DIGEST_CONTRACT_END_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='users loaded together')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'DIGEST_WORKERS', 1), help='threads processing the chunks')
+        parser.add_argument('--date', type=dt.date.fromisoformat, help='reference date (default today)')
+
+    def handle(self, *args, **options):
+        thresholds = {key: options[key] for key in ('excess_hours', 'holiday_days', 'contract_end_days') if options[key] is not None}
+        today = options['date'] or dt.date.today()
+        start = time.perf_counter()
+        digest = build_digest(today, thresholds, options['chunk_size'], options['workers'])
+        self.stdout.write('Checked all active SHKs in ' + str(round(time.perf_counter() - start, 2)) + ' s, ' + str(sum([len(entries) for entries in digest.values()])) + ' flagged.')
+
+        if options['output']:
+            os.makedirs(options['output'], exist_ok=True)
+        sent = 0
+        for supervisor, entries in sorted(digest.items(), key=lambda item: item[0].username if item[0] else ''):
+            text = render_digest(supervisor, entries, today)
+            if options['output']:
+                path = os.path.join(options['output'], 'digest-' + (supervisor.username if supervisor else 'no-supervisor') + '-' + str(today) + '.txt')
+                with open(path, 'w') as file:
+                    file.write(text)
+                self.stdout.write('Wrote ' + path)
+            if options['mail']:
+                if supervisor is None or not supervisor.email:
+                    self.stderr.write('No email address for ' + (supervisor.username if supervisor else 'SHKs without supervisor') + ', digest not sent.')
+                else:
+                    sent += send_mail('SHK digest ' + str(today), text, None, [supervisor.email])
+            if not options['output'] and not options['mail']:
+                self.stdout.write(text)
+        if options['mail']:
+            self.stdout.write('Sent ' + str(sent) + ' mails.')
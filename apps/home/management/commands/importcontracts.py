@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.home.importer import read_rows, import_rows
+
+class Command(BaseCommand):
+    help = 'Imports contracts and contract changes from a CSV or JSON file (see apps/home/importer.py for the columns). Nothing is written if a row has an error, unless --skip-invalid is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV or JSON file')
+        parser.add_argument('--format', choices=['csv', 'json'], help='file format, guessed from the file name if not given')
+        parser.add_argument('--dry-run', action='store_true', help='only validate the rows')
+        parser.add_argument('--skip-invalid', action='store_true', help='import the valid rows even if other rows have errors')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], 'rb') as file:
+                rows = read_rows(file, options['format'], options['file'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        result = import_rows(rows, options['dry_run'], options['skip_invalid'])
+        for line, error in result['errors']:
+            self.stderr.write('Line ' + str(line) + ': ' + error)
+        if result['errors'] and not options['skip_invalid']:
+            raise CommandError(str(len(result['errors'])) + ' of ' + str(len(rows)) + ' rows have errors, nothing imported.')
+        self.stdout.write(('Would import ' if options['dry_run'] else 'Imported ') + str(result['contracts']) + ' contracts and ' + str(result['changes']) + ' contract changes' + ('' if options['dry_run'] else ', ' + str(result['updated_changes']) + ' existing changes ended') + '.')
@@ -0,0 +1,53 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.home.jobs import claim_next, run_job, run_pending, requeue_stale
+
+class Command(BaseCommand):
+    help = 'Runs queued jobs (e.g. carryover) in a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'JOBS_WORKERS', 2), help='number of worker threads')
+        parser.add_argument('--poll-interval', type=float, default=getattr(settings, 'JOBS_POLL_INTERVAL', 2.0), help='seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='run all due jobs and exit')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale(getattr(settings, 'JOBS_TIMEOUT', 3600))
+        if requeued:
+            self.stdout.write('Requeued ' + str(requeued) + ' stale jobs.')
+        if options['once']:
+            self.stdout.write('Ran ' + str(run_pending()) + ' jobs.')
+            return
+
+        stop = threading.Event()
+
+        def work():
+            try:
+                while not stop.is_set():
+                    job = claim_next()
+                    if job is None:
+                        stop.wait(options['poll_interval'])
+                        continue
+                    job = run_job(job)
+                    self.stdout.write(str(job))
+            finally:
+                connection.close()
+
+        self.stdout.write('Starting ' + str(options['workers']) + ' workers, quit with CONTROL-C.')
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(work) for i in range(options['workers'])]
+            try:
+                while not all(future.done() for future in futures):
+                    time.sleep(0.5)
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping workers after their current job.')
+            finally:
+                stop.set()
+        for future in futures:
+            if future.exception():
+                raise future.exception()
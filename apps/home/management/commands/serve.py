@@ -0,0 +1,175 @@
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+import datetime as dt
+
+from apps.home.cache import cache_is_shared
+from apps.home.warmup import STEPS
+
+LISTEN_FD = 'SERVE_LISTEN_FD' # passed to the new master on reload, so the socket stays open
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class WorkerServer(WSGIServer):
+    """WSGIServer on an already listening socket that counts the handled requests."""
+    requests = 0
+
+    def finish_request(self, request, client_address):
+        self.requests += 1
+        super().finish_request(request, client_address)
+
+def worker_server(sock: socket.socket, handler: type, application) -> WorkerServer:
+    """WorkerServer serving an application on the listening socket of the master.
+
+    Args:
+        sock (socket.socket): the listening socket
+        handler (type): request handler class
+        application: the WSGI application
+
+    Returns:
+        WorkerServer: the server
+    """
+    server = WorkerServer(sock.getsockname()[:2], handler, bind_and_activate=False)
+    server.socket.close() # created by the constructor, never bound
+    server.socket = sock
+    server.server_name, server.server_port = socket.getfqdn(sock.getsockname()[0]), sock.getsockname()[1]
+    server.setup_environ()
+    server.set_app(application)
+    return server
+
+class Command(BaseCommand):
+    help = 'Production server: loads Django, the calculation modules, holiday calendars and templates once, then forks workers that share them copy-on-write. SIGHUP reloads the code gracefully, SIGTERM/SIGINT stop.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default=getattr(settings, 'SERVE_BIND', '127.0.0.1:8000'), help='host:port to listen on')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'SERVE_WORKERS', 2), help='number of worker processes')
+        parser.add_argument('--max-requests', type=int, default=getattr(settings, 'SERVE_MAX_REQUESTS', 1000), help='requests after which a worker is replaced, 0 for never')
+        parser.add_argument('--quiet', action='store_true', help='do not log requests')
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork'):
+            raise CommandError('serve needs os.fork, use a WSGI server with core.wsgi:application on this platform.')
+        if options['workers'] > 1 and not cache_is_shared():
+            # a write bumps the user versions only in the cache of the worker that handled it, the others would serve stale values
+            raise CommandError('serve with several workers needs a cache shared by the processes, ' + settings.CACHES['default']['BACKEND'] + ' is per process. Set CACHE_BACKEND (e.g. django.core.cache.backends.filebased.FileBasedCache with a directory as CACHE_LOCATION) or use --workers 1.')
+        self.options = options
+        self.sock = self.listen(options['bind'])
+        host, port = self.sock.getsockname()[:2]
+
+        # everything loaded here is shared with the workers
+        start = time.perf_counter()
+        from django.core.wsgi import get_wsgi_application
+        self.application = get_wsgi_application() # not core.wsgi, its WARMUP_ON_STARTUP hook would repeat the steps below
+        today = dt.date.today()
+        for name, step in STEPS:
+            # the dashboard data goes to the shared cache; a per-process cache (one worker) is left empty,
+            # a copy forked into a replacement worker would miss the changes of the previous worker
+            if name != 'dashboard data' or cache_is_shared():
+                step(today)
+        connections.close_all() # every worker opens its own connections
+        self.stdout.write('Preloaded in %.3f s, listening on http://%s:%s with %d workers (pid %d).' % (time.perf_counter() - start, host, port, options['workers'], os.getpid()))
+        self.stdout.flush()
+
+        self.workers = {}
+        self.stopping = False
+        self.reloading = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+        while not self.stopping and not self.reloading:
+            while len(self.workers) < options['workers']:
+                self.spawn()
+            self.reap()
+            time.sleep(0.1)
+
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM) # workers finish their current request
+        if self.reloading:
+            # the old workers are reaped by the new master
+            os.environ[LISTEN_FD] = str(self.sock.fileno())
+            self.stdout.write('Reloading.')
+            self.stdout.flush()
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+        while self.workers:
+            self.reap()
+            time.sleep(0.1)
+        self.stdout.write('Stopped.')
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def reload(self, signum, frame):
+        self.reloading = True
+
+    def listen(self, bind: str) -> socket.socket:
+        """Opens the listening socket, or takes over the one of the previous master after a reload.
+
+        Args:
+            bind (str): host:port
+
+        Returns:
+            socket.socket: the socket
+        """
+        if LISTEN_FD in os.environ:
+            sock = socket.socket(fileno=int(os.environ.pop(LISTEN_FD)))
+        else:
+            host, _, port = bind.rpartition(':')
+            try:
+                sock = socket.create_server((host or '127.0.0.1', int(port)), backlog=128)
+            except (OSError, ValueError) as e:
+                raise CommandError('Cannot listen on ' + bind + ': ' + str(e))
+        sock.set_inheritable(True)
+        return sock
+
+    def spawn(self) -> None:
+        """Forks a worker."""
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = time.perf_counter()
+            return
+        exit_code = 0
+        try:
+            self.work()
+        except BaseException:
+            exit_code = 1
+            import traceback
+            traceback.print_exc()
+        finally:
+            os._exit(exit_code)
+
+    def reap(self) -> None:
+        """Removes exited workers (and workers of a previous master after a reload)."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.workers.pop(pid, None)
+
+    def work(self) -> None:
+        """Serves requests on the shared socket until max-requests is reached or SIGTERM is received."""
+        stop = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(signum))
+        signal.signal(signal.SIGINT, signal.SIG_IGN) # the master stops the workers
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        random.seed()
+
+        server = worker_server(self.sock, QuietHandler if self.options['quiet'] else WSGIRequestHandler, self.application)
+        server.timeout = 1 # handle_request returns to check for SIGTERM
+
+        while not stop and (self.options['max_requests'] == 0 or server.requests < self.options['max_requests']):
+            server.handle_request()
+        connections.close_all()
@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.home.snapshot import write_snapshot
+from core.routers import replica_reads
+
+class Command(BaseCommand):
+    help = 'Writes a columnar NumPy snapshot of all contracts, contract changes, holidays and tasks for analyses (see apps/home/snapshot.py), incrementally from the previous one. Reads go to a read replica if one is configured.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=settings.SNAPSHOT_DIR, help='snapshot directory (default settings.SNAPSHOT_DIR)')
+        parser.add_argument('--full', action='store_true', help='load all rows instead of only the changed ones')
+        parser.add_argument('--keep', type=int, default=2, help='generations to keep')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with replica_reads():
+            meta = write_snapshot(options['dir'], options['full'], options['keep'])
+        for table, rows in meta['tables'].items():
+            self.stdout.write(table + ': ' + str(rows) + ' rows' + (', ' + str(meta['loaded'][table]) + ' loaded' if table in meta['loaded'] else ''))
+        self.stdout.write(('Refreshed' if meta['incremental'] else 'Wrote') + ' snapshot ' + meta['generation'] + ' in ' + str(round(time.perf_counter() - start, 2)) + ' s.')
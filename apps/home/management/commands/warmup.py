@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+import datetime as dt
+
+from apps.home.cache import cache_is_shared
+from apps.home.warmup import STEPS
+
+class Command(BaseCommand):
+    help = 'Fills the caches after a deploy or restart: modules, holiday calendars, templates and the dashboard data of active users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip', action='append', default=[], choices=[name for name, step in STEPS], help='step to skip, can be given several times')
+        parser.add_argument('--in-process', action='store_true', help='fill the caches of the current process (used by the WARMUP_ON_STARTUP hook), also with a per-process cache')
+
+    def handle(self, *args, **options):
+        today = dt.date.today()
+        skip = set(options['skip'])
+        if not options['in_process'] and not cache_is_shared() and 'dashboard data' not in skip:
+            # the values would die with this process, the server never sees them
+            self.stderr.write('The cache ' + settings.CACHES['default']['BACKEND'] + ' is per process, skipping the dashboard data. Set CACHE_BACKEND to a shared cache or use WARMUP_ON_STARTUP.')
+            skip.add('dashboard data')
+        total = time.perf_counter()
+        for name, step in STEPS:
+            if name in skip:
+                continue
+            start = time.perf_counter()
+            count = step(today)
+            self.stdout.write('%-18s %5d in %7.3f s' % (name, count, time.perf_counter() - start))
+        self.stdout.write('Warmup done in %.3f s.' % (time.perf_counter() - total))
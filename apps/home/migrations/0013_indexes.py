@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0012_contract_added_contract_updated_contractchange_added_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['user', 'contract_end_date'], name='home_contra_user_id_a9890b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['supervisor', 'contract_start_date'], name='home_contra_supervi_0fd352_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contractchange',
+            index=models.Index(fields=['contract_id', 'from_date'], name='home_contra_contrac_f63624_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='holiday',
+            index=models.Index(fields=['by_id', 'from_date'], name='home_holida_by_id_i_0bf335_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_to', 'deadline'], name='home_task_assigne_73f8c1_idx'),
+        ),
+    ]
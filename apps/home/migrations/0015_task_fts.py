@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    """Creates the full text index of the task texts (see search.py) and fills it with the existing tasks. Only on SQLite with FTS5, other databases use the icontains fallback."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if not cursor.fetchone()[0]:
+            return
+    schema_editor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS home_task_fts USING fts5(task_text, tokenize='unicode61 remove_diacritics 2')")
+    schema_editor.execute("INSERT INTO home_task_fts (rowid, task_text) SELECT id, task_text FROM home_task")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS home_task_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0014_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
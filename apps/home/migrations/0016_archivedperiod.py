@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0015_task_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPeriod',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('summary', models.JSONField(default=dict, help_text='The balances of the period as shown in the history (see batch.balance_history).')),
+                ('payload', models.BinaryField(help_text='zlib compressed JSON of the archived contracts, contract changes, holidays and tasks.')),
+                ('added', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Period',
+                'verbose_name_plural': 'Archived Periods',
+                'ordering': ['user', 'start'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'start'), name='unique_archived_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0017_contract_region'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedToken',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('scope', models.CharField(choices=[('user', 'Own holidays'), ('team', 'Holidays of the team')], default='user', max_length=4)),
+                ('public_holidays', models.BooleanField(default=False, help_text='Include the public holidays of the region.')),
+                ('revoked', models.DateTimeField(blank=True, default=None, null=True)),
+                ('added', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Calendar Feed Token',
+                'verbose_name_plural': 'Calendar Feed Tokens',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='holiday',
+            index=models.Index(fields=['by_id', 'updated'], name='home_holida_by_id_i_681453_idx'),
+        ),
+        migrations.AddField(
+            model_name='feedtoken',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_tokens', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
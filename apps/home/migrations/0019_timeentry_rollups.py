@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0018_feedtoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyHours',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('start', models.DateField()),
+                ('hours', models.FloatField(default=0)),
+                ('entries', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Hours',
+                'verbose_name_plural': 'Daily Hours',
+                'ordering': ['user', 'start'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('user', 'start'), name='unique_daily_hours')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyHours',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('start', models.DateField()),
+                ('hours', models.FloatField(default=0)),
+                ('entries', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Monthly Hours',
+                'verbose_name_plural': 'Monthly Hours',
+                'ordering': ['user', 'start'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('user', 'start'), name='unique_monthly_hours')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TimeEntry',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('hours', models.FloatField(help_text='Negative for corrections of the worked hours.')),
+                ('added', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_entries', to='home.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Time Entry',
+                'verbose_name_plural': 'Time Entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user', 'date'], name='home_timeen_user_id_949f6e_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WeeklyHours',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('start', models.DateField()),
+                ('hours', models.FloatField(default=0)),
+                ('entries', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Weekly Hours',
+                'verbose_name_plural': 'Weekly Hours',
+                'ordering': ['user', 'start'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('user', 'start'), name='unique_weekly_hours')],
+            },
+        ),
+    ]
@@ -1,10 +1,16 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
 import datetime as dt
 
+from .cache import bump_user_version
+from .search import index_task, unindex_task
+from .regions import REGIONS, DEFAULT_REGION
+from . import auth # signal handlers of the user cache
+
 # Create your models here.
 
 class Task(models.Model):
@@ -25,6 +31,7 @@ class Task(models.Model):
         verbose_name = 'Task'
         verbose_name_plural = 'Tasks'
         ordering = ['id']
+        indexes = [models.Index(fields=['assigned_to', 'deadline'])]
         
 class Holiday(models.Model):
     id = models.AutoField(primary_key=True)
@@ -41,6 +48,7 @@ class Holiday(models.Model):
         verbose_name = 'Holiday'
         verbose_name_plural = 'Holidays'
         ordering = ['id']
+        indexes = [models.Index(fields=['by_id', 'from_date']), models.Index(fields=['by_id', 'updated'])]
         
 class Contract(models.Model):
     id = models.AutoField(primary_key=True)
@@ -51,6 +59,7 @@ class Contract(models.Model):
     carry_over_hours_from_last_semester = models.FloatField(default=0, help_text='Usually 0, in the contract overview you can let the number be calculated from the last semester. Only change if you know what you are doing.')
     carry_over_holiday_hours_from_last_semester = models.FloatField(default=0, help_text='Usually 0, in the contract overview you can let the number be calculated from the last semester. Only change if you know what you are doing.')
     supervisor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='supervisor', default=None, null=True, blank=True)
+    region = models.CharField(max_length=5, choices=REGIONS, default=DEFAULT_REGION, help_text='State whose public holidays apply to the contract.')
     added = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -61,6 +70,7 @@ class Contract(models.Model):
         verbose_name = 'Contract'
         verbose_name_plural = 'Contracts'
         ordering = ['id']
+        indexes = [models.Index(fields=['user', 'contract_end_date']), models.Index(fields=['supervisor', 'contract_start_date'])]
         
 class ContractChange(models.Model):
     id = models.AutoField(primary_key=True)
@@ -78,6 +88,7 @@ class ContractChange(models.Model):
         verbose_name = 'Contract Change'
         verbose_name_plural = 'Contract Changes'
         ordering = ['id']
+        indexes = [models.Index(fields=['contract_id', 'from_date'])]
         
     def save(self, *args, **kwargs):
         if not self.pk:
@@ -90,4 +101,180 @@ class ContractChange(models.Model):
                 previous_change._skip_save = True  # Flag, so that the save method doesn't get called again
                 previous_change.save()
 
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+        
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+    
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    result = models.JSONField(default=None, null=True, blank=True)
+    error = models.TextField(default='', blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True)
+    added = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return 'Job ' + self.name + ' ' + str(self.kwargs) + ' (' + self.status + ')'
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        ordering = ['id']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+class ArchivedPeriod(models.Model):
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_periods')
+    start = models.DateField()
+    end = models.DateField()
+    summary = models.JSONField(default=dict, help_text='The balances of the period as shown in the history (see batch.balance_history).')
+    payload = models.BinaryField(help_text='zlib compressed JSON of the archived contracts, contract changes, holidays and tasks.')
+    added = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.user.username + '\'s archived period from ' + str(self.start) + ' - ' + str(self.end)
+
+    class Meta:
+        verbose_name = 'Archived Period'
+        verbose_name_plural = 'Archived Periods'
+        ordering = ['user', 'start']
+        constraints = [models.UniqueConstraint(fields=['user', 'start'], name='unique_archived_period')]
+
+class FeedToken(models.Model):
+    USER = 'user'
+    TEAM = 'team'
+    SCOPES = [(USER, 'Own holidays'), (TEAM, 'Holidays of the team')]
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_tokens')
+    token = models.CharField(max_length=64, unique=True)
+    scope = models.CharField(max_length=4, choices=SCOPES, default=USER)
+    public_holidays = models.BooleanField(default=False, help_text='Include the public holidays of the region.')
+    revoked = models.DateTimeField(default=None, null=True, blank=True)
+    added = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.user.username + '\'s ' + self.scope + ' calendar feed' + (' (revoked)' if self.revoked else '')
+
+    class Meta:
+        verbose_name = 'Calendar Feed Token'
+        verbose_name_plural = 'Calendar Feed Tokens'
+        ordering = ['id']
+
+class TimeEntry(models.Model):
+    # written through timesheet.py, which keeps Task.worked_hours and the rollups below in sync
+    id = models.AutoField(primary_key=True)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='time_entries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='time_entries')
+    date = models.DateField()
+    hours = models.FloatField(help_text='Negative for corrections of the worked hours.')
+    added = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.hours) + ' hours on ' + str(self.date) + ' by ' + self.user.username
+
+    class Meta:
+        verbose_name = 'Time Entry'
+        verbose_name_plural = 'Time Entries'
+        ordering = ['id']
+        indexes = [models.Index(fields=['user', 'date'])]
+
+class HoursRollup(models.Model):
+    # hours and number of the time entries of a user in a period starting on `start`, maintained incrementally by timesheet.py
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    start = models.DateField()
+    hours = models.FloatField(default=0)
+    entries = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.user.username + ': ' + str(self.hours) + ' hours from ' + str(self.start)
+
+    class Meta:
+        abstract = True
+        ordering = ['user', 'start']
+
+class DailyHours(HoursRollup):
+    class Meta(HoursRollup.Meta):
+        verbose_name = 'Daily Hours'
+        verbose_name_plural = 'Daily Hours'
+        constraints = [models.UniqueConstraint(fields=['user', 'start'], name='unique_daily_hours')]
+
+class WeeklyHours(HoursRollup):
+    # start is the Monday of the week
+    class Meta(HoursRollup.Meta):
+        verbose_name = 'Weekly Hours'
+        verbose_name_plural = 'Weekly Hours'
+        constraints = [models.UniqueConstraint(fields=['user', 'start'], name='unique_weekly_hours')]
+
+class MonthlyHours(HoursRollup):
+    # start is the first day of the month
+    class Meta(HoursRollup.Meta):
+        verbose_name = 'Monthly Hours'
+        verbose_name_plural = 'Monthly Hours'
+        constraints = [models.UniqueConstraint(fields=['user', 'start'], name='unique_monthly_hours')]
+
+
+
+# invalidate cached values of a user whenever their data changes; a reassigned task, holiday or contract
+# changes the data of the previous owner as well, the owner loaded from the database is kept on the instance
+OWNER_FIELDS = {Task: 'assigned_to_id', Holiday: 'by_id_id', Contract: 'user_id'}
+
+@receiver(post_init, sender=Task)
+@receiver(post_init, sender=Holiday)
+@receiver(post_init, sender=Contract)
+def remember_owner(sender, instance, **kwargs):
+    instance._loaded_owner_id = instance.__dict__.get(OWNER_FIELDS[sender]) # not loaded for deferred fields
+
+def _owners(instance) -> set:
+    return {getattr(instance, OWNER_FIELDS[type(instance)]), getattr(instance, '_loaded_owner_id', None)} - {None}
+
+def _bump_owners(instance) -> None:
+    bump_user_version(*_owners(instance))
+    instance._loaded_owner_id = getattr(instance, OWNER_FIELDS[type(instance)])
+
+@receiver([post_save, post_delete], sender=Task)
+def task_changed(sender, instance: Task, **kwargs):
+    _bump_owners(instance)
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance: Task, using: str, update_fields=None, **kwargs):
+    if update_fields is None or 'task_text' in update_fields:
+        index_task(instance.id, instance.task_text, using)
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance: Task, using: str, **kwargs):
+    unindex_task(instance.id, using)
+
+@receiver(pre_delete, sender=Task)
+def task_deleting(sender, instance: Task, **kwargs):
+    from .timesheet import remove_task_entries # timesheet imports the models
+
+    remove_task_entries(instance.id)
+
+@receiver([post_save, post_delete], sender=Holiday)
+def holiday_changed(sender, instance: Holiday, **kwargs):
+    _bump_owners(instance)
+
+@receiver([post_save, post_delete], sender=ArchivedPeriod)
+def archived_period_changed(sender, instance: ArchivedPeriod, **kwargs):
+    bump_user_version(instance.user_id)
+
+@receiver([post_save, post_delete], sender=Contract)
+def contract_changed(sender, instance: Contract, **kwargs):
+    _bump_owners(instance)
+
+@receiver([post_save, post_delete], sender=ContractChange)
+def contract_change_changed(sender, instance: ContractChange, **kwargs):
+    bump_user_version(*Contract.objects.filter(id=instance.contract_id_id).values_list('user_id', flat=True))
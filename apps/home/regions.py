@@ -0,0 +1,141 @@
+"""Calendar registry: the public holidays of the German states, one calendar per region (ISO 3166-2 code, e.g. DE-SN) and year. The calendars are built once per process and kept as dict (for names), sorted dates (for counting with bisect) and NumPy busday calendars (for day arrays), so the calculators only look them up."""
+import bisect
+import functools
+from typing import TYPE_CHECKING, Iterable, Optional, Tuple
+
+import datetime as dt
+
+if TYPE_CHECKING:
+    import numpy as np # imported inside the functions, it is slow to import
+
+DEFAULT_REGION = 'DE-SN'
+
+REGIONS = [
+    ('DE-BW', 'Baden-Württemberg'),
+    ('DE-BY', 'Bavaria'),
+    ('DE-BE', 'Berlin'),
+    ('DE-BB', 'Brandenburg'),
+    ('DE-HB', 'Bremen'),
+    ('DE-HH', 'Hamburg'),
+    ('DE-HE', 'Hesse'),
+    ('DE-MV', 'Mecklenburg-Vorpommern'),
+    ('DE-NI', 'Lower Saxony'),
+    ('DE-NW', 'North Rhine-Westphalia'),
+    ('DE-RP', 'Rhineland-Palatinate'),
+    ('DE-SL', 'Saarland'),
+    ('DE-SN', 'Saxony'),
+    ('DE-ST', 'Saxony-Anhalt'),
+    ('DE-SH', 'Schleswig-Holstein'),
+    ('DE-TH', 'Thuringia'),
+]
+
+@functools.lru_cache(maxsize=None)
+def free_days_of_year(year: int, region: str = DEFAULT_REGION) -> dict:
+    """Returns all public holidays of a region in one year. The result is cached, so the holiday calendar is only built once per region, year and process.
+
+    Args:
+        year (int): the year
+        region (str): region code, e.g. DE-SN
+
+    Returns:
+        dict: A dictionary with the date as key and the name of the holiday as value.
+    """
+    import holidays as hd
+
+    country, subdiv = region.split('-')
+    return dict(sorted(hd.country_holidays(country, subdiv = subdiv, years = [year]).items()))
+
+@functools.lru_cache(maxsize=None)
+def _sorted_free_days(year: int, region: str) -> Tuple[dt.date, ...]:
+    return tuple(free_days_of_year(year, region))
+
+def free_days(from_date: dt.date, to_date: dt.date, region: str = DEFAULT_REGION) -> dict:
+    """All public holidays of a region between two dates (both included).
+
+    Args:
+        from_date (dt.date): from date
+        to_date (dt.date): to date
+        region (str): region code
+
+    Returns:
+        dict: A dictionary with the date as key and the name of the holiday as value.
+    """
+    days = {}
+    for year in range(from_date.year, to_date.year + 1):
+        for date, name in free_days_of_year(year, region).items():
+            if from_date <= date <= to_date:
+                days[date] = name
+    return days
+
+def count_free_days(from_date: dt.date, to_date: dt.date, region: str = DEFAULT_REGION) -> int:
+    """Number of public holidays of a region between two dates (both included), weekends included, like len(free_days(...)) but without building a dict.
+
+    Args:
+        from_date (dt.date): from date
+        to_date (dt.date): to date
+        region (str): region code
+
+    Returns:
+        int: number of public holidays
+    """
+    count = 0
+    for year in range(from_date.year, to_date.year + 1):
+        days = _sorted_free_days(year, region)
+        count += bisect.bisect_right(days, to_date) - bisect.bisect_left(days, from_date)
+    return count
+
+def is_free_day(date: dt.date, region: str = DEFAULT_REGION) -> bool:
+    """Whether a date is a weekend day or a public holiday of a region."""
+    return date.weekday() >= 5 or date in free_days_of_year(date.year, region)
+
+@functools.lru_cache(maxsize=None)
+def busday_calendar(region: str, first_year: int, last_year: int) -> 'np.busdaycalendar':
+    """NumPy busday calendar (Monday to Friday without the public holidays of a region) for a range of years, built once per process.
+
+    Args:
+        region (str): region code
+        first_year (int): first year
+        last_year (int): last year
+
+    Returns:
+        np.busdaycalendar: the calendar, for np.is_busday and np.busday_count
+    """
+    import numpy as np
+
+    return np.busdaycalendar(holidays=[date for year in range(first_year, last_year + 1) for date in free_days_of_year(year, region)])
+
+def workdays(days: 'np.ndarray', region: str = DEFAULT_REGION) -> 'np.ndarray':
+    """Mask of the workdays in a day_range (see batch.day_range).
+
+    Args:
+        days (np.ndarray): consecutive days as datetime64[D]
+        region (str): region code
+
+    Returns:
+        np.ndarray: True for every day that is neither a weekend day nor a public holiday of the region
+    """
+    import numpy as np
+
+    if len(days) == 0:
+        return np.zeros(0, dtype=bool)
+    first, last = days[0].astype(dt.date), days[-1].astype(dt.date)
+    return np.is_busday(days, busdaycal=busday_calendar(region, first.year, last.year))
+
+def region_on(contracts: Iterable, date: dt.date) -> str:
+    """The region of a user on a date: the one of the contract active on that date, otherwise the one of the contract that ended last before it (or started first after it), the default region without contracts.
+
+    Args:
+        contracts (Iterable): the contracts of the user
+        date (dt.date): the date
+
+    Returns:
+        str: region code
+    """
+    best: Optional[tuple] = None
+    for contract in contracts:
+        if contract.contract_start_date <= date <= contract.contract_end_date:
+            return contract.region
+        distance = (date - contract.contract_end_date).days if contract.contract_end_date < date else (contract.contract_start_date - date).days
+        if best is None or distance < best[0]:
+            best = (distance, contract.region)
+    return best[1] if best else DEFAULT_REGION
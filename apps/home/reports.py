@@ -0,0 +1,116 @@
+from collections import defaultdict
+from typing import TYPE_CHECKING, List, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Task, Holiday, Contract, ContractChange
+from .batch import day_range, day_slice
+from .regions import DEFAULT_REGION, workdays
+
+import datetime as dt
+
+if TYPE_CHECKING:
+    import numpy as np # imported inside the functions, it is slow to import
+
+def _month_starts(days: 'np.ndarray') -> Tuple['np.ndarray', List[dt.date]]:
+    """Positions of the first day of every month in a day_range (the first day always counts) and the months."""
+    import numpy as np
+
+    months = days.astype('datetime64[M]')
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    return starts, [month.astype(dt.date) for month in months[starts]]
+
+def _month_end(month: dt.date) -> dt.date:
+    return (month + dt.timedelta(days=32)).replace(day=1) - dt.timedelta(days=1)
+
+def supervisor_month_report(from_date: dt.date, to_date: dt.date) -> dict:
+    """Aggregates contracted, worked and planned hours and taken holidays by supervisor and month, and outstanding carryover by supervisor. Worked and planned hours are grouped by the database (GROUP BY user and month of the deadline), contracted hours and holidays are expanded to day arrays and summed per month with np.add.reduceat. No per-user calculators are called.
+
+    Args:
+        from_date (dt.date): first day
+        to_date (dt.date): last day
+
+    Returns:
+        dict: months, rows per supervisor and month ('supervisor', 'month', 'contracted_hours', 'worked_hours', 'planned_hours', 'holiday_days') and totals per supervisor (with 'carryover_hours' and 'carryover_holiday_hours')
+    """
+    import numpy as np
+
+    days = day_range(from_date, to_date)
+    starts, months = _month_starts(days)
+    region_workdays = {} # region -> workday mask, built once per region
+    def workdays_of(region: str) -> 'np.ndarray':
+        if region not in region_workdays:
+            region_workdays[region] = workdays(days, region)
+        return region_workdays[region]
+
+    contracts = list(Contract.objects.filter(contract_start_date__lte=to_date, contract_end_date__gte=from_date).select_related('supervisor'))
+    changes = defaultdict(list)
+    for contract_change in ContractChange.objects.filter(contract_id__in=contracts):
+        changes[contract_change.contract_id_id].append(contract_change)
+
+    # contracted hours per supervisor and day, supervisor of every user per month
+    contracted = defaultdict(lambda: np.zeros(len(days)))
+    supervisor_of = defaultdict(dict) # user id -> month -> supervisor id
+    region_of = {} # user id -> region of the user's last contract in the range
+    for contract in contracts:
+        hours = np.zeros(len(days))
+        hours[day_slice(days, contract.contract_start_date, contract.contract_end_date)] = contract.hours_per_week/5
+        for contract_change in changes[contract.id]:
+            end_date = contract.contract_end_date if contract_change.to_date is None else min(contract_change.to_date, contract.contract_end_date)
+            hours[day_slice(days, contract_change.from_date, end_date)] += contract_change.hours_per_week/5 - contract.hours_per_week/5
+        contracted[contract.supervisor_id] += hours * workdays_of(contract.region)
+        if contract.user_id not in region_of or contract.contract_end_date >= region_of[contract.user_id][0]:
+            region_of[contract.user_id] = (contract.contract_end_date, contract.region)
+        for month in months:
+            if contract.contract_start_date <= _month_end(month) and contract.contract_end_date >= month:
+                supervisor_of[contract.user_id].setdefault(month, contract.supervisor_id)
+
+    rows = defaultdict(lambda: {'contracted_hours': 0.0, 'worked_hours': 0.0, 'planned_hours': 0.0, 'holiday_days': 0})
+    for supervisor_id, hours in contracted.items():
+        for month, total in zip(months, np.add.reduceat(hours, starts)):
+            rows[(supervisor_id, month)]['contracted_hours'] += float(total)
+
+    tasks = Task.objects.filter(deadline__range=(from_date, to_date)).annotate(month=TruncMonth('deadline')).values('assigned_to', 'month').annotate(worked=Sum('worked_hours'), planned=Sum('total_hours')).order_by()
+    for task in tasks:
+        month = task['month'] if isinstance(task['month'], dt.date) else dt.date.fromisoformat(str(task['month'])[:10])
+        row = rows[(supervisor_of[task['assigned_to']].get(month), month)]
+        row['worked_hours'] += task['worked']
+        row['planned_hours'] += task['planned']
+
+    holiday_days = defaultdict(lambda: np.zeros(len(days), dtype=int))
+    for holiday in Holiday.objects.filter(from_date__lte=to_date, to_date__gte=from_date):
+        holiday_days[holiday.by_id_id][day_slice(days, holiday.from_date, holiday.to_date)] = 1
+    for user_id, taken in holiday_days.items():
+        for month, total in zip(months, np.add.reduceat(taken * workdays_of(region_of.get(user_id, (None, DEFAULT_REGION))[1]), starts)):
+            if total:
+                rows[(supervisor_of[user_id].get(month), month)]['holiday_days'] += int(total)
+
+    totals = defaultdict(lambda: {'contracted_hours': 0.0, 'worked_hours': 0.0, 'planned_hours': 0.0, 'holiday_days': 0, 'carryover_hours': 0.0, 'carryover_holiday_hours': 0.0})
+    for (supervisor_id, month), row in rows.items():
+        for key, value in row.items():
+            totals[supervisor_id][key] += value
+    today = dt.date.today()
+    carryover = Contract.objects.filter(contract_start_date__lte=today, contract_end_date__gte=today).values('supervisor').annotate(hours=Sum('carry_over_hours_from_last_semester'), holiday_hours=Sum('carry_over_holiday_hours_from_last_semester')).order_by()
+    for row in carryover:
+        totals[row['supervisor']]['carryover_hours'] += row['hours']
+        totals[row['supervisor']]['carryover_holiday_hours'] += row['holiday_hours']
+
+    names = {user.id: (user.get_full_name() or user.username) for user in User.objects.filter(id__in=[supervisor_id for supervisor_id in totals if supervisor_id is not None])}
+    return {
+        'months': months,
+        'rows': [dict(row, supervisor=names.get(supervisor_id, 'No supervisor'), month=month) for (supervisor_id, month), row in sorted(rows.items(), key=lambda item: (names.get(item[0][0], ''), item[0][1]))],
+        'totals': [dict(total, supervisor=names.get(supervisor_id, 'No supervisor')) for supervisor_id, total in sorted(totals.items(), key=lambda item: names.get(item[0], ''))],
+    }
+
+def cached_supervisor_month_report(from_date: dt.date, to_date: dt.date) -> dict:
+    """supervisor_month_report, cached for settings.REPORT_CACHE_TTL seconds."""
+    key = 'supervisor-month-report:' + str(from_date) + ':' + str(to_date)
+    report = cache.get(key)
+    if report is None:
+        report = supervisor_month_report(from_date, to_date)
+        cache.set(key, report, getattr(settings, 'REPORT_CACHE_TTL', 300))
+    return report
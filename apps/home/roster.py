@@ -0,0 +1,28 @@
+from typing import List, Optional
+
+from django.contrib.auth.models import User
+
+from .models import Contract
+
+import datetime as dt
+
+def active_roster(supervisor: Optional[User] = None, today: Optional[dt.date] = None) -> List[Contract]:
+    """The SHKs with a contract active on a date, each only once. Loaded with one query that uses the (supervisor, contract_start_date) index, so the cost depends on the current team and not on all contracts ever made. For every SHK the longest active contract is returned (the one do_carryover writes the carryover to), with the user selected.
+
+    Args:
+        supervisor (Optional[User]): only SHKs of this supervisor, all SHKs if None
+        today (Optional[dt.date]): reference date, defaults to today
+
+    Returns:
+        List[Contract]: one contract per SHK, ordered by name
+    """
+    today = today or dt.date.today()
+    contracts = Contract.objects.filter(contract_start_date__lte=today, contract_end_date__gte=today).select_related('user')
+    if supervisor is not None:
+        contracts = contracts.filter(supervisor=supervisor)
+    roster = {}
+    for contract in contracts.order_by('id'):
+        current = roster.get(contract.user_id)
+        if current is None or contract.contract_end_date - contract.contract_start_date > current.contract_end_date - current.contract_start_date:
+            roster[contract.user_id] = contract
+    return sorted(roster.values(), key=lambda contract: (contract.user.last_name, contract.user.first_name, contract.user.username))
@@ -0,0 +1,99 @@
+import re
+from functools import reduce
+from operator import and_
+from typing import List
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+
+# Task texts are indexed in the SQLite FTS5 table home_task_fts (created by migration 0015_task_fts), the
+# rowid of an entry is the id of the task. The signal handlers in models.py keep it in sync. On other
+# database backends, or if SQLite was built without FTS5, search_tasks falls back to icontains.
+
+FTS_TABLE = 'home_task_fts'
+
+_available = {}
+
+def fts_available(alias: str = 'default') -> bool:
+    """Whether the task text index exists in the given database. The result is remembered per database.
+
+    Args:
+        alias (str): database alias
+
+    Returns:
+        bool: True if the database is SQLite and has the index table
+    """
+    if alias not in _available:
+        connection = connections[alias]
+        _available[alias] = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _available[alias]
+
+def search_terms(query: str) -> List[str]:
+    """Splits a search query into words, everything that is not a letter or digit is ignored, so user input never contains FTS5 syntax.
+
+    Args:
+        query (str): the search query
+
+    Returns:
+        List[str]: the words
+    """
+    return re.findall(r'\w+', query)
+
+def fts_query(terms: List[str]) -> str:
+    """FTS5 query matching entries that contain all terms, as words or prefixes of words.
+
+    Args:
+        terms (List[str]): the words
+
+    Returns:
+        str: the query for MATCH
+    """
+    return ' '.join('"' + term + '"*' for term in terms)
+
+def index_task(task_id: int, task_text: str, alias: str = 'default') -> None:
+    """Adds or replaces a task in the index.
+
+    Args:
+        task_id (int): id of the task
+        task_text (str): text of the task
+        alias (str): database alias
+    """
+    if not fts_available(alias):
+        return
+    with connections[alias].cursor() as cursor:
+        cursor.execute('DELETE FROM ' + FTS_TABLE + ' WHERE rowid = %s', [task_id])
+        cursor.execute('INSERT INTO ' + FTS_TABLE + ' (rowid, task_text) VALUES (%s, %s)', [task_id, task_text])
+
+def unindex_task(task_id: int, alias: str = 'default') -> None:
+    """Removes a task from the index.
+
+    Args:
+        task_id (int): id of the task
+        alias (str): database alias
+    """
+    if not fts_available(alias):
+        return
+    with connections[alias].cursor() as cursor:
+        cursor.execute('DELETE FROM ' + FTS_TABLE + ' WHERE rowid = %s', [task_id])
+
+def search_tasks(tasks: QuerySet, query: str) -> QuerySet:
+    """Restricts tasks to the ones whose text matches the query, best matches first. With the index the text is looked up with MATCH and ranked by bm25 in the same query as the restriction of the given queryset, without it all words must be contained (icontains) and the latest deadlines come first.
+
+    Args:
+        tasks (QuerySet): tasks the user may see, see views.tasks_for
+        query (str): the search query
+
+    Returns:
+        QuerySet: the matching tasks
+    """
+    terms = search_terms(query)
+    if len(terms) == 0:
+        return tasks.none()
+    if not fts_available(tasks.db):
+        return tasks.filter(reduce(and_, [Q(task_text__icontains=term) for term in terms])).order_by('-deadline', '-id')
+    return tasks.extra(
+        tables=[FTS_TABLE],
+        where=[FTS_TABLE + '.rowid = home_task.id', FTS_TABLE + ' MATCH %s'],
+        params=[fts_query(terms)],
+        select={'rank': FTS_TABLE + '.rank'},
+    ).order_by('rank', '-deadline')
@@ -0,0 +1,114 @@
+import functools
+import logging
+import random
+import threading
+import time
+from numbers import Number
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# alternates registered in code, settings.SHADOW_ALTERNATES takes precedence
+_alternates: Dict[str, Callable] = {}
+_state = threading.local()
+
+def register_alternate(name: str, func: Optional[Callable]) -> None:
+    """Registers an alternate implementation for a shadowed function. Passing None removes the registration.
+
+    Args:
+        name (str): The name the function was shadowed with, e.g. 'calc_working_time'.
+        func (Optional[Callable]): The alternate implementation, it must accept the same arguments as the current function.
+    """
+    if func is None:
+        _alternates.pop(name, None)
+    else:
+        _alternates[name] = func
+
+def get_alternate(name: str) -> Optional[Callable]:
+    """Returns the alternate implementation for a shadowed function, first looking into settings.SHADOW_ALTERNATES (dotted paths) and then into the registered alternates.
+
+    Args:
+        name (str): The name the function was shadowed with.
+
+    Returns:
+        Optional[Callable]: The alternate implementation or None if there is none.
+    """
+    path = getattr(settings, 'SHADOW_ALTERNATES', {}).get(name)
+    if path:
+        return import_string(path) if isinstance(path, str) else path
+    return _alternates.get(name)
+
+def differences(legacy: Any, alternate: Any, tolerance: float) -> List[int]:
+    """Compares two results element by element. Numbers are compared with the given absolute tolerance, everything else must be equal.
+
+    Args:
+        legacy (Any): result of the current implementation
+        alternate (Any): result of the alternate implementation
+        tolerance (float): maximal absolute difference between two numbers
+
+    Returns:
+        List[int]: indices of the elements that differ, [0] if the results are not comparable at all
+    """
+    if not isinstance(legacy, tuple):
+        legacy, alternate = (legacy,), (alternate,)
+    if not isinstance(alternate, tuple) or len(legacy) != len(alternate):
+        return [0]
+    diffs = []
+    for i, (a, b) in enumerate(zip(legacy, alternate)):
+        if isinstance(a, Number) and isinstance(b, Number) and not isinstance(a, bool):
+            if abs(float(a) - float(b)) > tolerance:
+                diffs.append(i)
+        elif a != b:
+            diffs.append(i)
+    return diffs
+
+def shadow(name: str, compare_if: Optional[Callable[..., bool]] = None) -> Callable:
+    """Decorator that runs an alternate implementation next to the decorated function for a sample of calls (settings.SHADOW_SAMPLE_RATE). The result of the decorated function is always returned, differences above settings.SHADOW_TOLERANCE are logged together with both timings.
+
+    Args:
+        name (str): The name under which the alternate is looked up.
+        compare_if (Optional[Callable[..., bool]]): Gets the call arguments, the alternate only runs if it returns True. Use it to exclude calls with side effects.
+
+    Returns:
+        Callable: the decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # nested calls (e.g. calc_working_time inside do_carryover) are not sampled again
+            if getattr(_state, 'active', False):
+                return func(*args, **kwargs)
+            sample_rate = getattr(settings, 'SHADOW_SAMPLE_RATE', 0.0)
+            if sample_rate <= 0 or random.random() >= sample_rate:
+                return func(*args, **kwargs)
+            alternate = get_alternate(name)
+            if alternate is None or (compare_if is not None and not compare_if(*args, **kwargs)):
+                return func(*args, **kwargs)
+
+            _state.active = True
+            try:
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                legacy_time = time.perf_counter() - start
+                try:
+                    start = time.perf_counter()
+                    alternate_result = alternate(*args, **kwargs)
+                    alternate_time = time.perf_counter() - start
+                except Exception:
+                    logger.exception('shadow %s: alternate %r failed', name, alternate)
+                    return result
+            finally:
+                _state.active = False
+
+            tolerance = getattr(settings, 'SHADOW_TOLERANCE', 1e-6)
+            diffs = differences(result, alternate_result, tolerance)
+            if diffs:
+                logger.warning('shadow %s: results differ at %s, legacy=%r (%.2f ms), alternate=%r (%.2f ms), args=%r', name, diffs, result, legacy_time * 1000, alternate_result, alternate_time * 1000, args)
+            else:
+                logger.info('shadow %s: results match, legacy %.2f ms, alternate %.2f ms', name, legacy_time * 1000, alternate_time * 1000)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,224 @@
+"""Columnar snapshot of all contracts, contract changes, holidays and tasks for analyses outside of the application. Every column is a NumPy .npy file that readers open with np.load(mmap_mode='r'), without parsing and without touching the database:
+
+    <dir>/CURRENT                          name of the latest generation
+    <dir>/<generation>/meta.json           row counts and the start time of the snapshot
+    <dir>/<generation>/<table>/<column>.npy
+
+Ids are int32, dates int32 day numbers since 1970-01-01 (NULL_DAY for none, `days.astype('datetime64[D]')` converts them), hours float32. Users (SHKs and supervisors) are dictionary encoded: user columns hold the position in the users table (-1 for none), regions the position in REGIONS. A refresh only loads the rows whose `updated` is not older than the start of the previous snapshot (minus OVERLAP) plus rows that are new to the snapshot, and drops deleted rows; it writes a new generation, so readers of the previous one are not disturbed.
+"""
+import json
+import os
+import shutil
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .models import Contract, ContractChange, Holiday, Task
+from .regions import REGIONS
+
+import datetime as dt
+
+if TYPE_CHECKING:
+    import numpy as np # imported inside the functions, it is slow to import
+
+NULL_DAY = -2**31
+CHUNK_SIZE = 500 # ids per query when loading rows that are new to the snapshot
+OVERLAP = dt.timedelta(minutes=1) # rows written shortly before the previous snapshot are loaded again, their transactions may have committed after it
+
+# table -> model and columns: (column, field, kind)
+TABLES = {
+    'contracts': (Contract, [
+        ('id', 'id', 'id'),
+        ('user', 'user_id', 'user'),
+        ('supervisor', 'supervisor_id', 'user'),
+        ('start', 'contract_start_date', 'day'),
+        ('end', 'contract_end_date', 'day'),
+        ('hours_per_week', 'hours_per_week', 'hours'),
+        ('carry_over_hours', 'carry_over_hours_from_last_semester', 'hours'),
+        ('carry_over_holiday_hours', 'carry_over_holiday_hours_from_last_semester', 'hours'),
+        ('region', 'region', 'region'),
+    ]),
+    'contract_changes': (ContractChange, [
+        ('id', 'id', 'id'),
+        ('contract', 'contract_id_id', 'id'),
+        ('from', 'from_date', 'day'),
+        ('to', 'to_date', 'day'),
+        ('hours_per_week', 'hours_per_week', 'hours'),
+    ]),
+    'holidays': (Holiday, [
+        ('id', 'id', 'id'),
+        ('user', 'by_id_id', 'user'),
+        ('from', 'from_date', 'day'),
+        ('to', 'to_date', 'day'),
+    ]),
+    'tasks': (Task, [
+        ('id', 'id', 'id'),
+        ('assigned_to', 'assigned_to_id', 'user'),
+        ('assigner', 'assigner_id', 'user'),
+        ('deadline', 'deadline', 'day'),
+        ('total_hours', 'total_hours', 'hours'),
+        ('worked_hours', 'worked_hours', 'hours'),
+    ]),
+}
+
+USER_COLUMNS = [('id', 'id'), ('username', 'username'), ('first_name', 'first_name'), ('last_name', 'last_name')]
+
+def _encode(values: list, kind: str, user_ids: 'np.ndarray') -> 'np.ndarray':
+    import numpy as np
+
+    if kind == 'id':
+        return np.array(values, dtype=np.int32)
+    if kind == 'hours':
+        return np.array(values, dtype=np.float32)
+    if kind == 'day':
+        days = np.array(values, dtype='datetime64[D]')
+        return np.where(np.isnat(days), NULL_DAY, days.astype(np.int64)).astype(np.int32)
+    if kind == 'region':
+        codes = {code: i for i, (code, name) in enumerate(REGIONS)}
+        return np.array([codes.get(value, -1) for value in values], dtype=np.int8)
+    # user: position in the users table
+    ids = np.array([-1 if value is None else value for value in values], dtype=np.int64)
+    return _user_codes(ids, user_ids)
+
+def _user_codes(ids: 'np.ndarray', user_ids: 'np.ndarray') -> 'np.ndarray':
+    import numpy as np
+
+    if len(user_ids) == 0:
+        return np.full(len(ids), -1, dtype=np.int32)
+    positions = np.minimum(np.searchsorted(user_ids, ids), len(user_ids) - 1)
+    return np.where(user_ids[positions] == ids, positions, -1).astype(np.int32)
+
+def _load_rows(columns: list, queryset, user_ids: 'np.ndarray') -> Dict[str, 'np.ndarray']:
+    fields = [field for column, field, kind in columns]
+    rows = list(queryset.order_by().values_list(*fields).iterator(chunk_size=2000))
+    values = list(zip(*rows)) if rows else [[] for field in fields]
+    return {column: _encode(list(values[i]), kind, user_ids) for i, (column, field, kind) in enumerate(columns)}
+
+def _users() -> Dict[str, 'np.ndarray']:
+    import numpy as np
+
+    rows = list(User.objects.order_by('id').values_list(*[field for column, field in USER_COLUMNS]))
+    values = list(zip(*rows)) if rows else [[] for column in USER_COLUMNS]
+    users = {'id': np.array(values[0], dtype=np.int32)}
+    for i, (column, field) in enumerate(USER_COLUMNS[1:], start=1):
+        users[column] = np.array(values[i], dtype=str) if rows else np.array([], dtype='<U1')
+    return users
+
+def refresh_table(name: str, previous: Optional[Dict[str, 'np.ndarray']], since: Optional[dt.datetime], previous_user_ids: Optional['np.ndarray'], user_ids: 'np.ndarray') -> Tuple[Dict[str, 'np.ndarray'], int]:
+    """Builds the columns of a table, from scratch or from the previous generation.
+
+    Args:
+        name (str): table, a key of TABLES
+        previous (Optional[Dict[str, np.ndarray]]): the columns of the previous generation, None for a full load
+        since (Optional[dt.datetime]): start of the previous snapshot, rows updated since then are loaded again
+        previous_user_ids (Optional[np.ndarray]): ids of the users table of the previous generation
+        user_ids (np.ndarray): ids of the new users table
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], int]: the columns sorted by id and the number of loaded rows
+    """
+    import numpy as np
+
+    model, columns = TABLES[name]
+    if previous is None:
+        loaded = _load_rows(columns, model.objects.all(), user_ids)
+        order = np.argsort(loaded['id'], kind='stable')
+        return {column: values[order] for column, values in loaded.items()}, len(order)
+
+    live_ids = np.fromiter(model.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=10000), dtype=np.int64)
+    changed = _load_rows(columns, model.objects.filter(updated__gte=since - OVERLAP), user_ids)
+    new_ids = np.setdiff1d(live_ids, np.concatenate([previous['id'], changed['id']]).astype(np.int64), assume_unique=False)
+    parts = [changed]
+    for i in range(0, len(new_ids), CHUNK_SIZE):
+        parts.append(_load_rows(columns, model.objects.filter(id__in=new_ids[i:i + CHUNK_SIZE].tolist()), user_ids))
+
+    # rows of the previous generation that still exist and were not loaded again, users re-encoded for the new users table
+    keep = np.isin(previous['id'], live_ids) & ~np.isin(previous['id'], changed['id'])
+    kept = {}
+    for column, field, kind in columns:
+        values = previous[column][keep]
+        if kind == 'user':
+            values = _user_codes(np.where(values >= 0, previous_user_ids[np.maximum(values, 0)], -1).astype(np.int64), user_ids)
+        kept[column] = values
+    merged = {column: np.concatenate([kept[column]] + [part[column] for part in parts]) for column, field, kind in columns}
+    order = np.argsort(merged['id'], kind='stable')
+    return {column: values[order] for column, values in merged.items()}, sum([len(part['id']) for part in parts])
+
+def current_generation(path: str) -> Optional[str]:
+    """Name of the latest generation in a snapshot directory, None if there is none."""
+    try:
+        with open(os.path.join(path, 'CURRENT')) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def load_snapshot(path: str, mmap_mode: Optional[str] = 'r') -> dict:
+    """Opens the latest generation of a snapshot.
+
+    Args:
+        path (str): snapshot directory
+        mmap_mode (Optional[str]): passed to np.load, None to read the arrays into memory
+
+    Returns:
+        dict: 'meta' and one dict of columns per table (including 'users')
+    """
+    import numpy as np
+
+    generation = current_generation(path)
+    if generation is None:
+        raise FileNotFoundError('No snapshot in ' + path)
+    directory = os.path.join(path, generation)
+    with open(os.path.join(directory, 'meta.json')) as file:
+        snapshot = {'meta': json.load(file)}
+    for table in list(TABLES) + ['users']:
+        table_directory = os.path.join(directory, table)
+        snapshot[table] = {name[:-4]: np.load(os.path.join(table_directory, name), mmap_mode=mmap_mode) for name in sorted(os.listdir(table_directory)) if name.endswith('.npy')}
+    return snapshot
+
+def _write_generation(path: str, generation: str, tables: Dict[str, Dict[str, 'np.ndarray']], meta: dict) -> None:
+    import numpy as np
+
+    directory = os.path.join(path, generation)
+    for table, columns in tables.items():
+        os.makedirs(os.path.join(directory, table))
+        for column, values in columns.items():
+            np.save(os.path.join(directory, table, column + '.npy'), np.ascontiguousarray(values))
+    with open(os.path.join(directory, 'meta.json'), 'w') as file:
+        json.dump(meta, file, indent=2)
+    # switch readers to the new generation atomically
+    with open(os.path.join(path, 'CURRENT.tmp'), 'w') as file:
+        file.write(generation)
+    os.replace(os.path.join(path, 'CURRENT.tmp'), os.path.join(path, 'CURRENT'))
+
+def _prune(path: str, keep: int) -> List[str]:
+    current = current_generation(path)
+    generations = sorted([name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))])
+    removed = [name for name in generations[:-keep] if name != current] if keep > 0 else []
+    for name in removed:
+        shutil.rmtree(os.path.join(path, name))
+    return removed
+
+def write_snapshot(path: str, full: bool = False, keep: int = 2) -> dict:
+    """Writes a new generation of the snapshot, incrementally from the latest one unless full is set.
+
+    Args:
+        path (str): snapshot directory, created if missing
+        full (bool): load all rows instead of only the changed ones
+        keep (int): generations to keep (readers may still use the previous one)
+
+    Returns:
+        dict: the meta data of the new generation: 'generation', 'created', 'incremental', 'regions', 'null_day', 'tables' (rows per table) and 'loaded' (rows read from the database per table)
+    """
+    os.makedirs(path, exist_ok=True)
+    now = timezone.now() # before reading, rows changed while the snapshot is written are loaded again next time
+    previous = None if full or current_generation(path) is None else load_snapshot(path, mmap_mode=None)
+    since = dt.datetime.fromisoformat(previous['meta']['created']) if previous else None
+    users = _users()
+    tables, meta = {'users': users}, {'generation': now.strftime('%Y%m%dT%H%M%S%f'), 'created': now.isoformat(), 'incremental': previous is not None, 'regions': [code for code, name in REGIONS], 'null_day': NULL_DAY, 'tables': {}, 'loaded': {}}
+    for table in TABLES:
+        tables[table], meta['loaded'][table] = refresh_table(table, previous[table] if previous else None, since, previous['users']['id'] if previous else None, users['id'])
+    meta['tables'] = {table: len(columns['id']) for table, columns in tables.items()}
+    _write_generation(path, meta['generation'], tables, meta)
+    _prune(path, keep)
+    return meta
@@ -1,6 +1,7 @@
 from django import template
 
-from ..views import get_free_days, business_days
+from ..calculations import get_free_days, business_days
+from ..regions import DEFAULT_REGION, count_free_days
 
 register = template.Library()
 
@@ -8,4 +9,9 @@ register = template.Library()
 def busdays(value, arg):
     """Counts the number of business days between two dates."""
     free_days = get_free_days(value, arg)
-    return business_days(value, arg) - len(free_days.keys())
\ No newline at end of file
+    return business_days(value, arg) - len(free_days.keys())
+
+@register.filter
+def holiday_busdays(holiday):
+    """Counts the number of business days of a holiday, with the public holidays of holiday.region (set by the view, the default region otherwise)."""
+    return business_days(holiday.from_date, holiday.to_date) - count_free_days(holiday.from_date, holiday.to_date, getattr(holiday, 'region', DEFAULT_REGION))
@@ -1,9 +1,10 @@
 from django import template
-from django.contrib.auth.models import Group, User
+from django.contrib.auth.models import User
+
+from ..auth import group_names
 
 register = template.Library()
 
 @register.filter(name='has_group') 
 def has_group(user: User, group_name: str):
-    group =  Group.objects.get(name=group_name) 
-    return group in user.groups.all() 
\ No newline at end of file
+    return group_name in group_names(user)
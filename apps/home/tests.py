@@ -1,11 +1,51 @@
-from django.test import TestCase
+from django.test import TestCase, RequestFactory, override_settings
+from django.conf import settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core import mail
+from django.core.handlers.wsgi import WSGIHandler
 
 import datetime as dt
+import json
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from urllib.request import urlopen
 from freezegun import freeze_time
+import numpy as np
 
-from .models import Holiday, Contract, Task, ContractChange
-from django.contrib.auth.models import User
-from .views import calc_holiday, calc_days_to_work, calc_working_time, get_free_days, business_days, get_employment_time, do_carryover, working_hours_on_day
+from .models import Holiday, Contract, Task, ContractChange, Job, ArchivedPeriod, FeedToken, TimeEntry, DailyHours, WeeklyHours, MonthlyHours
+from django.contrib.auth.models import User, Group
+from .views import calc_holiday, calc_days_to_work, calc_working_time, get_free_days, business_days, get_employment_time, do_carryover, working_hours_on_day, is_supervisor, is_shkofficer, cached_working_time, cached_balance_history, cached_series, dashboard_stream
+from .shadow import register_alternate
+from . import batch, jobs
+from .reports import supervisor_month_report
+from .search import search_tasks, fts_available
+from .archive import archive_user, restore_period
+from .roster import active_roster
+from .importer import read_rows, import_rows
+from .absence import team_absences, calendar_range
+from .digest import build_digest, render_digest
+from .regions import free_days, count_free_days, region_on, workdays
+from .feeds import create_token
+from .forecast import user_forecast, task_work_timeline, cached_forecasts
+from .snapshot import write_snapshot, load_snapshot, NULL_DAY
+from .timesheet import add_entries, change_entry, delete_entries, set_worked_hours, rollup_rows
+from . import events
+from asgiref.sync import sync_to_async
+from .templatetags.date_extras import busdays, holiday_busdays
+from .management.commands.serve import Command as ServeCommand, QuietHandler, worker_server
+from core.routers import PrimaryReplicaRouter, replica_reads, pin_to_primary, routing_scope
 
 # Create your tests here.
 
@@ -382,4 +422,1347 @@ class FunctionsTests(TestCase):
         c1 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,5,1), contract_end_date=dt.date(2023,5,7), hours_per_week=10)
         c2 = Contract.objects.create(user=u, contract_start_date=dt.date(2022,6,26), contract_end_date=dt.date(2022,6,30), hours_per_week=10)
         cc = ContractChange.objects.create(contract_id=c2, from_date=dt.date(2022,6,26), to_date=dt.date(2022,6,26), hours_per_week=20)
-        self.assertEqual(working_hours_on_day(u, dt.date(2023,5,2)), 2.0)
\ No newline at end of file
+        self.assertEqual(working_hours_on_day(u, dt.date(2023,5,2)), 2.0)
+
+class ShadowModeTests(TestCase):
+    def tearDown(self):
+        register_alternate('calc_working_time', None)
+        register_alternate('do_carryover', None)
+
+    @freeze_time("2023-07-13")
+    @override_settings(SHADOW_SAMPLE_RATE=1.0)
+    def test_shadow_logs_difference(self):
+        """Alternate returns one hour more, the difference is logged and the result of the current implementation is returned
+        """
+        u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        c = Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,12), contract_end_date=dt.date(2023,6,18), hours_per_week=5)
+        register_alternate('calc_working_time', lambda user: (6.0, 0.0, 0.0, 6.0))
+        with self.assertLogs('apps.home.shadow', level='WARNING') as logs:
+            self.assertEqual(calc_working_time(u), (5.0, 0.0, 0.0, 5.0))
+        self.assertIn('differ at [0, 3]', logs.output[0])
+
+    @freeze_time("2023-07-13")
+    @override_settings(SHADOW_SAMPLE_RATE=1.0, SHADOW_TOLERANCE=0.01)
+    def test_shadow_within_tolerance(self):
+        """Alternate differs less than the tolerance, nothing is logged as warning
+        """
+        u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        c = Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,12), contract_end_date=dt.date(2023,6,18), hours_per_week=5)
+        register_alternate('calc_working_time', lambda user: (5.001, 0.0, 0.0, 5.001))
+        with self.assertLogs('apps.home.shadow', level='INFO') as logs:
+            calc_working_time(u)
+        self.assertIn('results match', logs.output[0])
+
+    @freeze_time("2023-06-26")
+    @override_settings(SHADOW_SAMPLE_RATE=1.0)
+    def test_shadow_skips_saving_carryover(self):
+        """The alternate must not run next to a carryover that is saved
+        """
+        u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        c1 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,19), contract_end_date=dt.date(2023,6,23), hours_per_week=5)
+        c2 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,26), contract_end_date=dt.date(2023,6,30), hours_per_week=10)
+        calls = []
+        register_alternate('do_carryover', lambda *args, **kwargs: calls.append(args))
+        self.assertEqual(do_carryover(u), (5.0, 0.0))
+        self.assertEqual(calls, [])
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='admin', email='admin@example.com')
+        self.client.force_login(self.admin)
+
+    def _changelist_queries(self, model_name: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:home_' + model_name + '_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_constant_queries(self):
+        """The number of queries of the changelists does not depend on the number of rows
+        """
+        def add_user(i):
+            u = User.objects.create_user(username='testuser' + str(i), password='12345')
+            c = Contract.objects.create(user=u, supervisor=self.admin, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=5)
+            ContractChange.objects.create(contract_id=c, from_date=dt.date(2023,5,1), hours_per_week=10)
+            Holiday.objects.create(from_date='2023-05-02', to_date='2023-05-03', by_id=u)
+            Task.objects.create(assigned_to=u, assigner=self.admin, task_text='Test task', total_hours=2, worked_hours=1, deadline=dt.date(2023,6,1))
+        add_user(0)
+        before = {model: self._changelist_queries(model) for model in ('contract', 'contractchange', 'holiday', 'task')}
+        for i in range(1, 4):
+            add_user(i)
+        after = {model: self._changelist_queries(model) for model in ('contract', 'contractchange', 'holiday', 'task')}
+        self.assertEqual(before, after)
+
+    @freeze_time("2023-06-15")
+    def test_contract_changelist_balances(self):
+        """The contract changelist shows the balances of the employment period of each contract, computed for the page with a constant number of queries
+        """
+        def add_user(i):
+            u = User.objects.create_user(username='balance' + str(i), password='12345')
+            Contract.objects.create(user=u, supervisor=self.admin, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+            Task.objects.create(assigned_to=u, assigner=self.admin, task_text='Test task', total_hours=20, worked_hours=10 + i, deadline=dt.date(2023,5,1))
+            Holiday.objects.create(from_date='2023-05-02', to_date='2023-05-03', by_id=u)
+            return u
+        u = add_user(0)
+        before = self._changelist_queries('contract')
+        for i in range(1, 4):
+            add_user(i)
+        self.assertEqual(self._changelist_queries('contract'), before)
+
+        response = self.client.get(reverse('admin:home_contract_changelist'))
+        contract = [c for c in response.context['cl'].result_list if c.user_id == u.id][0]
+        period = batch.balance_history(batch.prefetch_user_data([u])[0])[0]
+        self.assertEqual(contract.balance, period)
+        self.assertAlmostEqual(period['excess_hours'], calc_working_time(u)[3])
+        self.assertAlmostEqual(period['remaining_holidays'], calc_holiday(u)[3])
+        self.assertContains(response, 'Remaining holidays (days)')
+
+    def test_task_change_keeps_logged_hours(self):
+        """Saving a task in the admin does not overwrite the hours logged since the form was shown, changed worked hours are recorded as an entry
+        """
+        u = User.objects.create_user(username='testuser', password='12345')
+        task = Task.objects.create(assigned_to=u, assigner=self.admin, task_text='Test task', total_hours=10, worked_hours=0, deadline=dt.date(2023,6,1))
+        set_worked_hours(task, 2)
+        url = reverse('admin:home_task_change', args=[task.id])
+        data = {'task_text': 'Renamed task', 'assigned_to': u.id, 'assigner': self.admin.id, 'total_hours': 10, 'worked_hours': 2, 'initial-worked_hours': 2, 'deadline': '2023-06-01'}
+        self.assertContains(self.client.get(url), 'name="initial-worked_hours" value="2.0"')
+        add_entries([(task.id, dt.date.today(), 3)]) # logged while the form is open
+
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        task.refresh_from_db()
+        self.assertEqual((task.task_text, task.worked_hours), ('Renamed task', 5))
+
+        self.client.post(url, dict(data, worked_hours=8))
+        task.refresh_from_db()
+        self.assertEqual(task.worked_hours, 8)
+        self.assertEqual(sum(TimeEntry.objects.filter(task=task).values_list('hours', flat=True)), 8)
+        self.assertEqual(sum(row['hours'] for row in rollup_rows(u, 'day', dt.date.today(), dt.date.today())), 8)
+
+    @freeze_time("2023-06-26")
+    def test_compute_carryover_action(self):
+        """Carryover action processes each selected user once
+        """
+        u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        c1 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,19), contract_end_date=dt.date(2023,6,23), hours_per_week=5)
+        c2 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,26), contract_end_date=dt.date(2023,6,30), hours_per_week=10)
+        self.client.post(reverse('admin:home_contract_changelist'), {'action': 'compute_carryover', '_selected_action': [c1.id, c2.id]})
+        c2.refresh_from_db()
+        self.assertEqual(c2.carry_over_hours_from_last_semester, 5.0)
+
+    @freeze_time("2023-06-26")
+    def test_compute_carryover_action_constant_queries(self):
+        """The carryover action loads the selected users together, the queries only grow by one UPDATE per user
+        """
+        def run(n):
+            ids = []
+            for i in range(n):
+                u = User.objects.create_user(username='carryover' + str(n) + '-' + str(i), password='12345')
+                ids.append(Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,19), contract_end_date=dt.date(2023,6,23), hours_per_week=5).id)
+                ids.append(Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,26), contract_end_date=dt.date(2023,6,30), hours_per_week=10).id)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse('admin:home_contract_changelist'), {'action': 'compute_carryover', '_selected_action': ids})
+            return len(queries)
+        self.assertEqual(run(3) - run(1), 2)
+        self.assertFalse(Contract.objects.filter(contract_start_date=dt.date(2023,6,26), carry_over_hours_from_last_semester=0).exists())
+
+class BatchTests(TestCase):
+    def _user_with_history(self, username: str) -> User:
+        u = User.objects.create_user(username=username, password='12345')
+        c10 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,6,23), hours_per_week=5, carry_over_hours_from_last_semester=1, carry_over_holiday_hours_from_last_semester=4)
+        c11 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,5,1), contract_end_date=dt.date(2023,6,23), hours_per_week=10, carry_over_hours_from_last_semester=2)
+        ContractChange.objects.create(contract_id=c11, from_date=dt.date(2023,5,15), to_date=dt.date(2023,5,31), hours_per_week=20)
+        ContractChange.objects.create(contract_id=c11, from_date=dt.date(2023,6,1), hours_per_week=15)
+        Task.objects.create(assigned_to=u, assigner=u, task_text='Test task', total_hours=20, worked_hours=12, deadline=dt.date(2023,5,23))
+        Holiday.objects.create(from_date='2023-04-28', to_date='2023-05-02', by_id=u)
+        Holiday.objects.create(from_date='2023-06-20', to_date='2023-06-20', by_id=u)
+        Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,26), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        return u
+
+    @freeze_time("2023-06-20")
+    def test_batch_matches_views_during_contract(self):
+        """The in-memory calculators return the same as the ones in views.py
+        """
+        u = self._user_with_history('testuser')
+        self.assertEqual(batch.calc_working_time(u), calc_working_time(u))
+        self.assertEqual(batch.calc_holiday(u), calc_holiday(u))
+        self.assertEqual(batch.employment_time(batch.prefetch_user_data([u])[0]), get_employment_time(u))
+        for day in range(1, 31):
+            self.assertEqual(batch.hours_on_day(u, dt.date(2023,6,day)), working_hours_on_day(u, dt.date(2023,6,day)))
+
+    @freeze_time("2023-07-03")
+    def test_batch_matches_views_carryover(self):
+        """The in-memory carryover preview returns the same as do_carryover(only_calculate=True)
+        """
+        u = self._user_with_history('testuser')
+        expected = do_carryover(u, only_calculate=True)
+        preview = batch.do_carryover(u, only_calculate=True)
+        self.assertEqual(preview[2], expected[2])
+        for a, b in zip(preview, expected):
+            if isinstance(a, float):
+                self.assertAlmostEqual(a, b)
+
+    @freeze_time("2023-07-03")
+    def test_contracts_page_constant_queries(self):
+        """The number of queries of the contracts page does not depend on the number of shks
+        """
+        officer = User.objects.create_user(username='officer', password='12345')
+        officer.groups.add(Group.objects.create(name='shkofficer'))
+        shk_group = Group.objects.create(name='shk')
+        self.client.force_login(officer)
+        self._user_with_history('testuser0').groups.add(shk_group)
+        with CaptureQueriesContext(connection) as one_shk:
+            response = self.client.get(reverse('contracts'))
+        self.assertContains(response, 'Do Carryover')
+        for i in range(1, 4):
+            self._user_with_history('testuser' + str(i)).groups.add(shk_group)
+        with CaptureQueriesContext(connection) as four_shks:
+            self.client.get(reverse('contracts'))
+        self.assertEqual(len(one_shk), len(four_shks))
+
+class LogHoursTests(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        self.other = User.objects.create_user(username='otheruser', password='12345')
+        self.t1 = Task.objects.create(assigned_to=self.u, assigner=self.u, task_text='Test task', total_hours=4, worked_hours=1, deadline=dt.date(2023,6,18))
+        self.t2 = Task.objects.create(assigned_to=self.u, assigner=self.u, task_text='Test task', total_hours=4, worked_hours=0, deadline=dt.date(2023,6,18))
+        self.t3 = Task.objects.create(assigned_to=self.other, assigner=self.other, task_text='Foreign task', total_hours=4, worked_hours=0, deadline=dt.date(2023,6,18))
+        self.client.force_login(self.u)
+
+    def test_log_hours_single_update(self):
+        """Adding hours to one task is one UPDATE without SELECT of the task
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('logHours'), {'taskId': self.t1.id, 'hours': '1.5'})
+        self.assertEqual(response.json(), {'updated': 1, 'requested': 1})
+        self.assertEqual([q['sql'].split()[0] for q in queries if 'home_task' in q['sql']][0], 'UPDATE')
+        self.t1.refresh_from_db()
+        self.assertEqual(self.t1.worked_hours, 2.5)
+
+    def test_log_hours_batch(self):
+        """A batch is applied in one statement, entries for the same task are summed up and foreign tasks are not changed
+        """
+        entries = [{'task_id': self.t1.id, 'hours': 1}, {'task_id': self.t2.id, 'hours': 2}, {'task_id': self.t1.id, 'hours': 0.5}, {'task_id': self.t3.id, 'hours': 3}]
+        response = self.client.post(reverse('logHours'), json.dumps({'entries': entries}), content_type='application/json')
+        self.assertEqual(response.json(), {'updated': 2, 'requested': 3})
+        self.assertEqual([t.worked_hours for t in Task.objects.order_by('id')], [2.5, 2.0, 0.0])
+
+    def test_log_hours_invalid(self):
+        """Invalid hours are rejected
+        """
+        response = self.client.post(reverse('logHours'), {'taskId': self.t1.id, 'hours': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_log_hours_not_finite(self):
+        """nan and inf are rejected and nothing is written
+        """
+        for hours in ('nan', 'inf', '-Infinity'):
+            response = self.client.post(reverse('logHours'), {'taskId': self.t1.id, 'hours': hours})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('logHours'), json.dumps({'entries': [{'task_id': self.t1.id, 'hours': 1}, {'task_id': self.t2.id, 'hours': float('nan')}]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.t1.refresh_from_db()
+        self.assertEqual(self.t1.worked_hours, 1)
+
+class TimesheetTests(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(username='testuser', password='12345')
+        self.other = User.objects.create_user(username='otheruser', password='12345')
+        self.t1 = Task.objects.create(assigned_to=self.u, assigner=self.u, task_text='Test task', total_hours=10, worked_hours=2, deadline=dt.date(2023,6,30))
+        self.t2 = Task.objects.create(assigned_to=self.u, assigner=self.u, task_text='Other task', total_hours=10, worked_hours=0, deadline=dt.date(2023,6,30))
+        self.t3 = Task.objects.create(assigned_to=self.other, assigner=self.other, task_text='Foreign task', total_hours=10, worked_hours=0, deadline=dt.date(2023,6,30))
+
+    def rollups(self, model):
+        return {str(row.start): (row.hours, row.entries) for row in model.objects.filter(user=self.u)}
+
+    def assertConsistent(self):
+        """The worked hours are the legacy hours plus the entries, the rollups are the sums of the entries"""
+        for task, legacy in [(self.t1, 2), (self.t2, 0)]:
+            self.assertAlmostEqual(Task.objects.get(id=task.id).worked_hours, legacy + sum(TimeEntry.objects.filter(task=task).values_list('hours', flat=True)))
+        entries = list(TimeEntry.objects.filter(user=self.u))
+        for model, start_of in [(DailyHours, lambda d: d), (WeeklyHours, lambda d: d - dt.timedelta(days=d.weekday())), (MonthlyHours, lambda d: d.replace(day=1))]:
+            expected = {}
+            for entry in entries:
+                hours, count = expected.get(str(start_of(entry.date)), (0, 0))
+                expected[str(start_of(entry.date))] = (hours + entry.hours, count + 1)
+            actual = self.rollups(model)
+            self.assertEqual(actual.keys(), expected.keys())
+            for start in expected:
+                self.assertAlmostEqual(actual[start][0], expected[start][0])
+                self.assertEqual(actual[start][1], expected[start][1])
+
+    def test_add_entries(self):
+        """Entries increment the tasks and the daily, weekly and monthly rollups"""
+        add_entries([(self.t1.id, dt.date(2023,6,5), 1.5), (self.t2.id, dt.date(2023,6,6), 2), (self.t1.id, dt.date(2023,7,3), 1)])
+        self.assertConsistent()
+        self.assertEqual(self.rollups(WeeklyHours), {'2023-06-05': (3.5, 2), '2023-07-03': (1.0, 1)})
+        self.assertEqual(self.rollups(MonthlyHours), {'2023-06-01': (3.5, 2), '2023-07-01': (1.0, 1)})
+
+    def test_add_entries_foreign_tasks(self):
+        """Entries of tasks outside the allowed ones are ignored"""
+        recorded = add_entries([(self.t1.id, dt.date(2023,6,5), 1), (self.t3.id, dt.date(2023,6,5), 3)], Task.objects.filter(assigned_to=self.u))
+        self.assertEqual([entry.task_id for entry in recorded], [self.t1.id])
+        self.assertEqual(Task.objects.get(id=self.t3.id).worked_hours, 0)
+        self.assertFalse(DailyHours.objects.filter(user=self.other).exists())
+
+    def test_add_entries_constant_queries(self):
+        """The number of queries does not depend on the size of the batch"""
+        def count(n):
+            entries = [(task.id, dt.date(2023,1,2) + dt.timedelta(days=i), 0.5) for i in range(n) for task in (self.t1, self.t2)]
+            with CaptureQueriesContext(connection) as queries:
+                add_entries(entries)
+            return len(queries)
+        self.assertEqual(count(3), count(60))
+        self.assertConsistent()
+
+    def test_change_and_delete_entries(self):
+        """Moving an entry moves its hours between the rollups, deleting the last entry of a period deletes the rollup row"""
+        entry, other = add_entries([(self.t1.id, dt.date(2023,6,5), 2), (self.t2.id, dt.date(2023,6,5), 1)])
+        change_entry(entry, date=dt.date(2023,7,10), hours=3)
+        self.assertConsistent()
+        self.assertEqual(self.rollups(MonthlyHours), {'2023-06-01': (1.0, 1), '2023-07-01': (3.0, 1)})
+        self.assertEqual(delete_entries(TimeEntry.objects.filter(id=other.id)), 1)
+        self.assertConsistent()
+        self.assertEqual(list(self.rollups(DailyHours)), ['2023-07-10'])
+
+    def test_delete_task(self):
+        """The entries of a deleted task are subtracted from the rollups"""
+        add_entries([(self.t1.id, dt.date(2023,6,5), 2), (self.t2.id, dt.date(2023,6,5), 1)])
+        self.t1.delete()
+        self.assertEqual(self.rollups(DailyHours), {'2023-06-05': (1.0, 1)})
+
+    def test_set_worked_hours(self):
+        """Setting the total records the difference as an entry"""
+        entry = set_worked_hours(self.t1, 5, dt.date(2023,6,5))
+        self.assertEqual((entry.hours, self.t1.worked_hours), (3, 5))
+        set_worked_hours(self.t1, 4, dt.date(2023,6,6))
+        self.assertIsNone(set_worked_hours(self.t1, 4))
+        self.assertEqual(Task.objects.get(id=self.t1.id).worked_hours, 4)
+        self.assertConsistent()
+
+    def test_rollup_rows(self):
+        """rollup_rows reads the periods starting in a range, the first one from its start"""
+        add_entries([(self.t1.id, dt.date(2023,6,1), 1), (self.t1.id, dt.date(2023,6,7), 2), (self.t1.id, dt.date(2023,6,30), 4)])
+        self.assertEqual(rollup_rows(self.u, 'week', dt.date(2023,6,1), dt.date(2023,6,30)), [{'start': '2023-05-29', 'hours': 1.0, 'entries': 1}, {'start': '2023-06-05', 'hours': 2.0, 'entries': 1}, {'start': '2023-06-26', 'hours': 4.0, 'entries': 1}])
+
+    def test_log_hours_date(self):
+        """logHours records the entries on the given day"""
+        self.client.force_login(self.u)
+        response = self.client.post(reverse('logHours'), {'taskId': self.t1.id, 'hours': '1.5', 'date': '2023-06-05'})
+        self.assertEqual(response.json(), {'updated': 1, 'requested': 1})
+        self.assertEqual(self.rollups(DailyHours), {'2023-06-05': (1.5, 1)})
+
+    def test_tasks_form_records_entry(self):
+        """Editing a task on the tasks page records changed worked hours as an entry and leaves the other hours alone"""
+        self.client.force_login(self.u)
+        form = {'taskId': self.t1.id, 'taskDescription': 'Changed', 'plannedHours': '12', 'workedHours': '5', 'deadline': '2023-06-30', 'taskGivenBy': self.u.id}
+        self.client.post(reverse('tasks'), form)
+        entry = TimeEntry.objects.get()
+        self.assertEqual((entry.task_id, entry.hours, entry.date), (self.t1.id, 3, dt.date.today()))
+        self.client.post(reverse('tasks'), dict(form, plannedHours='14'))
+        self.assertEqual(TimeEntry.objects.count(), 1)
+        self.t1.refresh_from_db()
+        self.assertEqual((self.t1.task_text, self.t1.total_hours, self.t1.worked_hours), ('Changed', 14, 5))
+        self.assertConsistent()
+
+    def test_timesheet_views(self):
+        """The timesheet shows the rollups, entries are added and deleted by their owner only"""
+        self.client.force_login(self.u)
+        self.client.post(reverse('timeEntries'), {'action': 'add', 'taskId': self.t1.id, 'date': '2023-06-05', 'hours': '2'})
+        self.client.post(reverse('timeEntries'), {'action': 'add', 'taskId': self.t3.id, 'date': '2023-06-05', 'hours': '2'})
+        response = self.client.get(reverse('timesheet') + '?view=month&date=2023-06-05')
+        self.assertEqual(response.context['total_hours'], 2)
+        self.assertEqual([entry.task_id for entry in response.context['entries']], [self.t1.id])
+
+        entry = TimeEntry.objects.get()
+        self.client.force_login(self.other)
+        self.client.post(reverse('timeEntries'), {'action': 'delete', 'entryId': entry.id})
+        self.assertTrue(TimeEntry.objects.filter(id=entry.id).exists())
+        self.assertEqual(self.client.get(reverse('timesheetData', args=[self.u.id])).status_code, 403)
+
+        self.client.force_login(self.u)
+        response = self.client.get(reverse('timesheetData', args=[self.u.id]) + '?period=month&from=2023-01-01&to=2023-12-31')
+        self.assertEqual(response.json()['rows'], [{'start': '2023-06-01', 'hours': 2.0, 'entries': 1}])
+        self.client.post(reverse('timeEntries'), {'action': 'delete', 'entryId': entry.id})
+        self.assertFalse(TimeEntry.objects.exists())
+        self.assertConsistent()
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], DATABASE_REPLICA_SELECTION='first')
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        pin_to_primary(False)
+
+    def tearDown(self):
+        pin_to_primary(False)
+
+    def test_reads_outside_replica_reads_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+
+    def test_reads_inside_replica_reads_use_replica(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Task), 'replica1')
+
+    def test_read_after_write_uses_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Task), 'default')
+            self.assertEqual(self.router.db_for_read(Task), 'default')
+
+    def test_pin_ends_with_scope(self):
+        """A write pins only the current scope, code outside of requests and jobs is not pinned forever"""
+        self.router.db_for_write(Task)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Task), 'replica1')
+            self.router.db_for_write(Task)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Task), 'replica1')
+        with routing_scope():
+            self.router.db_for_write(Task)
+            with replica_reads():
+                self.assertEqual(self.router.db_for_read(Task), 'default')
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Task), 'replica1')
+
+    @override_settings(DATABASE_REPLICA_SELECTION='round_robin')
+    def test_round_robin(self):
+        with replica_reads():
+            self.assertEqual({self.router.db_for_read(Task) for i in range(4)}, {'replica1', 'replica2'})
+
+class JobTests(TestCase):
+    def tearDown(self):
+        jobs._registry.pop('failing', None)
+
+    @freeze_time("2023-06-26")
+    def test_carryover_runs_in_background(self):
+        """doCarryover only queues the carryover, the worker does it
+        """
+        officer = User.objects.create_user(username='officer', password='12345')
+        u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        c1 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,19), contract_end_date=dt.date(2023,6,23), hours_per_week=5)
+        c2 = Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,26), contract_end_date=dt.date(2023,6,30), hours_per_week=10)
+        self.client.force_login(officer)
+        self.client.get(reverse('doCarryover', args=[u.id]))
+        c2.refresh_from_db()
+        self.assertEqual(c2.carry_over_hours_from_last_semester, 0)
+        
+        job = Job.objects.get()
+        self.assertEqual(self.client.get(reverse('jobStatus', args=[job.id])).json()['status'], Job.PENDING)
+        # the job must not freeze the clock, the other worker threads would see it
+        with mock.patch('freezegun.freeze_time', side_effect=AssertionError('freeze_time in a job')):
+            self.assertEqual(jobs.run_pending(), 1)
+        c2.refresh_from_db()
+        self.assertEqual(c2.carry_over_hours_from_last_semester, 5.0)
+        self.assertEqual(self.client.get(reverse('jobStatus', args=[job.id])).json()['result'], {'carryover_hours': 5.0, 'carryover_holiday_hours': 0.0})
+
+    def test_failing_job_is_retried(self):
+        """A failing job is retried later and marked as failed after max_attempts
+        """
+        @jobs.job('failing')
+        def failing():
+            raise ValueError('fails')
+        job = jobs.enqueue('failing', max_attempts=2)
+        with self.assertLogs('apps.home.jobs', level='WARNING'):
+            self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertEqual(jobs.run_pending(), 0) # not due yet
+        Job.objects.update(run_after=job.added)
+        with self.assertLogs('apps.home.jobs', level='ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('ValueError: fails', job.error)
+
+class HistoryTests(TestCase):
+    @freeze_time("2023-07-03")
+    def test_history_matches_frozen_calculation(self):
+        """Each closed period of the history equals the calculation frozen at the end of the period, the current one the calculation of today
+        """
+        u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        Contract.objects.create(user=u, contract_start_date=dt.date(2022,10,1), contract_end_date=dt.date(2023,3,31), hours_per_week=5)
+        Task.objects.create(assigned_to=u, assigner=u, task_text='Test task', total_hours=20, worked_hours=15, deadline=dt.date(2022,12,1))
+        Holiday.objects.create(from_date='2022-12-27', to_date='2022-12-30', by_id=u)
+        c = Contract.objects.create(user=u, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,6,30), hours_per_week=10, carry_over_hours_from_last_semester=3)
+        ContractChange.objects.create(contract_id=c, from_date=dt.date(2023,5,1), hours_per_week=20)
+        Task.objects.create(assigned_to=u, assigner=u, task_text='Test task', total_hours=10, worked_hours=10, deadline=dt.date(2023,5,1))
+        Contract.objects.create(user=u, contract_start_date=dt.date(2023,7,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        
+        history = batch.balance_history(batch.prefetch_user_data([u])[0])
+        self.assertEqual([(p['start'], p['status']) for p in history], [(dt.date(2022,10,1), 'closed'), (dt.date(2023,4,1), 'closed'), (dt.date(2023,7,1), 'current')])
+        for period in history[:2]:
+            with freeze_time(period['end']):
+                self.assertEqual((period['hours_to_work'], period['worked_hours'], period['planned_hours'], period['excess_hours']), calc_working_time(u))
+                self.assertEqual((period['holiday_entitlement'], period['not_taken_holidays'], period['taken_holidays_days'], period['remaining_holidays']), calc_holiday(u))
+        self.assertEqual(history[1]['carryover_out_hours'], do_carryover(u, only_calculate=True)[0])
+        self.assertEqual((history[2]['hours_to_work'], history[2]['worked_hours']), calc_working_time(u)[:2])
+
+    def test_contract_groups(self):
+        """Overlapping contracts are one period, a contract starting the day after the previous one ends starts a new period
+        """
+        u = User.objects.create_user(username='testuser', password='12345')
+        Contract.objects.create(user=u, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=5)
+        Contract.objects.create(user=u, contract_start_date=dt.date(2023,6,1), contract_end_date=dt.date(2023,6,30), hours_per_week=5)
+        Contract.objects.create(user=u, contract_start_date=dt.date(2023,10,1), contract_end_date=dt.date(2024,3,31), hours_per_week=5)
+        self.assertEqual(batch.contract_groups(batch.prefetch_user_data([u])[0]), [(dt.date(2023,4,1), dt.date(2023,9,30)), (dt.date(2023,10,1), dt.date(2024,3,31))])
+
+    def test_history_permissions(self):
+        """Only the user, their supervisors and the shkofficer can see the history
+        """
+        u = User.objects.create_user(username='testuser', password='12345')
+        other = User.objects.create_user(username='otheruser', password='12345')
+        Contract.objects.create(user=u, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=5)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('historyData', args=[u.id])).status_code, 403)
+        self.client.force_login(u)
+        self.assertEqual(len(self.client.get(reverse('historyData', args=[u.id])).json()['periods']), 1)
+        self.assertContains(self.client.get(reverse('history')), 'April 1, 2023')
+
+class SeriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @freeze_time("2023-06-30")
+    def test_series_matches_working_time(self):
+        """The cumulative required hours at the end of the period equal the hours to work of calc_working_time, worked hours are counted at the deadline
+        """
+        u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        c = Contract.objects.create(user=u, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,6,30), hours_per_week=10)
+        ContractChange.objects.create(contract_id=c, from_date=dt.date(2023,5,1), to_date=dt.date(2023,5,31), hours_per_week=20)
+        Holiday.objects.create(from_date='2023-06-12', to_date='2023-06-16', by_id=u)
+        Task.objects.create(assigned_to=u, assigner=u, task_text='Test task', total_hours=10, worked_hours=8, deadline=dt.date(2023,4,12))
+        series = batch.weekly_series(batch.prefetch_user_data([u]), dt.date(2023,4,1), dt.date(2023,6,30))
+        self.assertEqual(series['weeks'][:2], ['2023-04-02', '2023-04-09'])
+        self.assertEqual(series['weeks'][-1], '2023-06-30')
+        self.assertAlmostEqual(series['required'][-1], calc_working_time(u)[0])
+        self.assertEqual(series['worked'][1:3], [0.0, 8.0])
+        self.assertEqual(series['planned'][-1], 10.0)
+
+    @freeze_time("2023-06-30")
+    def test_series_ignores_tasks_of_previous_semester(self):
+        """Tasks with a deadline before the range are not counted on its first day
+        """
+        u = User.objects.create_user(username='testuser', password='12345')
+        Contract.objects.create(user=u, contract_start_date=dt.date(2022,10,1), contract_end_date=dt.date(2023,3,31), hours_per_week=10)
+        Contract.objects.create(user=u, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        Task.objects.create(assigned_to=u, assigner=u, task_text='Old task', total_hours=100, worked_hours=100, deadline=dt.date(2023,1,15))
+        self.client.force_login(u)
+        series = self.client.get(reverse('seriesData', args=[u.id])).json()
+        self.assertEqual((series['worked'][-1], series['planned'][-1]), (0.0, 0.0))
+        self.assertEqual(series['worked'][-1], calc_working_time(u)[1])
+
+    @freeze_time("2023-06-30")
+    def test_series_cached_until_data_changes(self):
+        """The series is cached and recomputed after a task of the user was saved
+        """
+        u = User.objects.create_user(username='testuser', password='12345', email='test@example.com')
+        Contract.objects.create(user=u, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,6,30), hours_per_week=10)
+        self.client.force_login(u)
+        self.assertEqual(self.client.get(reverse('seriesData', args=[u.id])).json()['worked'][-1], 0.0)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('seriesData', args=[u.id]))
+        self.assertFalse(any('home_task' in q['sql'] for q in queries))
+        t = Task.objects.create(assigned_to=u, assigner=u, task_text='Test task', total_hours=10, worked_hours=8, deadline=dt.date(2023,4,12))
+        self.assertEqual(self.client.get(reverse('seriesData', args=[u.id])).json()['worked'][-1], 8.0)
+        self.client.post(reverse('logHours'), {'taskId': t.id, 'hours': 1})
+        self.assertEqual(self.client.get(reverse('seriesData', args=[u.id])).json()['worked'][-1], 9.0)
+
+    @freeze_time("2023-06-30")
+    def test_reassignment_invalidates_previous_owner(self):
+        """Reassigning a task or holiday to another user recomputes the cached values of the previous owner as well
+        """
+        u = User.objects.create_user(username='testuser', password='12345')
+        other = User.objects.create_user(username='other', password='12345')
+        for user in [u, other]:
+            Contract.objects.create(user=user, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        Task.objects.create(assigned_to=u, assigner=u, task_text='Test task', total_hours=10, worked_hours=8, deadline=dt.date(2023,4,12))
+        Holiday.objects.create(from_date='2023-06-12', to_date='2023-06-16', by_id=u)
+        self.assertEqual(cached_working_time(u)[1], 8)
+        hours_to_work = cached_working_time(u)[0]
+
+        task = Task.objects.get(assigned_to=u)
+        task.assigned_to = other
+        task.save()
+        self.assertEqual(cached_working_time(u)[1], 0)
+        self.assertEqual(cached_working_time(other)[1], 8)
+
+        holiday = Holiday.objects.get(by_id=u)
+        holiday.by_id = other
+        holiday.save()
+        self.assertGreater(cached_working_time(u)[0], hours_to_work)
+
+class ReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @freeze_time("2023-06-30")
+    def test_report_by_supervisor_and_month(self):
+        """Contracted hours, tasks and holidays end up at the supervisor of the contract in the month
+        """
+        s1 = User.objects.create_user(username='supervisor1', password='12345', first_name='Super', last_name='One')
+        s2 = User.objects.create_user(username='supervisor2', password='12345', first_name='Super', last_name='Two')
+        u1 = User.objects.create_user(username='testuser1', password='12345')
+        u2 = User.objects.create_user(username='testuser2', password='12345')
+        Contract.objects.create(user=u1, supervisor=s1, contract_start_date=dt.date(2023,5,1), contract_end_date=dt.date(2023,6,30), hours_per_week=10, carry_over_hours_from_last_semester=4)
+        c2 = Contract.objects.create(user=u2, supervisor=s2, contract_start_date=dt.date(2023,6,1), contract_end_date=dt.date(2023,6,30), hours_per_week=5)
+        ContractChange.objects.create(contract_id=c2, from_date=dt.date(2023,6,19), hours_per_week=10)
+        Task.objects.create(assigned_to=u1, assigner=s1, task_text='Test task', total_hours=10, worked_hours=8, deadline=dt.date(2023,5,12))
+        Task.objects.create(assigned_to=u1, assigner=s1, task_text='Test task', total_hours=3, worked_hours=1, deadline=dt.date(2023,6,12))
+        Holiday.objects.create(from_date='2023-06-09', to_date='2023-06-12', by_id=u2) # friday to monday
+        
+        report = supervisor_month_report(dt.date(2023,1,1), dt.date(2023,12,31))
+        rows = {(row['supervisor'], row['month']): row for row in report['rows']}
+        # may 2023: 23 weekdays, 3 public holidays (1st, 18th and 29th)
+        self.assertEqual(rows[('Super One', dt.date(2023,5,1))], {'supervisor': 'Super One', 'month': dt.date(2023,5,1), 'contracted_hours': 40.0, 'worked_hours': 8.0, 'planned_hours': 10.0, 'holiday_days': 0})
+        # june 2023: 22 business days, 12 before and 10 after the change
+        self.assertEqual(rows[('Super Two', dt.date(2023,6,1))]['contracted_hours'], 12 + 20)
+        self.assertEqual(rows[('Super Two', dt.date(2023,6,1))]['holiday_days'], 2)
+        totals = {row['supervisor']: row for row in report['totals']}
+        self.assertEqual(totals['Super One']['worked_hours'], 9.0)
+        self.assertEqual(totals['Super One']['carryover_hours'], 4.0)
+
+    def test_report_only_for_officer(self):
+        u = User.objects.create_user(username='testuser', password='12345')
+        self.client.force_login(u)
+        self.assertRedirects(self.client.get(reverse('report')), reverse('home'), fetch_redirect_response=False)
+        u.groups.add(Group.objects.create(name='shkofficer'))
+        self.assertContains(self.client.get(reverse('report')), 'Supervisors by month')
+
+    def test_report_invalid_year(self):
+        """An invalid year shows the current year instead of failing
+        """
+        u = User.objects.create_user(username='testuser', password='12345')
+        u.groups.add(Group.objects.create(name='shkofficer'))
+        self.client.force_login(u)
+        for year in ('abc', '0', '100000'):
+            response = self.client.get(reverse('report') + '?year=' + year)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['year'], dt.date.today().year)
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.supervisor = User.objects.create_user(username='supervisor', password='12345')
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other = User.objects.create_user(username='otheruser', password='12345')
+        Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        self.task = Task.objects.create(assigned_to=self.user, assigner=self.supervisor, task_text='Prepare the exercise sheet about Fourier transforms', total_hours=10, worked_hours=0, deadline=dt.date(2023,5,12))
+        Task.objects.create(assigned_to=self.user, assigner=self.supervisor, task_text='Correct exercise sheets', total_hours=10, worked_hours=0, deadline=dt.date(2023,6,12))
+        Task.objects.create(assigned_to=self.other, assigner=self.supervisor, task_text='Exercise session', total_hours=10, worked_hours=0, deadline=dt.date(2023,6,12))
+
+    def test_index_is_used(self):
+        self.assertTrue(fts_available())
+        with CaptureQueriesContext(connection) as queries:
+            list(search_tasks(Task.objects.all(), 'fourier'))
+        self.assertIn('MATCH', queries.captured_queries[0]['sql'])
+
+    def test_ranked_and_scoped(self):
+        self.assertEqual([task.task_text for task in search_tasks(Task.objects.filter(assigned_to=self.user), 'exercise sheet')], ['Correct exercise sheets', 'Prepare the exercise sheet about Fourier transforms']) # shorter text ranks better
+        self.assertEqual(search_tasks(Task.objects.filter(assigned_to=self.user), 'exercise').count(), 2)
+        self.assertEqual(search_tasks(Task.objects.all(), 'exercise').count(), 3)
+        self.assertEqual(search_tasks(Task.objects.all(), 'four').get(), self.task) # prefix
+        self.assertEqual(search_tasks(Task.objects.all(), '"unbalanced AND (').count(), 0) # no FTS syntax errors
+
+    def test_index_follows_changes(self):
+        self.task.task_text = 'Grade the exams'
+        self.task.save()
+        self.assertEqual(search_tasks(Task.objects.all(), 'fourier').count(), 0)
+        self.assertEqual(search_tasks(Task.objects.all(), 'exams').get(), self.task)
+        self.task.delete()
+        self.assertEqual(search_tasks(Task.objects.all(), 'exams').count(), 0)
+
+    def test_search_endpoint(self):
+        self.supervisor.groups.add(Group.objects.create(name='supervisor'))
+        self.client.force_login(self.supervisor)
+        response = self.client.get(reverse('searchTasks'), {'q': 'exercise'})
+        self.assertEqual(len(response.json()['tasks']), 2) # only the supervised SHK
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('searchTasks'), {'q': 'exercise'})
+        self.assertEqual([task['task_text'] for task in response.json()['tasks']], ['Exercise session'])
+        self.assertContains(self.client.get(reverse('tasks'), {'q': 'exercise'}), 'Exercise session')
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @freeze_time("2023-06-15")
+    def test_warmup_fills_caches(self):
+        supervisor = User.objects.create_user(username='supervisor', password='12345')
+        user = User.objects.create_user(username='testuser', password='12345')
+        Contract.objects.create(user=user, supervisor=supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2024,3,31), hours_per_week=10)
+        Task.objects.create(assigned_to=user, assigner=supervisor, task_text='Test task', total_hours=10, worked_hours=5, deadline=dt.date(2023,5,12))
+        batch.free_days_of_year.cache_clear()
+        
+        out = StringIO()
+        call_command('warmup', in_process=True, stdout=out)
+        self.assertIn('dashboard data         2', out.getvalue())
+        self.assertEqual(batch.free_days_of_year.cache_info().currsize, 2) # 2023 and 2024
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_working_time(user)[1], 5)
+            self.assertEqual(cached_balance_history(user)[0]['worked_hours'], 5)
+            cached_series(user, dt.date(2023,4,1), dt.date(2024,3,31))
+            forecast = cached_forecasts([user.id])[user.id]
+        self.assertEqual(forecast, user_forecast(batch.prefetch_user_data([user])[0]))
+        
+        # changed data is computed again
+        Task.objects.create(assigned_to=user, assigner=supervisor, task_text='Test task', total_hours=10, worked_hours=2, deadline=dt.date(2023,5,12))
+        self.assertEqual(cached_working_time(user)[1], 7)
+
+    def test_warmup_skips_per_process_cache(self):
+        """A separate warmup process cannot fill a per-process cache, the dashboard data is skipped with a warning"""
+        out, err = StringIO(), StringIO()
+        call_command('warmup', skip=['modules', 'templates'], stdout=out, stderr=err)
+        self.assertIn('is per process', err.getvalue())
+        self.assertNotIn('dashboard data', out.getvalue())
+
+class ImportTimeTests(TestCase):
+    def test_heavy_modules_are_imported_lazily(self):
+        """Loading the urls, admin and template tags (done by every worker boot and manage.py command) does not import numpy, holidays, freezegun or dateutil.rrule, checked with python -X importtime in a fresh interpreter
+        """
+        code = 'import django; django.setup(); import apps.home.urls, apps.home.admin, apps.home.templatetags.date_extras'
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=settings.CORE_DIR, env=dict(os.environ, DJANGO_SETTINGS_MODULE='core.settings'), capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        
+        # lines look like "import time: self [us] | cumulative | imported package"
+        imported = {line.split('|')[-1].strip() for line in result.stderr.splitlines() if line.startswith('import time:')}
+        self.assertIn('apps.home.calculations', imported)
+        for module in ['numpy', 'holidays', 'freezegun', 'dateutil.rrule']:
+            self.assertNotIn(module, imported)
+
+class ServeTests(TestCase):
+    def test_worker_server_on_shared_socket(self):
+        """A worker serves requests on the socket opened by the master and counts them for max-requests
+        """
+        sock = ServeCommand().listen('127.0.0.1:0')
+        self.addCleanup(sock.close)
+        self.assertTrue(sock.get_inheritable())
+        def application(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'ok']
+        server = worker_server(sock, QuietHandler, application)
+        self.assertIs(server.socket, sock)
+        
+        responses = []
+        client = threading.Thread(target=lambda: responses.append(urlopen('http://127.0.0.1:' + str(sock.getsockname()[1]) + '/', timeout=5).read()))
+        client.start()
+        server.handle_request()
+        client.join()
+        self.assertEqual(responses, [b'ok'])
+        self.assertEqual(server.requests, 1)
+
+    def test_several_workers_need_shared_cache(self):
+        """Workers with per-process caches would not see the invalidations of the others"""
+        with self.assertRaisesMessage(CommandError, 'is per process'):
+            call_command('serve', workers=2, bind='127.0.0.1:0')
+
+class AuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='supervisor', password='12345')
+        self.user.groups.add(Group.objects.create(name='supervisor'))
+
+    def use_shared_cache(self):
+        # the user cache is only used with a cache shared by the processes
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        shared = override_settings(CACHES=dict(settings.CACHES, default={'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}))
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    def test_roles_loaded_once_per_user_object(self):
+        user = User.objects.get(id=self.user.id)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_supervisor(user))
+            self.assertFalse(is_shkofficer(user))
+            self.assertTrue(is_supervisor(user))
+        user.groups.add(Group.objects.create(name='shkofficer'))
+        self.assertTrue(is_shkofficer(user))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies', AUTHENTICATION_BACKENDS=['apps.home.auth.CachedModelBackend'])
+    def test_page_view_without_session_and_user_queries(self):
+        self.use_shared_cache()
+        self.client.force_login(self.user)
+        self.client.get(reverse('tasks'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('tasks')).status_code, 200)
+        self.assertEqual([query['sql'] for query in queries.captured_queries if 'django_session' in query['sql'] or 'FROM "auth_user" WHERE "auth_user"."id" = ' in query['sql']], [])
+        
+        # changed groups are seen in the next request
+        self.user.groups.clear()
+        self.user.groups.add(Group.objects.create(name='shk'))
+        self.assertContains(self.client.get(reverse('tasks')), '<th></th>')
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies', AUTHENTICATION_BACKENDS=['apps.home.auth.CachedModelBackend'])
+    def test_user_not_cached_in_per_process_cache(self):
+        """With a per-process cache the user is read from the database, a user deactivated by another process is logged out at once"""
+        self.client.force_login(self.user)
+        self.client.get(reverse('tasks'))
+        User.objects.filter(id=self.user.id).update(is_active=False) # no signal, like a change in another worker
+        self.assertEqual(self.client.get(reverse('tasks')).status_code, 302)
+
+    def test_read_only_views_do_not_write_sessions(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('tasks'))
+            self.client.get(reverse('history'))
+        self.assertFalse([query for query in queries.captured_queries if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT')])
+
+    def test_authbench(self):
+        Contract.objects.create(user=self.user, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        self.use_shared_cache()
+        out = StringIO()
+        call_command('authbench', 'supervisor', paths=['/tasks/'], requests=2, modes=['db', 'signed_cookies'], stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[1].split()[:4], ['db', 'no', lines[1].split()[2], '1.00']) # one session lookup per request
+        self.assertEqual(lines[4].split()[3:5], ['0.00', '0.00']) # signed cookies
+        self.assertEqual(float(lines[3].split()[2]) - float(lines[4].split()[2]), 2) # user and groups from the cache
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        for year in (2020, 2021, 2022):
+            Contract.objects.create(user=self.user, contract_start_date=dt.date(year,4,1), contract_end_date=dt.date(year,9,30), hours_per_week=10)
+            Task.objects.create(assigned_to=self.user, assigner=self.user, task_text='Task ' + str(year), total_hours=10, worked_hours=5, deadline=dt.date(year,5,1))
+            Holiday.objects.create(from_date=dt.date(year,8,1), to_date=dt.date(year,8,5), by_id=self.user)
+        ContractChange.objects.create(contract_id=Contract.objects.get(contract_start_date=dt.date(2020,4,1)), from_date=dt.date(2020,6,1), hours_per_week=20)
+        Contract.objects.create(user=self.user, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+
+    @freeze_time("2023-07-03")
+    def test_archive_keeps_history(self):
+        """Old periods are moved out of the tables, the history shows the same balances, the latest closed period stays
+        """
+        history = cached_balance_history(self.user)
+        archived = archive_user(self.user, retention_days=700)
+        self.assertEqual([(p.start, p.end) for p in archived], [(dt.date(2020,4,1), dt.date(2020,9,30))]) # 2021 ended less than 700 days ago, 2022 is the latest closed period
+        self.assertEqual(Contract.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(ContractChange.objects.count(), 0)
+        self.assertFalse(Task.objects.filter(deadline__year=2020).exists())
+        self.assertFalse(Holiday.objects.filter(from_date__year=2020).exists())
+        self.assertEqual(search_tasks(Task.objects.all(), 'task').count(), 2)
+        
+        self.assertEqual([p.start for p in archive_user(self.user, retention_days=0)], [dt.date(2021,4,1)])
+        after = cached_balance_history(self.user)
+        self.assertEqual([dict(p, archived=False) for p in after], [dict(p, archived=False) for p in history])
+        self.assertEqual([p.get('archived', False) for p in after], [True, True, False, False])
+
+    @freeze_time("2023-07-03")
+    def test_restore(self):
+        history = cached_balance_history(self.user)
+        call_command('archive', retention_days=0, stdout=StringIO())
+        self.assertEqual(ArchivedPeriod.objects.count(), 2)
+        for archived_period in ArchivedPeriod.objects.all():
+            call_command('archive', restore=archived_period.id, stdout=StringIO())
+        self.assertEqual(ArchivedPeriod.objects.count(), 0)
+        self.assertEqual(ContractChange.objects.count(), 1)
+        self.assertEqual(cached_balance_history(self.user), history)
+
+    @freeze_time("2023-07-03")
+    def test_restore_time_entries(self):
+        """The time entries of an archived period are restored and added to the rollups again
+        """
+        old_task = Task.objects.get(task_text='Task 2020')
+        add_entries([(old_task.id, dt.date(2020,4,20), 2), (old_task.id, dt.date(2020,5,1), 1.5), (Task.objects.get(task_text='Task 2022').id, dt.date(2022,4,20), 1)])
+        def rollups():
+            return [list(model.objects.filter(user=self.user).order_by('start').values_list('start', 'hours', 'entries')) for model in (DailyHours, WeeklyHours, MonthlyHours)]
+        before, worked_hours = rollups(), old_task.worked_hours + 3.5
+        archive_user(self.user, retention_days=700)
+        self.assertFalse(TimeEntry.objects.filter(date__year=2020).exists())
+        self.assertFalse(MonthlyHours.objects.filter(start__year=2020).exists())
+        restore_period(ArchivedPeriod.objects.get())
+        self.assertEqual(rollups(), before)
+        self.assertEqual(TimeEntry.objects.filter(task_id=old_task.id).count(), 2)
+        self.assertEqual(Task.objects.get(id=old_task.id).worked_hours, worked_hours)
+
+class RosterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = User.objects.create_user(username='supervisor', password='12345')
+        self.supervisor.groups.add(Group.objects.create(name='supervisor'))
+        self.user = User.objects.create_user(username='testuser', password='12345', first_name='Test', last_name='User')
+        self.old = User.objects.create_user(username='olduser', password='12345', first_name='Old', last_name='User')
+        for year in (2021, 2022):
+            Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date(year,4,1), contract_end_date=dt.date(year,9,30), hours_per_week=10)
+        Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,6,30), hours_per_week=10)
+        self.longest = Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=5)
+        Contract.objects.create(user=self.old, supervisor=self.supervisor, contract_start_date=dt.date(2022,4,1), contract_end_date=dt.date(2022,9,30), hours_per_week=10)
+
+    @freeze_time("2023-05-15")
+    def test_one_query_one_contract_per_active_user(self):
+        with self.assertNumQueries(1):
+            roster = active_roster(self.supervisor)
+        self.assertEqual(roster, [self.longest])
+        self.assertEqual(active_roster(), [self.longest])
+        self.assertEqual(active_roster(self.supervisor, dt.date(2022,5,1)), [Contract.objects.get(user=self.old), Contract.objects.get(user=self.user, contract_start_date=dt.date(2022,4,1))])
+
+    @freeze_time("2023-05-15")
+    def test_dashboard_shows_each_user_once(self):
+        self.client.force_login(self.supervisor)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(len(response.context['shks_data']), 1)
+        self.assertNotContains(response, 'Old User')
+        self.assertEqual(len(self.client.get(reverse('holidays')).context['shks_data']), 1)
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.supervisor = User.objects.create_user(username='supervisor', password='12345', is_staff=True, is_superuser=True)
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.contract = Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        self.first = ContractChange.objects.create(contract_id=self.contract, from_date=dt.date(2023,5,1), hours_per_week=12)
+
+    def rows(self, text: str) -> list:
+        return read_rows(StringIO('type,username,supervisor,contract_start_date,contract_end_date,hours_per_week,from_date,to_date\n' + text))
+
+    def test_chaining_like_save(self):
+        result = import_rows(self.rows(
+            'change,testuser,,2023-04-01,,20,2023-07-01,\n'
+            'change,testuser,,2023-04-01,,15,2023-06-01,\n'
+            'contract,testuser,supervisor,2023-10-01,2024-03-31,10,,\n'
+            'change,testuser,,2023-10-01,,5,2024-01-01,\n'
+        ))
+        self.assertEqual(result, {'contracts': 1, 'changes': 3, 'updated_changes': 1, 'errors': []})
+        changes = [(change.from_date, change.to_date, change.hours_per_week) for change in ContractChange.objects.filter(contract_id=self.contract).order_by('from_date')]
+        self.assertEqual(changes, [(dt.date(2023,5,1), dt.date(2023,5,31), 12), (dt.date(2023,6,1), dt.date(2023,6,30), 15), (dt.date(2023,7,1), None, 20)])
+        new = Contract.objects.get(user=self.user, contract_start_date=dt.date(2023,10,1))
+        self.assertEqual(new.supervisor, self.supervisor)
+        self.assertEqual(ContractChange.objects.get(contract_id=new).hours_per_week, 5)
+
+    def test_errors_per_row_and_nothing_written(self):
+        result = import_rows(self.rows(
+            'contract,nobody,supervisor,2023-10-01,2024-03-31,10,,\n'
+            'contract,testuser,supervisor,2023-04-01,2023-09-30,10,,\n'
+            'change,testuser,,2023-04-01,,20,2023-12-01,\n'
+            'change,testuser,,2022-04-01,,20,2022-05-01,\n'
+            'change,testuser,,2023-04-01,,x,2023-06-01,\n'
+            'change,testuser,,2023-04-01,,20,2023-06-01,\n'
+        ))
+        self.assertEqual([line for line, error in result['errors']], [2, 3, 4, 5, 6])
+        self.assertEqual(ContractChange.objects.count(), 1)
+        result = import_rows(self.rows('change,testuser,,2023-04-01,,x,2023-06-01,\nchange,testuser,,2023-04-01,,20,2023-06-01,\n'), skip_invalid=True)
+        self.assertEqual((result['changes'], len(result['errors'])), (1, 1))
+        self.assertEqual(ContractChange.objects.get(id=self.first.id).to_date, dt.date(2023,5,31))
+
+    def test_constant_number_of_queries(self):
+        users = [User(username='bulk' + str(i)) for i in range(100)]
+        User.objects.bulk_create(users)
+        rows = [(i, {'type': 'contract', 'username': 'bulk' + str(i), 'supervisor': 'supervisor', 'contract_start_date': '2023-04-01', 'contract_end_date': '2023-09-30', 'hours_per_week': 10}) for i in range(100)]
+        rows += [(100 + i, {'type': 'change', 'username': 'bulk' + str(i % 100), 'contract_start_date': '2023-04-01', 'from_date': '2023-0' + str(5 + i // 100) + '-01', 'hours_per_week': 5}) for i in range(300)]
+        with CaptureQueriesContext(connection) as queries:
+            result = import_rows(rows)
+        self.assertEqual(len([query for query in queries.captured_queries if query['sql'].startswith('SELECT')]), 2) # users and contracts
+        self.assertLessEqual(len(queries.captured_queries), 10) # plus the batched inserts (SQLite variable limit) and the savepoint
+        self.assertEqual((result['contracts'], result['changes'], result['errors']), (100, 300, []))
+        self.assertEqual(ContractChange.objects.filter(contract_id__user__username='bulk7', to_date=None).get().from_date, dt.date(2023,7,1))
+        self.assertEqual(ContractChange.objects.filter(to_date=dt.date(2023,6,30)).count(), 100)
+
+    def test_command_and_admin_upload(self):
+        path = os.path.join('/tmp', 'contracts-import-test-' + str(os.getpid()) + '.json')
+        with open(path, 'w') as file:
+            json.dump([{'type': 'change', 'username': 'testuser', 'contract_start_date': '2023-04-01', 'from_date': '2023-06-01', 'hours_per_week': 20}], file)
+        out = StringIO()
+        call_command('importcontracts', path, '--dry-run', stdout=out)
+        self.assertIn('Would import 0 contracts and 1 contract changes', out.getvalue())
+        self.assertEqual(ContractChange.objects.count(), 1)
+        os.remove(path)
+
+        self.client.force_login(self.supervisor)
+        self.assertEqual(self.client.get(reverse('admin:home_contract_import')).status_code, 200)
+        upload = StringIO('type,username,contract_start_date,from_date,hours_per_week\nchange,testuser,2023-04-01,2023-06-01,20\n')
+        upload.name = 'changes.csv'
+        response = self.client.post(reverse('admin:home_contract_import'), {'file': upload})
+        self.assertRedirects(response, reverse('admin:home_contract_changelist'))
+        self.assertEqual(ContractChange.objects.get(id=self.first.id).to_date, dt.date(2023,5,31))
+
+class AbsenceTests(TestCase):
+    def setUp(self):
+        self.supervisor = User.objects.create_user(username='supervisor', password='12345')
+        self.supervisor.groups.add(Group.objects.create(name='supervisor'))
+        self.user = User.objects.create_user(username='testuser', password='12345', first_name='Test', last_name='User')
+        self.other = User.objects.create_user(username='other', password='12345', first_name='Another', last_name='User')
+        contract = Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        ContractChange.objects.create(contract_id=contract, from_date=dt.date(2023,5,15), to_date=dt.date(2023,9,30), hours_per_week=20)
+        Contract.objects.create(user=self.other, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=5)
+        Holiday.objects.create(by_id=self.user, from_date=dt.date(2023,5,10), to_date=dt.date(2023,5,19))
+        Holiday.objects.create(by_id=self.user, from_date=dt.date(2023,5,17), to_date=dt.date(2023,5,22)) # overlapping
+        Holiday.objects.create(by_id=self.other, from_date=dt.date(2023,4,20), to_date=dt.date(2023,5,2))
+
+    def test_absences_per_day(self):
+        with self.assertNumQueries(3):
+            data = team_absences(self.supervisor, dt.date(2023,5,1), dt.date(2023,5,31))
+        self.assertEqual([user['name'] for user in data['users']], ['Another User', 'Test User'])
+        days = {day['date']: day for day in data['days']}
+        self.assertEqual(len(days), 31)
+        self.assertEqual(days[dt.date(2023,5,1)]['absent'], [self.other.id]) # May 1st is a public holiday
+        self.assertEqual(days[dt.date(2023,5,1)]['missing_hours'], 0)
+        self.assertEqual(days[dt.date(2023,5,2)]['missing_hours'], 1)
+        self.assertEqual(days[dt.date(2023,5,12)]['missing_hours'], 2)
+        self.assertEqual(days[dt.date(2023,5,16)]['missing_hours'], 4)
+        self.assertEqual(days[dt.date(2023,5,16)]['required_hours'], 5)
+        self.assertEqual(days[dt.date(2023,5,20)]['absent'], [self.user.id])
+        self.assertEqual(days[dt.date(2023,5,22)]['missing_hours'], 4)
+        self.assertEqual(days[dt.date(2023,5,23)]['absent'], [])
+        for day in data['days']: # same as the hours of the absent users on that day
+            self.assertAlmostEqual(day['missing_hours'], sum([working_hours_on_day(User.objects.get(id=user_id), day['date']) for user_id in day['absent']]))
+
+    def test_calendar_range(self):
+        self.assertEqual(calendar_range('month', dt.date(2023,12,15)), (dt.date(2023,12,1), dt.date(2023,12,31), dt.date(2023,11,1), dt.date(2024,1,1)))
+        self.assertEqual(calendar_range('week', dt.date(2023,5,17)), (dt.date(2023,5,15), dt.date(2023,5,21), dt.date(2023,5,8), dt.date(2023,5,22)))
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        self.assertRedirects(self.client.get(reverse('absences')), reverse('home'))
+        self.assertEqual(self.client.get(reverse('absenceData')).status_code, 403)
+        self.client.force_login(self.supervisor)
+        response = self.client.get(reverse('absences'), {'view': 'week', 'date': '2023-05-17'})
+        self.assertEqual(len(response.context['days']), 7)
+        self.assertEqual(response.context['rows'][1], {'name': 'Test User', 'absent': [True] * 7})
+        data = self.client.get(reverse('absenceData'), {'from': '2023-05-01', 'to': '2023-05-02'}).json()
+        self.assertEqual(data['days'][1], {'date': '2023-05-02', 'absent': [self.other.id], 'required_hours': 3.0, 'missing_hours': 1.0})
+        self.assertEqual(self.client.get(reverse('absenceData'), {'from': '2020-01-01', 'to': '2023-01-01'}).status_code, 400)
+
+class DigestTests(TestCase):
+    def setUp(self):
+        self.supervisor = User.objects.create_user(username='supervisor', password='12345', email='supervisor@example.com')
+        self.behind = User.objects.create_user(username='behind', password='12345', first_name='Behind', last_name='User')
+        self.fine = User.objects.create_user(username='fine', password='12345', first_name='Fine', last_name='Worker')
+        self.ended = User.objects.create_user(username='ended', password='12345')
+        for user in (self.behind, self.fine):
+            Contract.objects.create(user=user, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,7,15), hours_per_week=10)
+        Contract.objects.create(user=self.ended, supervisor=self.supervisor, contract_start_date=dt.date(2022,4,1), contract_end_date=dt.date(2022,9,30), hours_per_week=10)
+        Task.objects.create(task_text='late', assigned_to=self.behind, assigner=self.supervisor, total_hours=8, worked_hours=3, deadline=dt.date(2023,6,1))
+        Task.objects.create(task_text='work', assigned_to=self.fine, assigner=self.supervisor, total_hours=250, worked_hours=250, deadline=dt.date(2023,6,1))
+        Holiday.objects.create(by_id=self.fine, from_date=dt.date(2023,5,1), to_date=dt.date(2023,5,5))
+
+    @freeze_time("2023-07-01")
+    def test_flags_match_calculators(self):
+        digest = build_digest(dt.date(2023,7,1))
+        self.assertEqual(list(digest), [self.supervisor])
+        self.assertEqual([entry['user'] for entry in digest[self.supervisor]], [self.behind, self.fine])
+        excess = calc_working_time(self.behind)[3]
+        self.assertEqual(digest[self.supervisor][0]['flags'], [
+            'behind by ' + str(round(excess, 1)) + ' hours (3.0 of ' + str(round(excess + 3, 1)) + ' worked)',
+            str(calc_holiday(self.behind)[3]) + ' holiday days left, the contract ends 2023-07-15',
+            '1 tasks past deadline with 5.0 hours left',
+        ])
+        self.assertTrue(digest[self.supervisor][1]['flags'][0].startswith('ahead by'))
+        self.assertEqual(build_digest(dt.date(2023,7,1), {'excess_hours': 1000, 'holiday_days': 100}), {self.supervisor: [dict(digest[self.supervisor][0], flags=digest[self.supervisor][0]['flags'][2:])]})
+        self.assertIn('Behind User:\n  - behind by', render_digest(self.supervisor, digest[self.supervisor], dt.date(2023,7,1)))
+
+    def test_chunks_and_queries(self):
+        with self.assertNumQueries(1 + 2 * 5): # active users, per chunk: users, contracts, contract changes, holidays, tasks
+            chunked = build_digest(dt.date(2023,7,1), chunk_size=1)
+        self.assertEqual(chunked, build_digest(dt.date(2023,7,1)))
+
+    def test_command(self):
+        call_command('digest', '--mail', '--date', '2023-07-01', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['supervisor@example.com'])
+        self.assertIn('Behind User', mail.outbox[0].body)
+
+class RegionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.bavaria = Contract.objects.create(user=self.user, contract_start_date=dt.date(2023,1,1), contract_end_date=dt.date(2023,3,31), hours_per_week=10, region='DE-BY')
+        self.saxony = Contract.objects.create(user=self.user, contract_start_date=dt.date(2023,10,1), contract_end_date=dt.date(2023,12,31), hours_per_week=10)
+
+    def test_calendars(self):
+        self.assertIn(dt.date(2023,1,6), free_days(dt.date(2023,1,1), dt.date(2023,12,31), 'DE-BY')) # Epiphany
+        self.assertNotIn(dt.date(2023,1,6), free_days(dt.date(2023,1,1), dt.date(2023,12,31), 'DE-SN'))
+        self.assertIn(dt.date(2023,11,22), free_days(dt.date(2023,1,1), dt.date(2023,12,31))) # Day of Repentance and Prayer, Saxony only
+        for region in ('DE-SN', 'DE-BY', 'DE-BE'):
+            for from_date, to_date in [(dt.date(2022,12,1), dt.date(2024,1,31)), (dt.date(2023,1,6), dt.date(2023,1,6)), (dt.date(2023,5,2), dt.date(2023,5,17))]:
+                self.assertEqual(count_free_days(from_date, to_date, region), len(free_days(from_date, to_date, region)))
+        import numpy as np
+        days = batch.day_range(dt.date(2023,1,2), dt.date(2023,1,8))
+        self.assertEqual(workdays(days, 'DE-BY').tolist(), [True, True, True, True, False, False, False])
+        self.assertEqual(int(np.sum(workdays(days))), 5)
+
+    def test_region_on(self):
+        self.assertEqual(region_on([self.bavaria, self.saxony], dt.date(2023,2,1)), 'DE-BY')
+        self.assertEqual(region_on([self.bavaria, self.saxony], dt.date(2023,11,1)), 'DE-SN')
+        self.assertEqual(region_on([self.bavaria, self.saxony], dt.date(2023,5,1)), 'DE-BY') # closest contract
+        self.assertEqual(region_on([], dt.date(2023,5,1)), 'DE-SN')
+
+    def test_calculators_use_the_contract_region(self):
+        self.assertEqual(working_hours_on_day(self.user, dt.date(2023,1,6)), 0)
+        self.assertEqual(working_hours_on_day(self.user, dt.date(2023,1,5)), 2)
+        self.assertEqual(calc_days_to_work(dt.date(2023,1,1), dt.date(2023,1,31), 'DE-BY'), calc_days_to_work(dt.date(2023,1,1), dt.date(2023,1,31)) - 1)
+        hours = batch.contract_hours_timeline(batch.prefetch_user_data([self.user])[0].contracts, dt.date(2023,1,2), dt.date(2023,1,8))
+        self.assertEqual(hours.tolist(), [2, 2, 2, 2, 0, 0, 0])
+        Holiday.objects.create(by_id=self.user, from_date=dt.date(2023,1,2), to_date=dt.date(2023,1,13))
+        with freeze_time("2023-03-31"):
+            self.assertEqual(calc_holiday(self.user)[2], 9)
+            user = batch.prefetch_user_data([User.objects.get(id=self.user.id)])[0]
+            self.assertEqual(batch.holiday_balance(user, dt.date(2023,3,31)), calc_holiday(self.user))
+            self.assertEqual(batch.working_time(user, dt.date(2023,3,31)), calc_working_time(self.user))
+
+    def test_weekend_holidays_still_count_twice(self):
+        # legacy: public holidays on weekends are subtracted from the business days as well
+        holiday = Holiday.objects.create(by_id=self.user, from_date=dt.date(2022,12,19), to_date=dt.date(2022,12,30))
+        self.assertEqual(busdays(holiday.from_date, holiday.to_date), 8) # 10 business days, Dec 25 (Sunday) and Dec 26
+        self.assertEqual(holiday_busdays(holiday), 8)
+        holiday.region = 'DE-BY'
+        self.assertEqual(holiday_busdays(holiday), 8)
+
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = User.objects.create_user(username='supervisor', password='12345')
+        self.supervisor.groups.add(Group.objects.create(name='supervisor'))
+        self.user = User.objects.create_user(username='testuser', password='12345', first_name='Test', last_name='User')
+        Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date.today() - dt.timedelta(days=30), contract_end_date=dt.date.today() + dt.timedelta(days=150), hours_per_week=10, region='DE-BY')
+        self.holiday = Holiday.objects.create(by_id=self.user, from_date=dt.date(2023,5,10), to_date=dt.date(2023,5,12))
+
+    def content(self, response) -> str:
+        return b''.join(response.streaming_content).decode() if response.streaming else response.content.decode()
+
+    def test_user_feed(self):
+        feed_token = create_token(self.user)
+        response = self.client.get(reverse('icalFeed', args=[feed_token.token]))
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = self.content(response)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn('UID:holiday-' + str(self.holiday.id) + '@shk-manager\r\nDTSTAMP:', body)
+        self.assertIn('DTSTART;VALUE=DATE:20230510\r\nDTEND;VALUE=DATE:20230513\r\n', body)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(3): # token, contracts, state
+            not_modified = self.client.get(reverse('icalFeed', args=[feed_token.token]), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get(reverse('icalFeed', args=[feed_token.token]), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        with self.assertNumQueries(3): # the body comes from the cache
+            self.assertEqual(self.content(self.client.get(reverse('icalFeed', args=[feed_token.token]))), body)
+
+        Holiday.objects.create(by_id=self.user, from_date=dt.date(2023,8,1), to_date=dt.date(2023,8,4))
+        changed = self.client.get(reverse('icalFeed', args=[feed_token.token]), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(self.content(changed).count('BEGIN:VEVENT'), 2)
+        self.holiday.delete()
+        self.assertNotEqual(self.client.get(reverse('icalFeed', args=[feed_token.token]))['ETag'], changed['ETag'])
+
+    def test_team_feed_with_public_holidays_and_revoke(self):
+        feed_token = create_token(self.supervisor, FeedToken.TEAM, public_holidays=True)
+        body = self.content(self.client.get(reverse('icalFeed', args=[feed_token.token])))
+        self.assertIn('SUMMARY:Test User: holiday', body)
+        self.assertIn('UID:public-DE-BY-' + str(dt.date.today().year) + '-01-06@shk-manager', body) # Epiphany, Bavaria only
+        self.assertNotIn('-11-01@shk-manager', body.split('DE-BY')[0])
+
+        self.client.force_login(self.supervisor)
+        self.assertContains(self.client.get(reverse('holidays')), feed_token.token)
+        self.client.post(reverse('feedTokens'), {'action': 'revoke', 'token_id': feed_token.id})
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('icalFeed', args=[feed_token.token])).status_code, 404)
+
+    def test_create_tokens(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('feedTokens'), {'action': 'create', 'scope': 'team', 'public_holidays': 'on'})
+        feed_token = FeedToken.objects.get(user=self.user)
+        self.assertEqual((feed_token.scope, feed_token.public_holidays), (FeedToken.USER, True)) # only supervisors get team feeds
+        self.assertEqual(len(feed_token.token), 43)
+        self.assertEqual(self.client.get(reverse('icalFeed', args=['wrong'])).status_code, 404)
+
+class LiveDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = User.objects.create_user(username='supervisor', password='12345')
+        self.supervisor.groups.add(Group.objects.create(name='supervisor'))
+        self.user = User.objects.create_user(username='testuser', password='12345', first_name='Test', last_name='User')
+        Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date.today() - dt.timedelta(days=30), contract_end_date=dt.date.today() + dt.timedelta(days=150), hours_per_week=10)
+
+    def add_task(self, user: User, worked_hours: float) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(assigner=self.supervisor, assigned_to=user, task_text='Task', total_hours=10, worked_hours=worked_hours, deadline=dt.date.today())
+
+    def add_contract(self, user: User) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            Contract.objects.create(user=user, supervisor=self.supervisor, contract_start_date=dt.date.today(), contract_end_date=dt.date.today() + dt.timedelta(days=90), hours_per_week=5)
+
+    async def test_publish_after_commit(self):
+        subscription = events.subscribe()
+        try:
+            await sync_to_async(self.add_task)(self.user, 2)
+            self.assertEqual(await events.changed_users(subscription, 1), {self.user.id})
+            self.assertEqual(await events.changed_users(subscription, 0.01), set())
+        finally:
+            events.unsubscribe(subscription)
+        self.assertEqual(events.subscriber_count(), 0)
+
+    async def test_stream_sends_changed_cards(self):
+        stream = dashboard_stream(self.supervisor, poll_seconds=0.05, max_seconds=10)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        await sync_to_async(self.add_task)(self.user, 4)
+        event = await anext(stream)
+        while event.startswith(':'): # keepalive
+            event = await anext(stream)
+        name, data = event.split('\n')[:2]
+        self.assertEqual(name, 'event: shk')
+        row = json.loads(data[len('data: '):])
+        self.assertEqual((row['user'], row['worked_hours'], row['planned_hours']), (self.user.id, 4, 10))
+        self.assertNotIn('contract', row)
+
+        other = await sync_to_async(User.objects.create_user)(username='other')
+        await sync_to_async(self.add_contract)(other)
+        event = await anext(stream)
+        while event.startswith(':'):
+            event = await anext(stream)
+        self.assertTrue(event.startswith('event: team\n'))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(events.subscriber_count(), 0)
+
+    async def test_stream_ignores_other_teams(self):
+        stranger = await sync_to_async(User.objects.create_user)(username='stranger')
+        stream = dashboard_stream(self.supervisor, poll_seconds=0.05, max_seconds=0.3)
+        await anext(stream)
+        await sync_to_async(self.add_task)(stranger, 1)
+        self.assertEqual({event async for event in stream}, {': keepalive\n\n'})
+
+    @override_settings(LIVE_UPDATES=True)
+    async def test_endpoint(self):
+        await self.async_client.aforce_login(self.user)
+        self.assertEqual((await self.async_client.get(reverse('dashboardEvents'))).status_code, 403)
+        await self.async_client.aforce_login(self.supervisor)
+        response = await self.async_client.get(reverse('dashboardEvents'))
+        self.assertEqual((response.status_code, response['Content-Type'], response['Cache-Control']), (200, 'text/event-stream', 'no-cache'))
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b'retry: 3000\n\n')
+        await content.aclose()
+
+    @override_settings(LIVE_UPDATES=True)
+    def test_no_stream_under_wsgi(self):
+        """A WSGI worker answers the event stream with 204 at once instead of being held for LIVE_STREAM_SECONDS
+        """
+        self.client.force_login(self.supervisor)
+        environ = RequestFactory().get(reverse('dashboardEvents'), HTTP_COOKIE=self.client.cookies.output(header='', sep=';')).environ
+        statuses = []
+        body = b''.join(WSGIHandler()(environ, lambda status, headers: statuses.append(status)))
+        self.assertEqual((statuses, body), (['204 No Content'], b''))
+
+    def test_dashboard_subscribes_only_with_live_updates(self):
+        self.client.force_login(self.supervisor)
+        self.assertNotContains(self.client.get(reverse('home')), 'EventSource(')
+        with self.settings(LIVE_UPDATES=True):
+            self.assertContains(self.client.get(reverse('home')), 'EventSource(')
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = User.objects.create_user(username='supervisor', password='12345')
+        self.supervisor.groups.add(Group.objects.create(name='supervisor'))
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.contract = Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10)
+        ContractChange.objects.create(contract_id=self.contract, from_date=dt.date(2023,7,1), to_date=dt.date(2023,9,30), hours_per_week=5)
+        Holiday.objects.create(by_id=self.user, from_date=dt.date(2023,5,2), to_date=dt.date(2023,5,5))
+        Holiday.objects.create(by_id=self.user, from_date=dt.date(2023,8,7), to_date=dt.date(2023,8,11))
+        Task.objects.create(assigner=self.supervisor, assigned_to=self.user, task_text='Done', total_hours=40, worked_hours=40, deadline=dt.date(2023,5,31))
+        Task.objects.create(assigner=self.supervisor, assigned_to=self.user, task_text='Open', total_hours=60, worked_hours=10, deadline=dt.date(2023,8,31))
+        Task.objects.create(assigner=self.supervisor, assigned_to=self.user, task_text='Overdue', total_hours=10, worked_hours=4, deadline=dt.date(2023,6,1))
+
+    def test_task_work_timeline(self):
+        required = np.array([0, 2, 2, 0, 2, 2.0])
+        tasks = [SimpleNamespace(total_hours=6, worked_hours=0, deadline=dt.date(2023,1,5)), SimpleNamespace(total_hours=3, worked_hours=2, deadline=dt.date(2022,12,1)), SimpleNamespace(total_hours=1, worked_hours=1, deadline=dt.date(2023,1,3))]
+        work = task_work_timeline(tasks, dt.date(2023,1,1), required)
+        np.testing.assert_allclose(work, [0, 3, 2, 0, 2, 0]) # 6 hours over three workdays, the overdue hour on the first workday
+        np.testing.assert_allclose(task_work_timeline(tasks, dt.date(2023,1,1), np.zeros(3)), [0, 0, 7])
+
+    def test_forecast_matches_balance_at_end(self):
+        today = dt.date(2023,6,15)
+        forecast = user_forecast(batch.prefetch_user_data([self.user])[0], today)
+        user = batch.prefetch_user_data([self.user])[0]
+        self.assertEqual(forecast['excess_hours'], round(batch.working_time(user, today)[3], 2))
+        # all open hours worked: the balance on the last day is the forecast
+        for task in user.task_list:
+            task.worked_hours = task.total_hours
+        self.assertAlmostEqual(forecast['excess_hours_at_end'], batch.working_time(user, dt.date(2023,9,30))[3], places=2)
+        self.assertEqual(forecast['planned_hours'], 56)
+        self.assertEqual((forecast['contract_end'], forecast['weeks'][-1], forecast['excess'][-1]), ('2023-09-30', '2023-09-30', forecast['excess_hours_at_end']))
+        self.assertEqual(forecast['remaining_holidays'], batch.holiday_balance(user, today)[3])
+        self.assertIsNone(user_forecast(user, dt.date(2023,10,1)))
+
+    @freeze_time("2023-06-15")
+    def test_api_and_cache(self):
+        other = User.objects.create_user(username='other', password='12345')
+        Contract.objects.create(user=other, supervisor=self.supervisor, contract_start_date=dt.date(2023,6,1), contract_end_date=dt.date(2023,11,30), hours_per_week=8)
+        with self.assertNumQueries(5): # users, contracts, contract changes, holidays, tasks
+            forecasts = cached_forecasts([self.user.id, other.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_forecasts([self.user.id, other.id]), forecasts)
+        Task.objects.create(assigner=self.supervisor, assigned_to=other, task_text='New', total_hours=20, worked_hours=0, deadline=dt.date(2023,7,31))
+        with self.assertNumQueries(5): # only the changed user is computed again
+            changed = cached_forecasts([self.user.id, other.id])
+        self.assertEqual(changed[self.user.id], forecasts[self.user.id])
+        self.assertEqual(changed[other.id]['excess_hours_at_end'], forecasts[other.id]['excess_hours_at_end'] - 20)
+
+        self.client.login(username='testuser', password='12345')
+        self.assertEqual(self.client.get(reverse('forecastData', args=[self.user.id])).json(), forecasts[self.user.id])
+        self.assertEqual(self.client.get(reverse('forecastData', args=[other.id])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('teamForecastData')).status_code, 403)
+        self.client.login(username='supervisor', password='12345')
+        team = self.client.get(reverse('teamForecastData')).json()
+        self.assertEqual([forecast['user'] for forecast in team['forecasts']], [other.id, self.user.id]) # ordered by name
+        self.assertContains(self.client.get(reverse('home')), 'Forecast at the end of the contract (2023-09-30)')
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        with freeze_time("2023-06-01 12:00"):
+            self.supervisor = User.objects.create_user(username='supervisor', first_name='Super')
+            self.user = User.objects.create_user(username='testuser', first_name='Test')
+            self.contract = Contract.objects.create(user=self.user, supervisor=self.supervisor, contract_start_date=dt.date(2023,4,1), contract_end_date=dt.date(2023,9,30), hours_per_week=10, region='DE-BY')
+            ContractChange.objects.create(contract_id=self.contract, from_date=dt.date(2023,7,1), hours_per_week=5)
+            self.holiday = Holiday.objects.create(by_id=self.user, from_date=dt.date(2023,5,2), to_date=dt.date(2023,5,5))
+            self.task = Task.objects.create(assigner=self.supervisor, assigned_to=self.user, task_text='Task', total_hours=10, worked_hours=2.5, deadline=dt.date(2023,8,31))
+            Task.objects.create(assigner=self.supervisor, assigned_to=self.user, task_text='Other', total_hours=4, worked_hours=0, deadline=dt.date(2023,9,1))
+
+    def test_full_snapshot(self):
+        with freeze_time("2023-06-01 13:00"):
+            meta = write_snapshot(self.directory)
+        self.assertFalse(meta['incremental'])
+        snapshot = load_snapshot(self.directory)
+        contracts, users = snapshot['contracts'], snapshot['users']
+        self.assertIsInstance(contracts['id'], np.memmap)
+        self.assertEqual((contracts['id'].dtype, contracts['start'].dtype, contracts['hours_per_week'].dtype), (np.int32, np.int32, np.float32))
+        self.assertEqual(users['username'][contracts['user'][0]], 'testuser')
+        self.assertEqual(users['first_name'][contracts['supervisor'][0]], 'Super')
+        self.assertEqual(snapshot['meta']['regions'][contracts['region'][0]], 'DE-BY')
+        self.assertEqual(contracts['end'].astype('datetime64[D]')[0], np.datetime64('2023-09-30'))
+        self.assertEqual(snapshot['contract_changes']['to'][0], NULL_DAY) # open ended
+        self.assertEqual(snapshot['tasks']['worked_hours'].tolist(), [2.5, 0])
+        self.assertEqual((snapshot['meta']['tables']['tasks'], snapshot['meta']['created']), (2, '2023-06-01T13:00:00+00:00'))
+
+    def test_incremental_refresh(self):
+        with freeze_time("2023-06-01 13:00"):
+            write_snapshot(self.directory)
+        first = load_snapshot(self.directory)
+        with freeze_time("2023-06-02 12:00"):
+            self.task.worked_hours = 6
+            self.task.save()
+            self.holiday.delete()
+            newcomer = User.objects.create_user(username='newcomer')
+            Contract.objects.create(user=newcomer, supervisor=None, contract_start_date=dt.date(2023,6,1), contract_end_date=dt.date(2023,11,30), hours_per_week=8)
+            with CaptureQueriesContext(connection) as queries:
+                meta = write_snapshot(self.directory)
+        self.assertTrue(meta['incremental'])
+        self.assertEqual(meta['loaded'], {'contracts': 1, 'contract_changes': 0, 'holidays': 0, 'tasks': 1})
+        self.assertLessEqual(len(queries), 9) # users, then live ids and changed rows per table
+        snapshot = load_snapshot(self.directory)
+        self.assertEqual(snapshot['tasks']['worked_hours'].tolist(), [6, 0])
+        self.assertEqual(len(snapshot['holidays']['id']), 0)
+        self.assertEqual([snapshot['users']['username'][code] for code in snapshot['contracts']['user']], ['testuser', 'newcomer'])
+        self.assertEqual(snapshot['contracts']['supervisor'].tolist(), [snapshot['users']['username'].tolist().index('supervisor'), -1])
+        self.assertEqual(first['tasks']['worked_hours'].tolist(), [2.5, 0]) # the previous generation is still readable
+
+        with freeze_time("2023-06-03 12:00"):
+            full = write_snapshot(self.directory, full=True, keep=1)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, name))]), 1)
+        for table in ('contracts', 'contract_changes', 'holidays', 'tasks'):
+            for column, values in load_snapshot(self.directory)[table].items():
+                np.testing.assert_array_equal(values, snapshot[table][column])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('snapshot', '--dir', self.directory, stdout=out)
+        self.assertIn('tasks: 2 rows, 2 loaded', out.getvalue())
+        self.assertIn('Wrote snapshot', out.getvalue())
+        call_command('snapshot', '--dir', self.directory, stdout=out)
+        self.assertIn('Refreshed snapshot', out.getvalue())
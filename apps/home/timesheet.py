@@ -0,0 +1,168 @@
+"""Time entries: on which day the hours of a task were worked. Task.worked_hours stays the total of a task (the hours logged before time entries existed plus the sum of its entries), DailyHours, WeeklyHours and MonthlyHours hold the sums of the entries per user and period. All writes go through the functions here: tasks, entries and rollups are changed in one transaction with a constant number of queries per batch, and the hours are incremented by the database (hours = hours + delta), so concurrent writers do not lose updates. Reports read the rollups and never sum up entries.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Case, When, Value, FloatField, IntegerField, QuerySet
+from django.utils import timezone
+
+from .models import Task, TimeEntry, DailyHours, WeeklyHours, MonthlyHours
+from .cache import bump_user_version
+
+import datetime as dt
+
+def week_start(date: dt.date) -> dt.date:
+    """The Monday of the week of a date."""
+    return date - dt.timedelta(days=date.weekday())
+
+def month_start(date: dt.date) -> dt.date:
+    """The first day of the month of a date."""
+    return date.replace(day=1)
+
+# period -> rollup model and the first day of the period of a date
+ROLLUPS = {
+    'day': (DailyHours, lambda date: date),
+    'week': (WeeklyHours, week_start),
+    'month': (MonthlyHours, month_start),
+}
+
+def _increment_tasks(deltas: Dict[int, float], tasks: QuerySet) -> int:
+    deltas = {task_id: hours for task_id, hours in deltas.items() if hours != 0}
+    if not deltas:
+        return 0
+    delta = Case(*[When(id=task_id, then=Value(hours)) for task_id, hours in deltas.items()], output_field=FloatField())
+    return tasks.filter(id__in=deltas.keys()).update(worked_hours=F('worked_hours') + delta, updated=timezone.now())
+
+def apply_to_rollups(changes: Iterable[Tuple[int, dt.date, float, int]]) -> None:
+    """Adds changes of time entries to the daily, weekly and monthly rollups with four queries per rollup: missing rows are inserted empty, all rows are incremented with one UPDATE and rows without entries are deleted.
+
+    Args:
+        changes (Iterable[Tuple[int, dt.date, float, int]]): user id, date, hours and number of entries to add (negative to remove)
+    """
+    changes = list(changes)
+    for model, start_of in ROLLUPS.values():
+        deltas = defaultdict(lambda: [0.0, 0])
+        for user_id, date, hours, entries in changes:
+            delta = deltas[(user_id, start_of(date))]
+            delta[0] += hours
+            delta[1] += entries
+        deltas = {key: delta for key, delta in deltas.items() if delta != [0.0, 0]}
+        if not deltas:
+            continue
+        model.objects.bulk_create([model(user_id=user_id, start=start) for user_id, start in deltas], ignore_conflicts=True)
+        rows = model.objects.filter(user_id__in={user_id for user_id, start in deltas}, start__in={start for user_id, start in deltas}).values_list('id', 'user_id', 'start')
+        ids = {row_id: deltas[(user_id, start)] for row_id, user_id, start in rows if (user_id, start) in deltas}
+        model.objects.filter(id__in=ids.keys()).update(
+            hours=F('hours') + Case(*[When(id=row_id, then=Value(delta[0])) for row_id, delta in ids.items()], output_field=FloatField()),
+            entries=F('entries') + Case(*[When(id=row_id, then=Value(delta[1])) for row_id, delta in ids.items()], output_field=IntegerField()),
+        )
+        if any(delta[1] < 0 for delta in ids.values()):
+            model.objects.filter(id__in=ids.keys(), entries__lte=0).delete()
+
+def add_entries(entries: Iterable[Tuple[int, dt.date, float]], tasks: Optional[QuerySet] = None) -> List[TimeEntry]:
+    """Records hours worked on tasks. The worked hours of the tasks are incremented first with one UPDATE (no SELECT before), then the entries and the rollups are written for the assignees of the tasks.
+
+    Args:
+        entries (Iterable[Tuple[int, dt.date, float]]): task id, day and hours
+        tasks (Optional[QuerySet]): the tasks that may be changed (e.g. those of the logged in user), entries of other tasks are ignored; all tasks if None
+
+    Returns:
+        List[TimeEntry]: the new entries
+    """
+    tasks = Task.objects.all() if tasks is None else tasks
+    entries = list(entries)
+    deltas = defaultdict(float)
+    for task_id, date, hours in entries:
+        deltas[task_id] += hours
+    with transaction.atomic():
+        if not _increment_tasks(deltas, tasks) and any(deltas.values()):
+            return [] # none of the tasks may be changed
+        assignees = dict(tasks.filter(id__in=deltas.keys()).values_list('id', 'assigned_to_id'))
+        new_entries = TimeEntry.objects.bulk_create([TimeEntry(task_id=task_id, user_id=assignees[task_id], date=date, hours=hours) for task_id, date, hours in entries if task_id in assignees and hours != 0])
+        apply_to_rollups([(entry.user_id, entry.date, entry.hours, 1) for entry in new_entries])
+    # update() and bulk_create() send no signals
+    bump_user_version(*set(assignees.values()))
+    return new_entries
+
+def change_entry(entry: TimeEntry, date: Optional[dt.date] = None, hours: Optional[float] = None) -> TimeEntry:
+    """Changes the day or the hours of an entry, the task and the rollups follow.
+
+    Args:
+        entry (TimeEntry): the entry
+        date (Optional[dt.date]): new day, unchanged if None
+        hours (Optional[float]): new hours, unchanged if None
+
+    Returns:
+        TimeEntry: the changed entry
+    """
+    with transaction.atomic():
+        old = TimeEntry.objects.select_for_update().get(id=entry.id)
+        entry.task_id, entry.user_id = old.task_id, old.user_id
+        entry.date = old.date if date is None else date
+        entry.hours = old.hours if hours is None else hours
+        entry.save(update_fields=['date', 'hours', 'updated'])
+        _increment_tasks({entry.task_id: entry.hours - old.hours}, Task.objects.all())
+        apply_to_rollups([(old.user_id, old.date, -old.hours, -1), (entry.user_id, entry.date, entry.hours, 1)])
+    bump_user_version(entry.user_id)
+    return entry
+
+def delete_entries(entries: QuerySet) -> int:
+    """Deletes entries, their hours are subtracted from the tasks and the rollups.
+
+    Args:
+        entries (QuerySet): the entries
+
+    Returns:
+        int: number of deleted entries
+    """
+    with transaction.atomic():
+        rows = list(entries.select_for_update().values_list('id', 'task_id', 'user_id', 'date', 'hours'))
+        if not rows:
+            return 0
+        TimeEntry.objects.filter(id__in=[row[0] for row in rows]).delete()
+        deltas = defaultdict(float)
+        for entry_id, task_id, user_id, date, hours in rows:
+            deltas[task_id] -= hours
+        _increment_tasks(deltas, Task.objects.all())
+        apply_to_rollups([(user_id, date, -hours, -1) for entry_id, task_id, user_id, date, hours in rows])
+    bump_user_version(*{row[2] for row in rows})
+    return len(rows)
+
+def set_worked_hours(task: Task, worked_hours: float, date: Optional[dt.date] = None) -> Optional[TimeEntry]:
+    """Sets the worked hours of a task to a total (e.g. from a form that shows the total) by recording the difference as an entry.
+
+    Args:
+        task (Task): the task
+        worked_hours (float): new total
+        date (Optional[dt.date]): day of the entry, defaults to today
+
+    Returns:
+        Optional[TimeEntry]: the entry, None if the total did not change
+    """
+    with transaction.atomic():
+        current = Task.objects.select_for_update().values_list('worked_hours', flat=True).get(id=task.id)
+        entries = add_entries([(task.id, date or dt.date.today(), worked_hours - current)], Task.objects.filter(id=task.id)) if worked_hours != current else []
+    task.worked_hours = worked_hours
+    return entries[0] if entries else None
+
+def remove_task_entries(task_id: int) -> None:
+    """Subtracts the entries of a task from the rollups, for tasks that are deleted (the entries are deleted with them)."""
+    apply_to_rollups([(user_id, date, -hours, -1) for user_id, date, hours in TimeEntry.objects.filter(task_id=task_id).values_list('user_id', 'date', 'hours')])
+
+def rollup_rows(user: User, period: str, from_date: dt.date, to_date: dt.date) -> List[dict]:
+    """The rollup rows of a user for the periods that start between two dates, read from the rollup table only.
+
+    Args:
+        user (User): the user
+        period (str): 'day', 'week' or 'month'
+        from_date (dt.date): first day, moved to the start of its period
+        to_date (dt.date): last day
+
+    Returns:
+        List[dict]: 'start' (ISO date), 'hours' and 'entries' of every period with entries, ordered by start
+    """
+    model, start_of = ROLLUPS[period]
+    rows = model.objects.filter(user=user, start__gte=start_of(from_date), start__lte=to_date).order_by('start').values_list('start', 'hours', 'entries')
+    return [{'start': start.isoformat(), 'hours': round(hours, 2), 'entries': entries} for start, hours, entries in rows]
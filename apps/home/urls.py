@@ -7,17 +7,47 @@ urlpatterns = [
     path('', views.index, name='home'),
     # AllTasks page
     path('tasks/', views.tasks, name='tasks'),
+    # Full text search over the tasks
+    path('api/tasks/search', views.searchTasks, name='searchTasks'),
+    # Add worked hours to tasks
+    path('logHours/', views.logHours, name='logHours'),
     # Edit task page
     path('editTask/<int:task_id>', views.editTask, name='editTask'),
+    # Time entries per day with daily, weekly and monthly sums
+    path('timesheet/', views.timesheet, name='timesheet'),
+    path('timeEntries/', views.timeEntries, name='timeEntries'),
+    path('api/timesheet/<int:user_id>', views.timesheetData, name='timesheetData'),
+    # Live updates of the supervisor dashboard
+    path('events/dashboard', views.dashboardEvents, name='dashboardEvents'),
     # Holiday page
     path('holidays/', views.holidays, name='holidays'),
     # Edit Holiday page
     path('editHoliday/<int:holiday_id>', views.editHoliday, name='editHoliday'),
+    # Team absence calendar
+    path('absences/', views.absences, name='absences'),
+    path('api/absences', views.absenceData, name='absenceData'),
+    # Calendar feeds of the holidays
+    path('ical/<str:token>.ics', views.icalFeed, name='icalFeed'),
+    path('feedTokens/', views.feedTokens, name='feedTokens'),
     
     # AllContracts page
     path('contracts/', views.contracts, name='contracts'),
+    # Balance history over all semesters
+    path('history/', views.history, name='history'),
+    path('history/<int:user_id>', views.history, name='userHistory'),
+    path('api/history/<int:user_id>', views.historyData, name='historyData'),
+    # Weekly cumulative required vs. worked hours
+    path('api/series/<int:user_id>', views.seriesData, name='seriesData'),
+    path('api/series/team', views.teamSeriesData, name='teamSeriesData'),
+    # Balance forecast until the end of the contract
+    path('api/forecast/<int:user_id>', views.forecastData, name='forecastData'),
+    path('api/forecast/team', views.teamForecastData, name='teamForecastData'),
+    # Report by supervisor and month
+    path('report/', views.report, name='report'),
     # Do carryover
     path('doCarryover/<int:user_id>', views.doCarryover, name='doCarryover'),
+    # Status of a background job
+    path('jobStatus/<int:job_id>', views.jobStatus, name='jobStatus'),
     
     # Change password page
     path('changePassword/', views.changePassword, name='changePassword'),
@@ -1,237 +1,179 @@
 from django import template
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
-from django.http import HttpResponse, HttpResponseRedirect, HttpRequest
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseRedirect, HttpRequest, JsonResponse, StreamingHttpResponse, Http404
+from django.views.decorators.http import require_POST, require_GET
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.template import loader
 from django.urls import reverse
 from django.shortcuts import get_object_or_404, render
 
-from .models import Task, Holiday, Contract, ContractChange
+from .models import Task, Holiday, Contract, Job, FeedToken, TimeEntry
+from .jobs import enqueue
+from .calculations import get_free_days, get_employment_time, business_days, calc_holiday, calc_days_to_work, working_hours_on_day, calc_working_time, do_carryover
+from .batch import prefetch_user_data, carryover_problems, carryover_preview, balance_history, employment_time, weekly_series
+from .cache import cached_for_users, bump_user_version, user_version
+from . import events
+from .reports import cached_supervisor_month_report
+from .search import search_tasks
+from .auth import group_names
+from .archive import archived_history
+from .roster import active_roster
+from .absence import team_absences, calendar_range
+from .forecast import cached_forecasts
+from .timesheet import add_entries, delete_entries, set_worked_hours, rollup_rows
+from .regions import region_on
+from .feeds import create_token, get_token, feed_contracts, feed_state, ical_stream, cached_ical_stream, cached_ical
+from core.routers import replica_reads
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
-from django.db.models import F
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
 
 import datetime as dt
-import numpy as np
-import holidays as hd
-from freezegun import freeze_time
-from dateutil.rrule import rrule, DAILY
 
-from typing import Tuple, Union
+import asyncio
+import copy
+import json
+import math
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-def get_free_days(from_date: dt.date, to_date: dt.date) -> dict:
-    """A function that returns all free days between two dates. It uses the holidays package to get all holidays in Saxony between the two dates. It returns a dictionary with the date as key and the name of the holiday as value.
+def is_supervisor(user: User) -> bool:
+    """This function checks if a given user is a supervisor.
 
     Args:
-        from_date (dt.date): from date
-        to_date (dt.date): to date
+        user (User): The user to check.
 
     Returns:
-        dict: A dictionary with the date as key and the name of the holiday as value.
+        bool: True if the user is a supervisor, False otherwise.
     """
-    all_holidays = hd.country_holidays("DE", subdiv = "SN", years = [y for y in range(from_date.year, to_date.year + 1)])
-    free_days = {}
-    for date, name in sorted(all_holidays.items()):
-        if from_date <= date <= to_date:
-            free_days[date] = name
-            
-    return free_days
+    return 'supervisor' in group_names(user) # loaded once per request
 
-def get_employment_time(user: User) -> Tuple[dt.date, dt.date]:
-    """A function that returns the start and end date of the current employment of a given user. It iterates over all contracts of the user and returns the earliest start date and the latest end date. If the user has no active contract, the start date is the start date of the last contract and the end date is the end date of the last contract.
+def is_shkofficer(user: User) -> bool:
+    """This function checks if a given user is a shkofficer.
 
     Args:
-        user (User): The user for which the employment time should be calculated.
+        user (User): The user to check.
 
     Returns:
-        Tuple[dt.date, dt.date]: The start and end date of the current employment.
+        bool: True if the user is a shkofficer, False otherwise.
     """
-    start_dates = [contract.contract_start_date for contract in Contract.objects.filter(user=user) if contract.contract_start_date <= dt.date.today() <= contract.contract_end_date]
-    end_dates = [contract.contract_end_date for contract in Contract.objects.filter(user=user) if contract.contract_start_date <= dt.date.today() <= contract.contract_end_date]
-    if len(start_dates) == 0 or len(end_dates) == 0:
-        start_date = Contract.objects.filter(user=user).order_by('-contract_end_date').first().contract_start_date
-        end_date = Contract.objects.filter(user=user).order_by('-contract_end_date').first().contract_end_date
-        return start_date, end_date
-    
-    return min(start_dates), max(end_dates)
-            
+    return 'shkofficer' in group_names(user) # loaded once per request
 
-def business_days(from_date: dt.date, to_date: dt.date) -> int:
-    """A proper way to calculate the number of business days between 2 dates. np.busday_count does exclude the to_date but we want to include it. Therefore we add 1 if the to_date is not a weekend.
+def can_view_user(logged_user: User, user: User) -> bool:
+    """This function checks if the logged in user may see the data of a given user: the user themselves, the shkofficer and the supervisors of the user's contracts.
 
     Args:
-        from_date (dt.date): from date
-        to_date (dt.date): to date
+        logged_user (User): The logged in user.
+        user (User): The user whose data should be shown.
 
     Returns:
-        int: The number of business days between the two dates.
+        bool: True if the logged in user may see the data, False otherwise.
     """
-    if to_date.weekday() >= 5:
-        return np.busday_count(from_date, to_date)
-    else:
-        return np.busday_count(from_date, to_date) + 1
+    if logged_user.id == user.id or is_shkofficer(logged_user):
+        return True
+    return Contract.objects.filter(user=user, supervisor=logged_user).exists()
 
-def calc_holiday(user: User) -> Tuple[float, float, int, float]:
-    """This function calculates the holiday entitlement, the not taken holidays, the taken holidays and the remaining holidays for a given user. Since the holiday entitlement is calculated based on the contract duration, the function iterates over all contracts of the user. Important are the number of full months worked, for 12 months you get 20 days off.
+def cached_working_time(user: User) -> Tuple[float, float, float, float]:
+    """calc_working_time of a user, cached for the day until the user's data changes.
 
     Args:
-        user (User): The user for which the holiday entitlement should be calculated.
+        user (User): the user
 
     Returns:
-        Tuple[float, float, float, float]: holiday entitlement, not taken holidays in last semester, taken holidays days, remaining holidays in days
+        Tuple[float, float, float, float]: see calc_working_time
     """
-    contracts = Contract.objects.filter(user=user, contract_start_date__range=get_employment_time(user), contract_end_date__range=get_employment_time(user))
-    holiday_entitlement_sum, not_taken_holidays_sum = 0, 0
-    for contract in contracts:
-        contract_duration = dt.date(contract.contract_end_date.year, contract.contract_end_date.month, contract.contract_end_date.day) - dt.date(contract.contract_start_date.year, contract.contract_start_date.month, contract.contract_start_date.day)
-        full_months = contract_duration.days // 30
-        holiday_entitlement = round(full_months * 20 / 12,0)
-        not_taken_holidays = contract.carry_over_holiday_hours_from_last_semester / contract.hours_per_week * 5
-        holiday_entitlement_sum += holiday_entitlement
-        not_taken_holidays_sum += not_taken_holidays
-    
-    taken_holidays = Holiday.objects.filter(by_id=user, from_date__range=get_employment_time(user), to_date__range=get_employment_time(user))
-    taken_holidays_days = sum([business_days(holiday.from_date, holiday.to_date) - len(get_free_days(holiday.from_date, holiday.to_date).keys()) for holiday in taken_holidays])
-    remaining_holidays = holiday_entitlement_sum + not_taken_holidays_sum - taken_holidays_days
-    
-    return holiday_entitlement_sum, not_taken_holidays_sum, taken_holidays_days, remaining_holidays
-
-def calc_days_to_work(from_date: dt.date, to_date: dt.date) -> int:
-    """This function calculates the number of days you should have worked until now. It uses the contract start date and the contract end date. If the contract end date is in the future, the current date is used instead.
+    return cached_for_users('working-time', [user.id], lambda: calc_working_time(user), dt.date.today())
 
-    Args:
-        from_date (dt.date): Beginning of the contract.
-        to_date (dt.Date): End of the contract.
+def _prefetched(user: User) -> User:
+    # a copy, so a long lived user object does not keep outdated data attached
+    return user if hasattr(user, 'task_list') else prefetch_user_data([copy.copy(user)])[0]
 
-    Returns:
-        int: number of days to work
-    """
-    free_days = len(get_free_days(from_date, min(dt.date.today(), to_date)).keys())
-    days_to_work = business_days(from_date, min(dt.date.today(), to_date)) - free_days
-    return days_to_work
-
-def working_hours_on_day(user: User, date: dt.date) -> float:
-    """Return the number of hours a user has to work on a given day
+def cached_balance_history(user: User) -> list:
+    """balance_history of a user including the archived periods, cached for the day until the user's data changes. The data of the user is only loaded if it is not cached and the user is not prefetched.
 
     Args:
-        user (User): The user for which the working hours should be calculated.
-        date (dt.date): The date for which the working hours should be calculated.
+        user (User): the user
 
     Returns:
-        float: The amount of hours to work on the given day.
+        list: see batch.balance_history, archived periods have 'archived': True
     """
-    free_days = get_free_days(date, date)
-    
-    # check if date is a free day
-    if date in free_days.keys() or date.weekday() >= 5:
-        return 0.0
-    
-    # find all contracts that are active on the given date
-    hours_on_day = 0.0
-    contracts = Contract.objects.filter(user=user, contract_start_date__lte=date, contract_end_date__gte=date)
-    for contract in contracts:
-        hours_on_day += contract.hours_per_week/5
-        # find all contract changes that are active on the given date
-        contract_changes = ContractChange.objects.filter(contract_id=contract, from_date__lte=date, to_date__gte=date)
-        for contract_change in contract_changes:
-            hours_on_day += contract_change.hours_per_week/5 - contract.hours_per_week/5
-            
-    return hours_on_day    
+    return cached_for_users('history', [user.id], lambda: archived_history(user) + balance_history(_prefetched(user)), dt.date.today())
 
-def calc_working_time(user: User) -> Tuple[float, float, float, float]:
-    """This function calculates the hours to work, the worked hours, the planned hours and the excess hours for a given user. It uses the contract start date and the contract end date. If the contract end date is in the future, the current date is used instead. We do this for all contracts of the user and sum up the hours.
+def cached_series(user: User, from_date: dt.date, to_date: dt.date) -> dict:
+    """weekly_series of a user, cached until the user's data changes. The data of the user is only loaded if it is not cached and the user is not prefetched.
 
     Args:
-        user (User): The user for which the working time should be calculated.
+        user (User): the user
+        from_date (dt.date): first day
+        to_date (dt.date): last day
 
     Returns:
-        Tuple[float, float, float, float]: hours to work, worked hours, planned hours, excess hours
+        dict: see batch.weekly_series
     """
-    contracts = Contract.objects.filter(user=user, contract_start_date__range=get_employment_time(user), contract_end_date__range=get_employment_time(user))
-    hours_to_work = 0
-    for contract in contracts:
-        hours_to_work += calc_days_to_work(contract.contract_start_date, contract.contract_end_date) * contract.hours_per_week/5
-        for contract_change in ContractChange.objects.filter(contract_id=contract, from_date__range=get_employment_time(user)):
-            start_date = contract_change.from_date
-            if contract_change.to_date is None:
-                end_date = contract.contract_end_date
-            else:
-                end_date = contract_change.to_date
-            hours_to_work += calc_days_to_work(start_date, end_date) * (contract_change.hours_per_week/5 - contract.hours_per_week/5)
-        
-    taken_holidays = Holiday.objects.filter(by_id=user, from_date__range=get_employment_time(user), to_date__range=get_employment_time(user))
-    for holiday in taken_holidays:
-        for day in rrule(DAILY, dtstart=holiday.from_date, until=holiday.to_date):
-            hours_to_work -= working_hours_on_day(user, day.date())
-    
-    tasks = Task.objects.filter(assigned_to=user, deadline__range=get_employment_time(user))
-    worked_hours = sum([task.worked_hours for task in tasks])
-    planned_hours = sum([task.total_hours for task in tasks])
-    excess_hours = hours_to_work - worked_hours
-    
-    return hours_to_work, worked_hours, planned_hours, excess_hours
+    return cached_for_users('series', [user.id], lambda: weekly_series([_prefetched(user)], from_date, to_date), from_date, to_date)
 
-def do_carryover(user: User, only_calculate: bool = False) -> Union[Tuple[float, float], Tuple[float, float, Contract, float, float]]:
-    """Calculates carryover from last contract. This carryover will then be set to the carryover of the longest contract that is currently active if it has a carryover of 0. This prevents that the carryover is calculated multiple times.
+def team_range(supervisor: User, today: dt.date) -> Tuple[dt.date, dt.date]:
+    """Default range of the team series: the current semester of the team, or the last year if nobody is employed.
 
     Args:
-        user (User): The user for which the carryover should be calculated.
-        only_calculate (bool): If True, the carryover will not be set to the longest contract.
+        supervisor (User): the supervisor
+        today (dt.date): reference date
 
     Returns:
-        Tuple[float, float]: carryover hours, carryover holiday hours (if only_calculate is False)
-        Tuple[float, float, Contract, float, float]: carryover hours, carryover holiday hours, new contract, last semester carryover hours sum, last semester carryover holiday sum (if only_calculate is True)
+        Tuple[dt.date, dt.date]: first and last day
     """
-    last_contracts_end_date = Contract.objects.filter(user=user, contract_end_date__lt=dt.date.today()).order_by('-contract_end_date').first().contract_end_date
-    last_contracts = Contract.objects.filter(user=user, contract_end_date=last_contracts_end_date) # only nesseary because user can have multiple contracts ending at the same time
-    with freeze_time(last_contracts_end_date): # want to use my functions but they only work during a contract
-        hours_to_work, worked_hours, planned_hours, excess_hours = calc_working_time(user)
-        holiday_entitlement_sum, not_taken_holidays_sum, taken_holidays_days, remaining_holidays = calc_holiday(user) # in days
-        employment_start, employment_end = get_employment_time(user)
-        average_hours_per_day = np.mean([working_hours_on_day(user, day.date()) for day in rrule(DAILY, dtstart=employment_start, until=employment_end)])
-    
-    last_semester_carry_over_hours = sum([contract.carry_over_hours_from_last_semester for contract in last_contracts])
-    last_semester_carry_over_holiday_hours = sum([contract.carry_over_holiday_hours_from_last_semester for contract in last_contracts])
-    carryover_hours = last_semester_carry_over_hours + excess_hours
-    carryover_holiday_hours = last_semester_carry_over_holiday_hours + (holiday_entitlement_sum - taken_holidays_days) * average_hours_per_day
-        
-    # set carryover to carryover of longest contract
-    longest_contract = Contract.objects.filter(user=user, contract_start_date__lte=dt.date.today(), contract_end_date__gte=dt.date.today()).extra(select={'duration': 'contract_end_date - contract_start_date'}).order_by('-duration').first()
-    if only_calculate:
-        return carryover_hours, carryover_holiday_hours, longest_contract, last_semester_carry_over_hours, last_semester_carry_over_holiday_hours
-    else:
-        if longest_contract.carry_over_hours_from_last_semester == 0 and longest_contract.carry_over_holiday_hours_from_last_semester == 0:
-            longest_contract.carry_over_hours_from_last_semester = carryover_hours
-            longest_contract.carry_over_holiday_hours_from_last_semester = carryover_holiday_hours
-            longest_contract.save()
-                
-            return carryover_hours, carryover_holiday_hours
-        else:
-            return 0,0
+    active = Contract.objects.filter(supervisor=supervisor, contract_start_date__lte=today, contract_end_date__gte=today)
+    return min([c.contract_start_date for c in active], default=today - dt.timedelta(days=364)), max([c.contract_end_date for c in active], default=today)
 
-def is_supervisor(user: User) -> bool:
-    """This function checks if a given user is a supervisor.
+def cached_team_series(supervisor: User, from_date: dt.date, to_date: dt.date) -> Tuple[dict, set]:
+    """weekly_series of all SHKs of a supervisor with a contract between two dates, cached until the data of one of them changes.
 
     Args:
-        user (User): The user to check.
+        supervisor (User): the supervisor
+        from_date (dt.date): first day
+        to_date (dt.date): last day
 
     Returns:
-        bool: True if the user is a supervisor, False otherwise.
+        Tuple[dict, set]: the series (see batch.weekly_series) and the ids of the SHKs
     """
-    return user.groups.filter(name='supervisor').exists()
+    user_ids = set(Contract.objects.filter(supervisor=supervisor, contract_start_date__lte=to_date, contract_end_date__gte=from_date).values_list('user_id', flat=True))
+    return cached_for_users('team-series', user_ids, lambda: weekly_series(prefetch_user_data(User.objects.filter(id__in=user_ids)), from_date, to_date), from_date, to_date), user_ids
 
-def is_shkofficer(user: User) -> bool:
-    """This function checks if a given user is a shkofficer.
+def shk_row(shk: Contract, forecast: Optional[dict] = None) -> dict:
+    """The card of an SHK on the supervisor and officer dashboards.
 
     Args:
-        user (User): The user to check.
+        shk (Contract): the contract from active_roster
+        forecast (Optional[dict]): the forecast of the SHK (see forecast.user_forecast), loaded if not given
 
     Returns:
-        bool: True if the user is a shkofficer, False otherwise.
+        dict: 'contract', the working time (see calc_working_time), the progress bars in percent, the carryover of the contract and the forecast excess hours at the end of the employment
     """
-    return user.groups.filter(name='shkofficer').exists()
+    forecast = forecast or cached_forecasts([shk.user_id])[shk.user_id]
+    hours_to_work, worked_hours, planned_hours, excess_hours = cached_working_time(shk.user)
+    worked_hours_pct = round(worked_hours / hours_to_work * 100, 2) if worked_hours < hours_to_work else 100
+    planned_hours_pct = round(planned_hours / hours_to_work * 100, 2) if planned_hours < hours_to_work else 100
+    return {
+        'contract': shk,
+        'worked_hours': worked_hours,
+        'worked_hours_pct': worked_hours_pct,
+        'planned_hours': planned_hours,
+        'planned_hours_pct': planned_hours_pct,
+        'difference_hours_pct': round(planned_hours_pct - worked_hours_pct, 2),
+        'hours_to_work': hours_to_work,
+        'excess_hours': excess_hours,
+        'carry_over_hours_from_last_semester': shk.carry_over_hours_from_last_semester,
+        'excess_hours_at_end': forecast['excess_hours_at_end'] if forecast else None,
+        'contract_end': forecast['contract_end'] if forecast else None,
+    }
 
 @login_required(login_url="/login/")
+@replica_reads() # POST requests are pinned to the primary by the ReplicaRoutingMiddleware
 def index(request: HttpRequest):
     logged_user = request.user
     
@@ -244,36 +186,20 @@ def index(request: HttpRequest):
                 t.save()
                     
         shks_data = []
-        if is_supervisor(logged_user):
-            # only get shks of supervisor
-            shks = Contract.objects.filter(supervisor=logged_user) # TODO: filter out shks that are not active anymore
-        else:
-            # get all shks
-            # since a shk can have multiple contracts, we only get the first one
-            shks = [Contract.objects.filter(user=user, contract_start_date__range=get_employment_time(user), contract_end_date__range=get_employment_time(user)).first() for user in User.objects.filter(groups__name='shk')]
+        # one contract per active shk, only the shks of the supervisor
+        shks = active_roster(logged_user if is_supervisor(logged_user) else None)
         
+        forecasts = cached_forecasts([shk.user_id for shk in shks])
         for shk in shks:
-            hours_to_work, worked_hours, planned_hours, excess_hours = calc_working_time(shk.user)
-            worked_hours_pct = round(worked_hours / hours_to_work * 100, 2) if worked_hours < hours_to_work else 100
-            planned_hours_pct = round(planned_hours / hours_to_work * 100, 2) if planned_hours < hours_to_work else 100
-            shks_data.append({
-                'contract': shk,
-                'worked_hours': worked_hours,
-                'worked_hours_pct': worked_hours_pct,
-                'planned_hours': planned_hours,
-                'planned_hours_pct': planned_hours_pct,
-                'difference_hours_pct': round(planned_hours_pct - worked_hours_pct, 2),
-                'hours_to_work': hours_to_work,
-                'excess_hours': excess_hours,
-                'carry_over_hours_from_last_semester': shk.carry_over_hours_from_last_semester,
-            })
-        tasks = Task.objects.filter(assigned_to__in=[shk.user for shk in shks]).order_by('-deadline')[:10] # no filtering nessesary since we only get shks that are active
+            shks_data.append(shk_row(shk, forecasts[shk.user_id]))
+        tasks = Task.objects.filter(assigned_to__in=[shk.user_id for shk in shks]).order_by('-deadline')[:10] # no filtering nessesary since we only get shks that are active
         
         context = {
             'segment': 'index',
             'shks': shks,
             'tasks': tasks,
             'shks_data': shks_data,
+            'live_updates': settings.LIVE_UPDATES,
         }
         
         if is_supervisor(logged_user):
@@ -285,16 +211,18 @@ def index(request: HttpRequest):
         # process form
         if request.method == 'POST':
             if request.POST["formType"] == "newTask":
-                t = Task(assigned_to = logged_user, assigner = User.objects.get(id=request.POST["taskGivenBy"]), task_text = request.POST["TaskDescription"], total_hours = float(request.POST["plannedHours"]), worked_hours = float(request.POST["workedHours"]), deadline = request.POST["deadline"])
+                t = Task(assigned_to = logged_user, assigner = User.objects.get(id=request.POST["taskGivenBy"]), task_text = request.POST["TaskDescription"], total_hours = float(request.POST["plannedHours"]), worked_hours = 0, deadline = request.POST["deadline"])
                 t.save()
+                # the hours already worked are recorded as a time entry of today
+                set_worked_hours(t, float(request.POST["workedHours"]))
             elif request.POST["formType"] == "updateTask":
                 t = Task.objects.get(id=request.POST["taskId"])
-                t.worked_hours = float(request.POST["actualHours"])
+                set_worked_hours(t, float(request.POST["actualHours"]))
                 t.total_hours = float(request.POST["plannedHours"])
-                t.save()
+                t.save(update_fields=['total_hours', 'updated'])
         
         # working time
-        hours_to_work, worked_hours, planned_hours, excess_hours = calc_working_time(logged_user)
+        hours_to_work, worked_hours, planned_hours, excess_hours = cached_working_time(logged_user)
         worked_hours_pct = round(worked_hours / hours_to_work * 100, 2) if worked_hours < hours_to_work else 100
         planned_hours_pct = round(planned_hours / hours_to_work * 100, 2) if planned_hours < hours_to_work else 100
         unfinished_tasks = Task.objects.filter(assigned_to=logged_user, worked_hours__lt = F('total_hours')).order_by('-deadline')
@@ -311,6 +239,7 @@ def index(request: HttpRequest):
             'planned_hours_pct': planned_hours_pct,
             'carry_over_hours_from_last_semester': sum([contract.carry_over_hours_from_last_semester for contract in Contract.objects.filter(user=logged_user, contract_start_date__range=get_employment_time(logged_user), contract_end_date__range=get_employment_time(logged_user))]),
             'excess_hours': excess_hours,
+            'forecast': cached_forecasts([logged_user.id])[logged_user.id],
             'tasks': unfinished_tasks,
             'supervisors': supervisors,
             'my_supervisor': Contract.objects.filter(user=logged_user).first().supervisor
@@ -320,7 +249,81 @@ def index(request: HttpRequest):
         
     return HttpResponse(html_template.render(context, request))
 
+def _sse(event: str, data: dict) -> str:
+    return 'event: ' + event + '\ndata: ' + json.dumps(data) + '\n\n'
+
+async def dashboard_stream(supervisor: Optional[User], poll_seconds: float, max_seconds: float) -> AsyncIterator[str]:
+    """Server-sent events with the changed SHK cards of a dashboard. Waits for changes published by bump_user_version (see events.py) and, every poll_seconds, also compares the cached user versions of the team, which finds the changes of other processes if the cache is shared. Only the cards of the changed SHKs are recomputed; an 'shk' event carries shk_row without the contract and with the user id, a 'team' event tells the page to reload because an SHK joined or left (noticed when a published change concerns a user outside the team).
+
+    Args:
+        supervisor (Optional[User]): the supervisor, None for the SHK officer (all SHKs)
+        poll_seconds (float): seconds between version checks and keepalives
+        max_seconds (float): seconds after which the stream ends (the browser reconnects)
+
+    Yields:
+        AsyncIterator[str]: the events
+    """
+    loop = asyncio.get_running_loop()
+    subscription = events.subscribe()
+    try:
+        shks = await sync_to_async(active_roster)(supervisor)
+        team = {shk.user_id for shk in shks}
+        versions = await sync_to_async(lambda: {user_id: user_version(user_id) for user_id in team})()
+        yield 'retry: 3000\n\n'
+        deadline = loop.time() + max_seconds
+        while loop.time() < deadline:
+            changed = await events.changed_users(subscription, min(poll_seconds, max(deadline - loop.time(), 0)))
+            current = await sync_to_async(lambda: {user_id: user_version(user_id) for user_id in team})()
+            strangers = changed - team # new SHKs of the team, or other teams
+            changed = (changed & team) | {user_id for user_id in team if current[user_id] != versions[user_id]}
+            versions = current
+            if not changed and not strangers:
+                yield ': keepalive\n\n'
+                continue
+            shks = await sync_to_async(active_roster)(supervisor)
+            if {shk.user_id for shk in shks} != team:
+                yield _sse('team', {})
+                return
+            for shk in shks:
+                if shk.user_id in changed:
+                    row = await sync_to_async(shk_row)(shk)
+                    del row['contract']
+                    yield _sse('shk', dict(row, user=shk.user_id))
+    finally:
+        events.unsubscribe(subscription)
+
+@login_required(login_url="/login/")
+async def dashboardEvents(request: HttpRequest):
+    logged_user = await request.auser()
+    supervisor, officer = await sync_to_async(lambda: (is_supervisor(logged_user), is_shkofficer(logged_user)))()
+    if not supervisor and not officer:
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    if not settings.LIVE_UPDATES or not isinstance(request, ASGIRequest):
+        # a WSGI worker would send the stream only after it ended, 204 tells the browser not to reconnect
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(dashboard_stream(logged_user if supervisor else None, settings.LIVE_POLL_SECONDS, settings.LIVE_STREAM_SECONDS), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # no buffering in nginx
+    return response
+
+def tasks_for(user: User) -> QuerySet:
+    """Returns the tasks a user may see: the tasks of the supervised SHKs for a supervisor, all tasks for the SHK officer and the own tasks otherwise.
+
+    Args:
+        user (User): the logged in user
+
+    Returns:
+        QuerySet: the tasks
+    """
+    if is_supervisor(user):
+        return Task.objects.filter(assigned_to__in=User.objects.filter(user__supervisor=user))
+    elif is_shkofficer(user):
+        return Task.objects.all()
+    else:
+        return Task.objects.filter(assigned_to=user)
+
 @login_required(login_url="/login/")
+@replica_reads()
 def tasks(request: HttpRequest):
     logged_user = request.user
     
@@ -329,27 +332,91 @@ def tasks(request: HttpRequest):
         t = Task.objects.get(id=request.POST["taskId"])
         t.task_text = request.POST["taskDescription"]
         t.total_hours = float(request.POST["plannedHours"])
-        t.worked_hours = float(request.POST["workedHours"])
         t.deadline = request.POST["deadline"]
         t.assigner = User.objects.get(id=request.POST["taskGivenBy"])
-        t.save()
+        t.save(update_fields=['task_text', 'total_hours', 'deadline', 'assigner', 'updated'])
+        # a changed total of the worked hours is recorded as a time entry of today
+        set_worked_hours(t, float(request.POST["workedHours"]))
     
-    if is_supervisor(logged_user):
-        shks = Contract.objects.filter(supervisor=logged_user)
-        tasks = Task.objects.filter(assigned_to__in=[shk.user for shk in shks]).order_by('-deadline')
-    elif is_shkofficer(logged_user):
-        tasks = Task.objects.all().order_by('-deadline')
+    query = request.GET.get("q", "").strip()
+    if query:
+        tasks = search_tasks(tasks_for(logged_user), query).select_related('assigned_to', 'assigner')
     else:
-        tasks = Task.objects.filter(assigned_to=logged_user).order_by('-deadline')
+        tasks = tasks_for(logged_user).order_by('-deadline')
     
     context = {
         'segment': 'tasks',
         'tasks': tasks,
+        'query': query,
     }
     
     html_template = loader.get_template('home/tasks.html')
     return HttpResponse(html_template.render(context, request))
 
+@login_required(login_url="/login/")
+@replica_reads()
+def searchTasks(request: HttpRequest):
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = min(int(request.GET.get("limit", 50)), 200)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    
+    tasks = search_tasks(tasks_for(request.user), query).select_related('assigned_to', 'assigner')[:limit]
+    return JsonResponse({'query': query, 'tasks': [{
+        'id': task.id,
+        'task_text': task.task_text,
+        'worked_hours': task.worked_hours,
+        'total_hours': task.total_hours,
+        'deadline': task.deadline,
+        'assigned_to': task.assigned_to.get_full_name() or task.assigned_to.username,
+        'assigner': task.assigner.get_full_name() or task.assigner.username,
+    } for task in tasks]})
+
+def parse_hour_entries(request: HttpRequest) -> List[Tuple[int, dt.date, float]]:
+    """Reads the hours to add from a request. Either form fields taskId, hours and date for one task or a JSON body {"entries": [{"task_id": 1, "hours": 1.5, "date": "2023-06-01"}, ...]} for many. The date is optional and defaults to today.
+
+    Args:
+        request (HttpRequest): the request
+
+    Raises:
+        ValueError: if the request contains no or invalid entries
+
+    Returns:
+        List[Tuple[int, dt.date, float]]: task id, day and hours of every entry
+    """
+    if request.content_type == 'application/json':
+        try:
+            entries = [(entry["task_id"], entry.get("date"), entry["hours"]) for entry in json.loads(request.body)["entries"]]
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError("Invalid JSON body: " + str(e))
+    else:
+        entries = [(request.POST.get("taskId"), request.POST.get("date") or None, request.POST.get("hours"))]
+    
+    parsed = []
+    for task_id, date, hours in entries:
+        try:
+            parsed.append((int(task_id), dt.date.fromisoformat(date) if date else dt.date.today(), float(hours)))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid entry: " + str(task_id) + ", " + str(date) + ", " + str(hours))
+        if not math.isfinite(parsed[-1][2]):
+            raise ValueError("Invalid hours: " + str(hours))
+    if len(parsed) == 0:
+        raise ValueError("No entries")
+    return parsed
+
+@login_required(login_url="/login/")
+@require_POST
+def logHours(request: HttpRequest):
+    try:
+        entries = parse_hour_entries(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # only tasks assigned to or given by the user, the worked hours are incremented by the database (no lost updates)
+    recorded = add_entries(entries, Task.objects.filter(Q(assigned_to=request.user) | Q(assigner=request.user)))
+    return JsonResponse({'updated': len({entry.task_id for entry in recorded}), 'requested': len({entry[0] for entry in entries})})
+
 @login_required(login_url="/login/")
 def editTask(request: HttpRequest, task_id: int):
     logged_user = request.user
@@ -366,18 +433,92 @@ def editTask(request: HttpRequest, task_id: int):
     return HttpResponse(html_template.render(context, request))
 
 @login_required(login_url="/login/")
+@replica_reads()
+def timesheet(request: HttpRequest):
+    logged_user = request.user
+    user = get_object_or_404(User, id=request.GET["user"]) if "user" in request.GET else logged_user
+    if not can_view_user(logged_user, user):
+        return HttpResponseRedirect(reverse('home'))
+
+    view = "month" if request.GET.get("view") == "month" else "week"
+    try:
+        date = dt.date.fromisoformat(request.GET["date"]) if "date" in request.GET else dt.date.today()
+    except ValueError:
+        date = dt.date.today()
+    from_date, to_date, previous_date, next_date = calendar_range(view, date)
+
+    # the hours come from the rollups only, the entries are listed for editing
+    daily = {row['start']: row['hours'] for row in rollup_rows(user, 'day', from_date, to_date)}
+    days = [from_date + dt.timedelta(days=i) for i in range((to_date - from_date).days + 1)]
+    total = rollup_rows(user, view, from_date, from_date)
+    today = dt.date.today()
+    year_ago = (today.replace(day=1) - dt.timedelta(days=335)).replace(day=1)
+
+    context = {
+        'segment': 'timesheet',
+        'shown_user': user,
+        'own': user == logged_user,
+        'view': view,
+        'from_date': from_date,
+        'to_date': to_date,
+        'previous_date': previous_date,
+        'next_date': next_date,
+        'days': [{'date': day, 'hours': daily.get(day.isoformat(), 0)} for day in days],
+        'weeks': rollup_rows(user, 'week', from_date, to_date),
+        'total_hours': total[0]['hours'] if total else 0,
+        'months': rollup_rows(user, 'month', year_ago, today),
+        'entries': TimeEntry.objects.filter(user=user, date__range=(from_date, to_date)).select_related('task').order_by('date', 'id'),
+        'tasks': Task.objects.filter(assigned_to=logged_user).order_by('-deadline')[:50] if user == logged_user else [],
+    }
+
+    html_template = loader.get_template('home/timesheet.html')
+    return HttpResponse(html_template.render(context, request))
+
+@login_required(login_url="/login/")
+@require_POST
+def timeEntries(request: HttpRequest):
+    logged_user = request.user
+    action = request.POST.get("action")
+    if action == "add":
+        try:
+            entries = parse_hour_entries(request)
+        except ValueError:
+            return HttpResponseRedirect(reverse('timesheet'))
+        add_entries(entries, Task.objects.filter(assigned_to=logged_user))
+    elif action == "delete":
+        # only the own entries
+        delete_entries(TimeEntry.objects.filter(id=request.POST.get("entryId") or 0, user=logged_user))
+
+    date = request.POST.get("date")
+    return HttpResponseRedirect(reverse('timesheet') + ("?date=" + date if date else ""))
+
+@login_required(login_url="/login/")
+@replica_reads()
+def timesheetData(request: HttpRequest, user_id: int):
+    user = get_object_or_404(User, id=user_id)
+    if not can_view_user(request.user, user):
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+
+    period = request.GET.get("period", "week")
+    if period not in ("day", "week", "month"):
+        return JsonResponse({'error': 'period must be day, week or month'}, status=400)
+    today = dt.date.today()
+    try:
+        from_date, to_date = date_range_from_request(request, (today - dt.timedelta(days=365), today))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({'user': user.id, 'period': period, 'from': from_date.isoformat(), 'to': to_date.isoformat(), 'rows': rollup_rows(user, period, from_date, to_date)})
+
+@login_required(login_url="/login/")
+@replica_reads()
 def holidays(request: HttpRequest):
     logged_user = request.user
     
     if is_supervisor(logged_user) or is_shkofficer(logged_user):
         shks_data = []
-        if is_supervisor(logged_user):
-            # only get shks of supervisor
-            shks = Contract.objects.filter(supervisor=logged_user) # TODO: filter out shks that are not active anymore
-        else:
-            # get all shks
-            # since a shk can have multiple contracts, we only get the first one
-            shks = [Contract.objects.filter(user=user).first() for user in User.objects.filter(groups__name='shk')]
+        # one contract per active shk, only the shks of the supervisor
+        shks = active_roster(logged_user if is_supervisor(logged_user) else None)
         
         for shk in shks:
             holiday_entitlement, not_taken_holidays, taken_holidays_days, remaining_holidays = calc_holiday(shk.user)
@@ -385,12 +526,16 @@ def holidays(request: HttpRequest):
                 'contract': shk,
                 'remaining_holidays': remaining_holidays,
             })
-        holidays = Holiday.objects.filter(by_id__in=[shk.user for shk in shks]).order_by('-from_date') # no filtering nessesary since we only get shks that are active
+        holidays = list(Holiday.objects.filter(by_id__in=[shk.user_id for shk in shks]).order_by('-from_date')) # no filtering nessesary since we only get shks that are active
+        regions = {shk.user_id: shk.region for shk in shks}
+        for holiday in holidays:
+            holiday.region = regions[holiday.by_id_id]
         
         context = {
             'segment': 'holidays',
             'holidays': holidays,
             'shks_data': shks_data,
+            'feed_tokens': FeedToken.objects.filter(user=logged_user, revoked=None),
         }
         
         html_template = loader.get_template('home/holidays_supervisor.html')
@@ -409,7 +554,10 @@ def holidays(request: HttpRequest):
                     h.save()
                     
         holiday_entitlement, not_taken_holidays, taken_holidays_days, remaining_holidays = calc_holiday(logged_user)
-        taken_holidays = Holiday.objects.filter(by_id=logged_user, from_date__range=get_employment_time(logged_user), to_date__range=get_employment_time(logged_user)).order_by('-from_date')
+        taken_holidays = list(Holiday.objects.filter(by_id=logged_user, from_date__range=get_employment_time(logged_user), to_date__range=get_employment_time(logged_user)).order_by('-from_date'))
+        contracts = list(Contract.objects.filter(user=logged_user))
+        for holiday in taken_holidays:
+            holiday.region = region_on(contracts, holiday.from_date)
         
         context = {
             'segment': 'holidays',
@@ -418,6 +566,7 @@ def holidays(request: HttpRequest):
             'taken': taken_holidays_days,
             'remaining': remaining_holidays,
             'holidays': taken_holidays,
+            'feed_tokens': FeedToken.objects.filter(user=logged_user, revoked=None),
         }
         
         html_template = loader.get_template('home/holidays.html')
@@ -437,44 +586,33 @@ def editHoliday(request: HttpRequest, holiday_id: int):
     return HttpResponse(html_template.render(context, request))
 
 @login_required(login_url="/login/")
+@replica_reads()
 def contracts(request: HttpRequest):
     logged_user = request.user
     
     if is_shkofficer(logged_user):
         shks = User.objects.filter(groups__name='shk')
     elif is_supervisor(logged_user):
-        shks = list(set([contract.user for contract in Contract.objects.filter(supervisor=logged_user)]))
+        shks = User.objects.filter(user__supervisor=logged_user).distinct()
     else:
         shks = User.objects.filter(id=logged_user.id)
     
+    # contracts, contract changes, holidays and tasks of all shks are loaded at once, everything below runs in memory
+    shks = prefetch_user_data(shks.order_by('id'))
+    today = dt.date.today()
+    scheduled = set(Job.objects.filter(name='carryover', status__in=[Job.PENDING, Job.RUNNING]).values_list('kwargs__user_id', flat=True))
     for shk in shks:
-        shk.contracts = Contract.objects.filter(user=shk)
-        for contract in shk.contracts:
-            contract.contract_changes = ContractChange.objects.filter(contract_id=contract)
-        
+        shk.carryover_scheduled = shk.id in scheduled
         # carryover?
-        carryover_possible = True
-        old_problems = []
-        new_problems = []
-        if not Contract.objects.filter(user=shk, contract_end_date__lt=dt.date.today()).exists(): 
-            old_problems.append("No contract ended yet.")
-            carryover_possible = False
-        if not Contract.objects.filter(user=shk, contract_start_date__lte=dt.date.today(), contract_end_date__gte=dt.date.today()).exists():
-            new_problems.append("No new contract started yet.")
-            carryover_possible = False
-        elif Contract.objects.filter(user=shk, contract_start_date__lte=dt.date.today(), contract_end_date__gte=dt.date.today()).extra(select={'duration': 'contract_end_date - contract_start_date'}).order_by('-duration').first().carry_over_hours_from_last_semester != 0:
-            new_problems.append("New contract has already carryover for working time.")
-            carryover_possible = False
-        elif Contract.objects.filter(user=shk, contract_start_date__lte=dt.date.today(), contract_end_date__gte=dt.date.today()).extra(select={'duration': 'contract_end_date - contract_start_date'}).order_by('-duration').first().carry_over_holiday_hours_from_last_semester != 0:
-            new_problems.append("New contract has already carryover for holiday.")
-            carryover_possible = False
+        old_problems, new_problems = carryover_problems(shk, today)
+        carryover_possible = len(old_problems) == 0 and len(new_problems) == 0
             
         shk.carryover_possible = carryover_possible
         shk.old_problems = old_problems
         shk.new_problems = new_problems
         
         if carryover_possible:
-            carryover_hours, carryover_holiday_hours, new_contract, last_semester_carry_over_hours, last_semester_carry_over_holiday_hours = do_carryover(shk, only_calculate=True)
+            carryover_hours, carryover_holiday_hours, new_contract, last_semester_carry_over_hours, last_semester_carry_over_holiday_hours = carryover_preview(shk, today)
             shk.old_carryover_work = last_semester_carry_over_hours
             shk.old_carryover_holiday = last_semester_carry_over_holiday_hours
             shk.present_carryover_work = carryover_hours - last_semester_carry_over_hours
@@ -492,12 +630,249 @@ def contracts(request: HttpRequest):
     html_template = loader.get_template('home/contracts.html')
     return HttpResponse(html_template.render(context, request))
 
+@login_required(login_url="/login/")
+@replica_reads()
+def history(request: HttpRequest, user_id: int = None):
+    user = get_object_or_404(User, id=user_id or request.user.id)
+    if not can_view_user(request.user, user):
+        return HttpResponseRedirect(reverse('home'))
+    
+    context = {
+        'segment': 'history',
+        'shk': user,
+        'periods': cached_balance_history(user)[::-1],
+    }
+    
+    html_template = loader.get_template('home/history.html')
+    return HttpResponse(html_template.render(context, request))
+
+@login_required(login_url="/login/")
+@replica_reads()
+def historyData(request: HttpRequest, user_id: int):
+    user = get_object_or_404(User, id=user_id)
+    if not can_view_user(request.user, user):
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    
+    return JsonResponse({'user': user.id, 'periods': cached_balance_history(user)})
+
+def date_range_from_request(request: HttpRequest, default: Tuple[dt.date, dt.date]) -> Tuple[dt.date, dt.date]:
+    """Reads the optional query parameters from and to (ISO dates).
+
+    Args:
+        request (HttpRequest): the request
+        default (Tuple[dt.date, dt.date]): range used for missing parameters
+
+    Raises:
+        ValueError: if a date is invalid or the range is empty
+
+    Returns:
+        Tuple[dt.date, dt.date]: from and to date
+    """
+    from_date = dt.date.fromisoformat(request.GET["from"]) if "from" in request.GET else default[0]
+    to_date = dt.date.fromisoformat(request.GET["to"]) if "to" in request.GET else default[1]
+    if from_date > to_date:
+        raise ValueError("from is after to")
+    return from_date, to_date
+
+@login_required(login_url="/login/")
+@replica_reads()
+def seriesData(request: HttpRequest, user_id: int):
+    user = get_object_or_404(User, id=user_id)
+    if not can_view_user(request.user, user):
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    
+    user.contracts = list(Contract.objects.filter(user=user)) # enough for the employment time, the rest is only loaded if the series is not cached
+    if len(user.contracts) == 0:
+        return JsonResponse({'error': 'No contracts'}, status=404)
+    try:
+        from_date, to_date = date_range_from_request(request, employment_time(user))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    series = cached_series(user, from_date, to_date)
+    return JsonResponse(dict(series, user=user.id))
+
+@login_required(login_url="/login/")
+@replica_reads()
+def teamSeriesData(request: HttpRequest):
+    logged_user = request.user
+    if is_shkofficer(logged_user) and "supervisor" in request.GET:
+        supervisor = get_object_or_404(User, id=request.GET["supervisor"])
+    elif is_supervisor(logged_user):
+        supervisor = logged_user
+    else:
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    
+    try:
+        from_date, to_date = date_range_from_request(request, team_range(supervisor, dt.date.today()))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    series, user_ids = cached_team_series(supervisor, from_date, to_date)
+    return JsonResponse(dict(series, supervisor=supervisor.id, users=sorted(user_ids)))
+
+@login_required(login_url="/login/")
+@replica_reads()
+def forecastData(request: HttpRequest, user_id: int):
+    user = get_object_or_404(User, id=user_id)
+    if not can_view_user(request.user, user):
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    
+    forecast = cached_forecasts([user.id])[user.id]
+    if forecast is None:
+        return JsonResponse({'error': 'No active contract'}, status=404)
+    return JsonResponse(forecast)
+
+@login_required(login_url="/login/")
+@replica_reads()
+def teamForecastData(request: HttpRequest):
+    logged_user = request.user
+    if is_shkofficer(logged_user) and "supervisor" in request.GET:
+        supervisor = get_object_or_404(User, id=request.GET["supervisor"])
+    elif is_supervisor(logged_user):
+        supervisor = logged_user
+    else:
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    
+    shks = active_roster(supervisor)
+    forecasts = cached_forecasts([shk.user_id for shk in shks])
+    return JsonResponse({'supervisor': supervisor.id, 'forecasts': [forecasts[shk.user_id] for shk in shks if forecasts[shk.user_id] is not None]})
+
+def absence_team(request: HttpRequest) -> Tuple[bool, User]:
+    """The team whose absences a user may see: a supervisor sees the own SHKs, the SHK officer all SHKs or those of the supervisor given in the query parameter supervisor.
+
+    Args:
+        request (HttpRequest): the request
+
+    Returns:
+        Tuple[bool, User]: whether the user may see absences and the supervisor (None for all SHKs)
+    """
+    logged_user = request.user
+    if is_shkofficer(logged_user):
+        return True, get_object_or_404(User, id=request.GET["supervisor"]) if "supervisor" in request.GET else None
+    if is_supervisor(logged_user):
+        return True, logged_user
+    return False, None
+
+@login_required(login_url="/login/")
+@replica_reads()
+def absences(request: HttpRequest):
+    allowed, supervisor = absence_team(request)
+    if not allowed:
+        return HttpResponseRedirect(reverse('home'))
+    
+    view = "week" if request.GET.get("view") == "week" else "month"
+    try:
+        date = dt.date.fromisoformat(request.GET["date"]) if "date" in request.GET else dt.date.today()
+    except ValueError:
+        date = dt.date.today()
+    from_date, to_date, previous_date, next_date = calendar_range(view, date)
+    data = team_absences(supervisor, from_date, to_date)
+    
+    context = {
+        'segment': 'absences',
+        'view': view,
+        'from_date': from_date,
+        'to_date': to_date,
+        'previous_date': previous_date,
+        'next_date': next_date,
+        'days': data['days'],
+        'rows': [{'name': user['name'], 'absent': [user['id'] in day['absent'] for day in data['days']]} for user in data['users']],
+    }
+    
+    html_template = loader.get_template('home/absences.html')
+    return HttpResponse(html_template.render(context, request))
+
+@login_required(login_url="/login/")
+@replica_reads()
+def absenceData(request: HttpRequest):
+    allowed, supervisor = absence_team(request)
+    if not allowed:
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    
+    try:
+        from_date, to_date = date_range_from_request(request, calendar_range("month", dt.date.today())[:2])
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if (to_date - from_date).days > 731:
+        return JsonResponse({'error': 'range is longer than two years'}, status=400)
+    
+    return JsonResponse(dict(team_absences(supervisor, from_date, to_date), supervisor=supervisor.id if supervisor else None))
+
+@login_required(login_url="/login/")
+@replica_reads()
+def report(request: HttpRequest):
+    if not is_shkofficer(request.user):
+        return HttpResponseRedirect(reverse('home'))
+    
+    try:
+        year = int(request.GET.get("year", dt.date.today().year))
+        dt.date(year, 1, 1) # in the range of dates
+    except ValueError:
+        year = dt.date.today().year
+    report = cached_supervisor_month_report(dt.date(year, 1, 1), dt.date(year, 12, 31))
+    
+    context = {
+        'segment': 'report',
+        'year': year,
+        'rows': report['rows'],
+        'totals': report['totals'],
+    }
+    
+    html_template = loader.get_template('home/report.html')
+    return HttpResponse(html_template.render(context, request))
+
 @login_required(login_url="/login/")
 def doCarryover(request: HttpRequest, user_id: int):
-    do_carryover(User.objects.get(id=user_id))
+    # the carryover recalculates the whole last semester, it is done by a worker (manage.py runjobs)
+    enqueue('carryover', created_by=request.user, user_id=get_object_or_404(User, id=user_id).id)
     
     return HttpResponseRedirect(reverse('contracts'))
 
+@require_GET
+def icalFeed(request: HttpRequest, token: str):
+    feed_token = get_token(token) # the token is the authentication, calendar clients have no session
+    if feed_token is None:
+        raise Http404("No such feed")
+    
+    contracts = feed_contracts(feed_token)
+    etag, last_modified = feed_state(feed_token, contracts)
+    last_modified = int(last_modified.timestamp()) if last_modified else None # HTTP dates have whole seconds
+    headers = {'ETag': etag, 'Cache-Control': 'private, max-age=300'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+    
+    body = cached_ical(etag)
+    if body is not None:
+        response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(cached_ical_stream(etag, ical_stream(feed_token, contracts)), content_type='text/calendar; charset=utf-8')
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+@login_required(login_url="/login/")
+@require_POST
+def feedTokens(request: HttpRequest):
+    logged_user = request.user
+    if request.POST.get("action") == "revoke":
+        FeedToken.objects.filter(id=request.POST.get("token_id"), user=logged_user, revoked=None).update(revoked=timezone.now())
+    elif request.POST.get("action") == "create":
+        scope = FeedToken.TEAM if request.POST.get("scope") == FeedToken.TEAM and is_supervisor(logged_user) else FeedToken.USER
+        create_token(logged_user, scope, request.POST.get("public_holidays") == "on")
+    return HttpResponseRedirect(reverse('holidays'))
+
+@login_required(login_url="/login/")
+def jobStatus(request: HttpRequest, job_id: int):
+    job = get_object_or_404(Job, pk=job_id, created_by=request.user)
+    
+    return JsonResponse({'id': job.id, 'name': job.name, 'status': job.status, 'attempts': job.attempts, 'result': job.result, 'updated': job.updated.isoformat()})
+
 @login_required(login_url="/login/")
 def changePassword(request: HttpRequest):
     if request.method == 'POST':
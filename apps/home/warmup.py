@@ -0,0 +1,99 @@
+"""Steps of `python manage.py warmup`. Every step returns the number of things it loaded, the views are imported inside the steps so the first step can measure the import time."""
+import importlib
+import os
+from typing import Callable, List, Optional, Tuple
+
+from django.conf import settings
+from django.template import loader
+
+import datetime as dt
+
+def import_modules(today: dt.date) -> int:
+    """Imports the modules the views need (numpy, holidays, the calculators).
+
+    Args:
+        today (dt.date): reference date
+
+    Returns:
+        int: number of modules
+    """
+    modules = ['numpy', 'holidays', 'dateutil.rrule', 'apps.home.calculations', 'apps.home.views']
+    for module in modules:
+        importlib.import_module(module)
+    return len(modules)
+
+def holiday_calendars(today: dt.date) -> int:
+    """Builds the holiday calendars of all regions and years covered by active contracts (and the current year of the default region).
+
+    Args:
+        today (dt.date): reference date
+
+    Returns:
+        int: number of calendars
+    """
+    from .regions import DEFAULT_REGION, free_days_of_year, busday_calendar
+    from .models import Contract
+
+    calendars, spans = {(DEFAULT_REGION, today.year)}, set()
+    for start_date, end_date, region in Contract.objects.filter(contract_end_date__gte=today).values_list('contract_start_date', 'contract_end_date', 'region'):
+        calendars.update((region, year) for year in range(start_date.year, end_date.year + 1))
+        spans.add((region, start_date.year, end_date.year))
+    for region, year in calendars:
+        free_days_of_year(year, region)
+    for region, first_year, last_year in spans: # the busday calendars of the contracts' day arrays
+        busday_calendar(region, first_year, last_year)
+    return len(calendars)
+
+def templates(today: dt.date) -> int:
+    """Compiles all templates of the template directories, so the cached template loader has them.
+
+    Args:
+        today (dt.date): reference date
+
+    Returns:
+        int: number of templates
+    """
+    count = 0
+    for template_dir in [d for engine in settings.TEMPLATES for d in engine.get('DIRS', [])]:
+        for root, dirs, files in os.walk(template_dir):
+            for file in files:
+                if file.endswith('.html'):
+                    loader.get_template(os.path.relpath(os.path.join(root, file), template_dir))
+                    count += 1
+    return count
+
+def dashboard_data(today: dt.date) -> int:
+    """Computes the cached dashboard data of all users with an active contract: working time, balance history, weekly series and forecast, the team series of their supervisors and the officer report of the current year.
+
+    Args:
+        today (dt.date): reference date
+
+    Returns:
+        int: number of users and supervisors
+    """
+    from django.contrib.auth.models import User
+    from .batch import prefetch_user_data, employment_time
+    from .forecast import cached_forecasts
+    from .models import Contract
+    from .reports import cached_supervisor_month_report
+    from .views import cached_working_time, cached_balance_history, cached_series, cached_team_series, team_range
+
+    active = Contract.objects.filter(contract_start_date__lte=today, contract_end_date__gte=today)
+    users = prefetch_user_data(User.objects.filter(id__in=active.values('user_id')).order_by('id'))
+    for user in users:
+        cached_working_time(user)
+        cached_balance_history(user)
+        cached_series(user, *employment_time(user, today))
+    cached_forecasts([user.id for user in users], today)
+    supervisors = User.objects.filter(id__in=active.values('supervisor_id')).order_by('id')
+    for supervisor in supervisors:
+        cached_team_series(supervisor, *team_range(supervisor, today))
+    cached_supervisor_month_report(dt.date(today.year, 1, 1), dt.date(today.year, 12, 31))
+    return len(users) + len(supervisors)
+
+STEPS: List[Tuple[str, Callable[[dt.date], int]]] = [
+    ('modules', import_modules),
+    ('holiday calendars', holiday_calendars),
+    ('templates', templates),
+    ('dashboard data', dashboard_data),
+]
@@ -0,0 +1,92 @@
+import contextlib
+import itertools
+import random
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# reads only go to a replica inside replica_reads(), and never after something was written in the same request
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+_in_scope = ContextVar('routing_scope', default=False)
+
+_round_robin_lock = threading.Lock()
+_round_robin = itertools.count()
+
+@contextlib.contextmanager
+def routing_scope(pinned: bool = False):
+    """Context manager for the unit of work that a pin to the primary belongs to (a request, a job). Writes inside the scope pin its following reads to the primary, the pin ends with the scope, so long running threads and commands do not stay pinned.
+
+    Args:
+        pinned (bool): start pinned to the primary
+    """
+    pin_token = _pinned_to_primary.set(pinned)
+    scope_token = _in_scope.set(True)
+    try:
+        yield
+    finally:
+        _in_scope.reset(scope_token)
+        _pinned_to_primary.reset(pin_token)
+
+@contextlib.contextmanager
+def replica_reads():
+    """Context manager and decorator that allows reads to be routed to a read replica. Use it for read only views and calculation functions. Reads still go to the primary if the current request already wrote something. Outside of a request or job it is its own routing_scope."""
+    token = _replica_reads.set(True)
+    try:
+        with contextlib.nullcontext() if _in_scope.get() else routing_scope():
+            yield
+    finally:
+        _replica_reads.reset(token)
+
+def pin_to_primary(pinned: bool = True) -> None:
+    """Sends all following reads of the current scope (see routing_scope) to the primary. Outside of a scope it does nothing, every read outside replica_reads goes to the primary anyway."""
+    if _in_scope.get():
+        _pinned_to_primary.set(pinned)
+
+def choose_replica(replicas: list) -> str:
+    """Selects a replica according to settings.DATABASE_REPLICA_SELECTION: 'random' (default), 'round_robin' or 'first'.
+
+    Args:
+        replicas (list): database aliases of the replicas
+
+    Returns:
+        str: database alias
+    """
+    selection = getattr(settings, 'DATABASE_REPLICA_SELECTION', 'random')
+    if selection == 'first':
+        return replicas[0]
+    if selection == 'round_robin':
+        with _round_robin_lock:
+            return replicas[next(_round_robin) % len(replicas)]
+    return random.choice(replicas)
+
+class PrimaryReplicaRouter:
+    """Routes reads inside replica_reads() to one of settings.DATABASE_REPLICAS, everything else to the primary ('default'). A write pins the rest of the request to the primary, so it reads its own writes."""
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or not _replica_reads.get() or _pinned_to_primary.get():
+            return 'default'
+        return choose_replica(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+class ReplicaRoutingMiddleware:
+    """Resets the routing state for every request. Requests that are not safe (POST, ...) are pinned to the primary from the start."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routing_scope(pinned=request.method not in ('GET', 'HEAD', 'OPTIONS')):
+            return self.get_response(request)
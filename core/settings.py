@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -94,6 +95,56 @@ else:
         }
     }
 
+# Read replicas
+# DB_REPLICAS is a comma separated list of replicas of the default database: file names for SQLite
+# (e.g. two SQLite files standing in for primary and replica), hosts for MySQL.
+# Read only views and the calculation functions read from a replica, selected by DB_REPLICA_SELECTION
+# (random, round_robin or first). Writes and all reads after a write in the same request use the primary.
+
+DATABASE_REPLICAS = []
+for i, replica in enumerate(env.list('DB_REPLICAS', default=[]), start=1):
+    alias = 'replica' + str(i)
+    DATABASES[alias] = dict(DATABASES['default'], **({'HOST': replica} if 'HOST' in DATABASES['default'] else {'NAME': replica}))
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_REPLICA_SELECTION = env('DB_REPLICA_SELECTION', default='random')
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Cache
+# Computed values (e.g. the weekly series) are cached per user until the user's data changes.
+
+CACHES = {
+    'default': {
+        'BACKEND' : env('CACHE_BACKEND' , default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default='working-time'),
+    }
+}
+REPORT_CACHE_TTL = env.int('REPORT_CACHE_TTL', default=300) # seconds the officer report is cached
+
+# Sessions and authentication
+# SESSION_MODE: db (default, one query per request), cached_db (sessions are read from the 'sessions'
+# cache and only written through to the database), cache (only the cache, sessions are lost with it)
+# or signed_cookies (no server side storage). SESSION_CACHE_BACKEND can be a file based cache
+# (django.core.cache.backends.filebased.FileBasedCache with SESSION_CACHE_LOCATION as directory)
+# so all workers share it. With AUTH_USER_CACHE_TTL > 0 the logged in user and their groups are
+# kept in the default cache as well (users have to log in again once after switching it on); this
+# needs a shared CACHE_BACKEND, with a per-process cache the user is still read from the database.
+
+SESSION_MODE = env('SESSION_MODE', default='db')
+SESSION_ENGINE = {
+    'db'            : 'django.contrib.sessions.backends.db',
+    'cached_db'     : 'django.contrib.sessions.backends.cached_db',
+    'cache'         : 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+SESSION_CACHE_ALIAS = 'sessions'
+CACHES[SESSION_CACHE_ALIAS] = {
+    'BACKEND' : env('SESSION_CACHE_BACKEND' , default='django.core.cache.backends.locmem.LocMemCache'),
+    'LOCATION': env('SESSION_CACHE_LOCATION', default='sessions'),
+}
+AUTH_USER_CACHE_TTL = env.int('AUTH_USER_CACHE_TTL', default=0) # seconds, 0 to fetch the user from the database on every request
+AUTHENTICATION_BACKENDS = ['apps.home.auth.CachedModelBackend' if AUTH_USER_CACHE_TTL else 'django.contrib.auth.backends.ModelBackend']
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -141,3 +192,85 @@ STATICFILES_DIRS = (
 
 #############################################################
 #############################################################
+
+#############################################################
+# Shadow mode
+# For a sample of calls the calculators (calc_working_time, calc_holiday, do_carryover) are run
+# next to an alternate implementation, differences above the tolerance are logged with both timings.
+# SHADOW_ALTERNATES maps the calculator name to the dotted path of the alternate implementation.
+
+SHADOW_SAMPLE_RATE = env.float('SHADOW_SAMPLE_RATE', default=0.0)
+SHADOW_TOLERANCE   = env.float('SHADOW_TOLERANCE', default=1e-6)
+SHADOW_ALTERNATES  = {} # e.g. {'calc_working_time': 'apps.home.batch.calc_working_time'}
+
+#############################################################
+# Background jobs
+# Expensive operations (e.g. the carryover) are queued in the database and run by
+# `python manage.py runjobs`, failed jobs are retried with exponential backoff.
+
+JOBS_WORKERS        = env.int('JOBS_WORKERS', default=2)
+JOBS_POLL_INTERVAL  = env.float('JOBS_POLL_INTERVAL', default=2.0)
+JOBS_RETRY_DELAY    = env.int('JOBS_RETRY_DELAY', default=30)   # seconds before the first retry
+JOBS_TIMEOUT        = env.int('JOBS_TIMEOUT', default=3600)     # running jobs older than this are requeued on worker start
+
+#############################################################
+# Warmup
+# `python manage.py warmup` fills the caches after a deploy; the dashboard data needs a shared
+# CACHE_BACKEND for that. With WARMUP_ON_STARTUP every WSGI worker runs it once on boot, before it
+# serves the first request (`serve` preloads in the master instead).
+
+WARMUP_ON_STARTUP   = env.bool('WARMUP_ON_STARTUP', default=False)
+
+#############################################################
+# Production server
+# `python manage.py serve` loads everything once and forks SERVE_WORKERS worker processes
+# sharing the memory copy-on-write. Workers are replaced after SERVE_MAX_REQUESTS requests.
+# More than one worker needs a shared CACHE_BACKEND, so invalidations reach all of them.
+
+SERVE_BIND          = env('SERVE_BIND', default='127.0.0.1:8000')
+SERVE_WORKERS       = env.int('SERVE_WORKERS', default=2)
+SERVE_MAX_REQUESTS  = env.int('SERVE_MAX_REQUESTS', default=1000)   # 0 for never
+
+#############################################################
+# Archive
+# `python manage.py archive` moves employment periods that ended more than ARCHIVE_RETENTION_DAYS
+# ago out of the contract, holiday and task tables, the history still shows their balances.
+
+ARCHIVE_RETENTION_DAYS = env.int('ARCHIVE_RETENTION_DAYS', default=730)
+
+#############################################################
+# Digest
+# `python manage.py digest` (nightly, e.g. from cron) reports per supervisor the SHKs that are
+# DIGEST_EXCESS_HOURS behind or ahead, have DIGEST_HOLIDAY_DAYS holidays left within
+# DIGEST_CONTRACT_END_DAYS of their contract end, or have overdue tasks with hours left.
+# The digests are written to DIGEST_OUTPUT_DIR and/or mailed with EMAIL_BACKEND (--mail).
+
+DIGEST_EXCESS_HOURS      = env.float('DIGEST_EXCESS_HOURS', default=20.0)
+DIGEST_HOLIDAY_DAYS      = env.float('DIGEST_HOLIDAY_DAYS', default=5.0)
+DIGEST_CONTRACT_END_DAYS = env.int('DIGEST_CONTRACT_END_DAYS', default=30)
+DIGEST_OUTPUT_DIR        = env('DIGEST_OUTPUT_DIR', default='')
+DIGEST_WORKERS           = env.int('DIGEST_WORKERS', default=1)
+EMAIL_BACKEND            = env('EMAIL_BACKEND', default='django.core.mail.backends.filebased.EmailBackend')
+EMAIL_FILE_PATH          = env('EMAIL_FILE_PATH', default=os.path.join(CORE_DIR, 'sent_mails'))
+DEFAULT_FROM_EMAIL       = env('DEFAULT_FROM_EMAIL', default='shk-manager@localhost')
+
+#############################################################
+# Live dashboard
+# The supervisor dashboard receives changed SHK cards as server-sent events (run the ASGI
+# application, core.asgi). Changes of the same process are pushed at once; every LIVE_POLL_SECONDS
+# the stream also compares the cached user versions (changes of other processes with a shared
+# cache) and sends a keepalive. Streams end after LIVE_STREAM_SECONDS, the browser reconnects.
+# Only enable LIVE_UPDATES when the ASGI application serves the site: a WSGI worker would be held by
+# every open dashboard, under WSGI the dashboard does not subscribe and the endpoint answers 204.
+
+LIVE_UPDATES        = env.bool('LIVE_UPDATES', default=False)
+LIVE_POLL_SECONDS   = env.float('LIVE_POLL_SECONDS', default=15.0)
+LIVE_STREAM_SECONDS = env.float('LIVE_STREAM_SECONDS', default=300.0)
+
+#############################################################
+# Analytics snapshot
+# `python manage.py snapshot` writes all contracts, contract changes, holidays and tasks as NumPy
+# columns into SNAPSHOT_DIR (only the changed rows are loaded after the first run). Analyses open
+# them with np.load(mmap_mode='r') or apps.home.snapshot.load_snapshot instead of querying the database.
+
+SNAPSHOT_DIR        = env('SNAPSHOT_DIR', default=os.path.join(CORE_DIR, 'snapshot'))
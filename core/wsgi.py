@@ -5,3 +5,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.WARMUP_ON_STARTUP:
+    from django.core.management import call_command
+    call_command('warmup', in_process=True) # this worker's caches, also with a per-process cache